@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+Times the story and requirements readers behind the toolbox tabs against
+synthetic story trees (see corpus.py) of 1k, 10k and 100k stories, and
+records wall time and peak RSS for each to a JSON file.
+
+    python benchmarks\\benchmark.py
+    python benchmarks\\benchmark.py --sizes 1000 10000 --output before.json
+    python benchmarks\\benchmark.py --sizes 1000 10000 --baseline before.json
+
+Every benchmark runs in a fresh Python process, so its peak RSS isn't
+inflated by the ones before it. The corpora are generated once into --work
+and reused by later runs with the same corpus options.
+
+With --baseline, the exit status is 1 if any benchmark got more than
+--tolerance slower than it was in the baseline file.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'bin'))
+
+from story_index import StoryIndex, metatag_table
+from requirements_store import RequirementsStore, read_requirements
+from coverage_matrix import CoverageMatrix
+from metafilter import MetaIndex, parse_metafilter
+from story_export import Export, VIEWS, WRITERS, export
+import corpus
+
+SIZES = (1000, 10000, 100000)
+REPEAT = 3
+TOLERANCE = 0.2  # fraction a benchmark may slow down by before it counts as a regression
+NOISE = 0.001    # seconds, smaller slow downs are never regressions
+REQUIREMENT_FILES = {'Usecases': 'usecases.csv', 'Business Data': 'business-data.csv'}
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KB."""
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss_kb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KB elsewhere
+
+
+def children_peak_rss_kb():
+    """Peak RSS of the largest finished child process (e.g. a story parsing worker) in KB, or None on Windows."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def windows_peak_rss_kb():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize',
+                                                         'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                                                         'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                                                         'PagefileUsage', 'PeakPagefileUsage')]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess
+    process.restype = wintypes.HANDLE
+    ctypes.windll.psapi.GetProcessMemoryInfo(process(), ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize // 1024
+
+
+# Benchmarks, each is (setup, run). setup(directory) returns what run() is called with,
+# and only run() is timed. They mirror what the BDDToolbox method of the same name does.
+# -----------------------------------------------------------------------------
+
+def stories_folder(directory):
+    return os.path.join(directory, 'stories')
+
+
+def load_index(directory):
+    """The index for the corpus, through a story cache in the corpus folder so setting up is quick."""
+    from story_cache import StoryCache
+    cache = StoryCache(os.path.join(directory, 'story-index.sqlite'))
+    return StoryIndex(stories_folder(directory)).build(cache)
+
+
+def setup_cached_build(directory):
+    from story_cache import StoryCache
+    cache = StoryCache(os.path.join(directory, 'story-index.sqlite'))
+    StoryIndex(stories_folder(directory)).build(cache)  # make sure every story is cached
+    return directory, cache
+
+
+def populate_meta_tree(state):
+    index, store, files = state
+    index._postings = None  # as after a rescan, so the inverted index is rebuilt
+    counts = index.metatag_counts()
+    matrix = CoverageMatrix(index, {name: store.get(filepath) for name, filepath in files.items()})
+    return metatag_table(counts, {key: matrix.key_coverage(key) for key in counts})
+
+
+def setup_populate_meta_tree(directory):
+    files = {name: os.path.join(directory, filename) for name, filename in REQUIREMENT_FILES.items()}
+    return load_index(directory), RequirementsStore(), files
+
+
+def setup_coverage_matrix(directory):
+    requirements = {name: read_requirements(os.path.join(directory, filename)) for name, filename in REQUIREMENT_FILES.items()}
+    return load_index(directory), requirements
+
+
+def coverage_matrix(state):
+    matrix = CoverageMatrix(*state)
+    return [(matrix.rows(name), matrix.story_contributions(name)) for name in matrix.bits]
+
+
+def metafilter(meta):
+    filters = ('+smoke', '+author tester1 -regression', '+usecase 1*', 'groovy: smoke && !(regression || release ==~ /[0-4].*/)')
+    return [parse_metafilter(text).evaluate(meta) for text in filters]
+
+
+def setup_export_all(directory):
+    output = os.path.join(directory, 'exports')
+    os.makedirs(output, exist_ok=True)
+    return load_index(directory), output
+
+
+def export_all(state):
+    index, output = state
+    export(index, [Export(os.path.join(output, view + '.' + format), view, format) for view in VIEWS for format in WRITERS])
+
+
+BENCHMARKS = {
+    'build_index': (
+        lambda directory: directory,
+        lambda directory: StoryIndex(stories_folder(directory)).build()),
+    'build_index_cached': (
+        setup_cached_build,
+        lambda state: StoryIndex(stories_folder(state[0])).build(state[1])),
+    'read_all_scenerios': (
+        load_index,
+        lambda index: index.scenarios()),
+    'read_all_stories_scenerios_and_steps': (
+        load_index,
+        lambda index: index.stories_scenarios_and_steps()),
+    'export_all': (
+        setup_export_all,
+        export_all),
+    'read_metatag_data': (
+        load_index,
+        lambda index: index.metatag_data('@usecase', True)),
+    'populate_meta_tree': (
+        setup_populate_meta_tree,
+        populate_meta_tree),
+    'show_coverage_matrix': (
+        setup_coverage_matrix,
+        coverage_matrix),
+    'build_meta_index': (
+        load_index,
+        MetaIndex),
+    'evaluate_metafilter': (
+        lambda directory: MetaIndex(load_index(directory)),
+        metafilter),
+    'read_all_requirements': (
+        lambda directory: os.path.join(directory, REQUIREMENT_FILES['Usecases']),
+        lambda filepath: list(read_requirements(filepath).column(0))),
+    'get_requirement_count': (
+        lambda directory: (RequirementsStore(), os.path.join(directory, REQUIREMENT_FILES['Business Data'])),
+        lambda state: len(state[0].get(state[1]))),
+}
+
+
+def measure(name, directory, repeat):
+    """Run one benchmark in this process and return its result."""
+    setup, run = BENCHMARKS[name]
+    state = setup(directory)
+    setup_rss = peak_rss_kb()
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - started)
+
+    return {
+        'benchmark': name,
+        'seconds': min(times),
+        'mean_seconds': sum(times) / len(times),
+        'repeat': repeat,
+        'peak_rss_kb': peak_rss_kb(),
+        'setup_rss_kb': setup_rss,  # peak RSS before the timed runs, i.e. what setup needed
+        'children_peak_rss_kb': children_peak_rss_kb(),
+    }
+
+
+def measure_in_subprocess(name, directory, repeat):
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name, directory, '--repeat', str(repeat)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError('{} failed:\n{}'.format(name, process.stderr))
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+# Regressions
+# -----------------------------------------------------------------------------
+
+def regressions(results, baseline, tolerance):
+    """(result, baseline seconds) for every result more than tolerance slower than the same benchmark in baseline."""
+    before = {(result['benchmark'], result['files']): result['seconds'] for result in baseline.get('results', [])}
+    slower = []
+    for result in results:
+        seconds = before.get((result['benchmark'], result['files']))
+        if seconds is not None and result['seconds'] > seconds * (1 + tolerance) and result['seconds'] - seconds > NOISE:
+            slower.append((result, seconds))
+    return slower
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the story and requirements readers on synthetic story trees.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='numbers of story files to benchmark at')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run just these benchmarks')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timed runs per benchmark, the fastest is recorded')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'bdd-toolbox-benchmarks'), help='where the corpora are generated')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='how much slower than the baseline is a regression (default: 0.2, i.e. 20%%)')
+    parser.add_argument('--scenarios', type=int, default=5, help='scenarios per story')
+    parser.add_argument('--metatags', type=int, default=4, help='metatags per scenario')
+    parser.add_argument('--examples', type=int, default=0, help='rows in each Examples table')
+    parser.add_argument('--depth', type=int, default=2, help='folder nesting depth')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', nargs=2, metavar=('BENCHMARK', 'CORPUS'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], args.repeat)))
+        return 0
+
+    results = []
+    for size in args.sizes:
+        directory = os.path.join(args.work, 'corpus-{}'.format(size))
+        print('Generating {} stories in {}'.format(size, directory))
+        manifest = corpus.generate(directory, size, args.scenarios, args.metatags, args.examples, args.depth, args.seed)
+
+        for name in args.only or BENCHMARKS:
+            result = measure_in_subprocess(name, directory, args.repeat)
+            result.update(files=size, corpus=manifest)
+            results.append(result)
+            print('  {:<40} {:>10.4f} s {:>10} KB'.format(name, result['seconds'], result['peak_rss_kb']))
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print('Results written to', args.output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = regressions(results, json.load(file), args.tolerance)
+        for result, seconds in slower:
+            print('REGRESSION {} at {} files: {:.4f} s, was {:.4f} s'.format(result['benchmark'], result['files'], result['seconds'], seconds))
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
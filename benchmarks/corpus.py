@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generates a synthetic jBehave story tree to benchmark the toolbox against.
+The same arguments always produce the same files, so timings from different
+machines and releases are comparable.
+
+    python benchmarks\\corpus.py C:\\temp\\corpus --files 10000 --scenarios 8 --examples 5
+
+Stories are nested depth folders deep, FAN_OUT folders to a level. Every
+scenario is tagged with a @usecase and a @business_rule, plus @requirement,
+@smoke and the like up to metatags tags in all. usecases.csv and
+business-data.csv next to the stories/ folder hold the requirements those
+tags point at.
+"""
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+
+FAN_OUT = 10
+FOLDERS = ('area', 'feature')  # names of the first folder levels, deeper ones are 'group'
+MANIFEST = 'corpus.json'
+
+NOUNS = ('account', 'basket', 'claim', 'customer', 'invoice', 'order', 'payment', 'policy', 'quote', 'report')
+VERBS = ('create', 'update', 'cancel', 'approve', 'search', 'print', 'renew', 'transfer', 'close', 'review')
+EXTRA_TAGS = ('@requirement', '@smoke', '@regression', '@author', '@release')
+
+
+def story_path(number, depth):
+    """Path of story number relative to the stories folder, e.g. area-03/feature-07/story-00037.story"""
+    digits = []
+    folder = number // FAN_OUT
+    for level in range(depth):
+        digits.append(folder % FAN_OUT)
+        folder //= FAN_OUT
+    parts = ['{}-{:02}'.format(FOLDERS[level] if level < len(FOLDERS) else 'group', digit)
+             for level, digit in enumerate(reversed(digits))]
+    return os.path.join(*parts, 'story-{:05}.story'.format(number))
+
+
+def story_text(random, number, scenarios, metatags, examples, requirements):
+    noun = random.choice(NOUNS)
+    lines = [
+        'Narrative:',
+        'In order to manage my {}s'.format(noun),
+        'As a customer',
+        'I want to work with {} {}'.format(noun, number),
+        '',
+        'Meta:',
+        '@author tester{}'.format(number % 7),
+        '',
+    ]
+    for scenario in range(scenarios):
+        verb = random.choice(VERBS)
+        lines += [
+            'Scenario: {} {} {} {}'.format(verb.capitalize(), noun, number, scenario),
+            'Meta:',
+            '@usecase: {}'.format(random.randrange(requirements)),
+            '@business_rule: {}'.format(random.randrange(requirements)),
+        ]
+        for tag in random.sample(EXTRA_TAGS, min(max(metatags - 2, 0), len(EXTRA_TAGS))):
+            lines.append('{} {}'.format(tag, random.randrange(100)))
+        lines += [
+            'Given I am logged in as a customer',
+            'And I have a {} with <amount>'.format(noun) if examples else 'And I have a {}'.format(noun),
+            'When I {} the {}'.format(verb, noun),
+            'Then I see the {} confirmation'.format(verb),
+        ]
+        if examples:
+            lines.append('Examples:')
+            lines.append('|amount|currency|')
+            for row in range(examples):
+                lines.append('|{}|{}|'.format(random.randrange(10000), random.choice(('USD', 'EUR', 'GBP'))))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def generate(directory, files, scenarios=5, metatags=4, examples=0, depth=2, seed=0):
+    """Write the corpus to directory and return its manifest.
+
+    A corpus already in directory that was generated with the same
+    arguments is reused as it is.
+    """
+    requirements = max(10, files // 2)
+    manifest = {'files': files, 'scenarios': scenarios, 'metatags': metatags, 'examples': examples,
+                'depth': depth, 'seed': seed, 'requirements': requirements}
+
+    manifest_path = os.path.join(directory, MANIFEST)
+    try:
+        with open(manifest_path) as file:
+            if json.load(file) == manifest:
+                return manifest
+    except (OSError, ValueError):
+        pass
+
+    stories = os.path.join(directory, 'stories')
+    if os.path.isdir(stories):
+        shutil.rmtree(stories)
+
+    generator = random.Random(seed)
+    for number in range(files):
+        path = os.path.join(stories, story_path(number, depth))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf8', newline='\n') as file:
+            file.write(story_text(generator, number, scenarios, metatags, examples, requirements))
+
+    for name, title in (('usecases.csv', 'Usecase'), ('business-data.csv', 'Business Rule')):
+        with open(os.path.join(directory, name), 'w', encoding='utf8', newline='') as file:
+            file.write('ID,Name,Owner\n')
+            for number in range(requirements):
+                file.write('{},{} {},team{}\n'.format(number, title, number, number % 5))
+
+    # Written last, so an interrupted run is regenerated next time
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic jBehave story tree.')
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=1000, help='number of .story files')
+    parser.add_argument('--scenarios', type=int, default=5, help='scenarios per story')
+    parser.add_argument('--metatags', type=int, default=4, help='metatags per scenario')
+    parser.add_argument('--examples', type=int, default=0, help='rows in each scenario\'s Examples table, 0 for none')
+    parser.add_argument('--depth', type=int, default=2, help='folders between stories/ and the story files')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.directory, args.files, args.scenarios, args.metatags, args.examples, args.depth, args.seed)
+    print(json.dumps(manifest, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,50 +21,87 @@ Email:    jared.musil.kbw5@gmail.com
 # TODO load regular filepaths, not the "//" eacaped slashes filepath
 # TODO Highlight bad syntax
 
+import time
+STARTED = time.perf_counter()  # for the startup report, before anything else is imported
+
 import os
-import re
-import csv
 import json
-import time
-import webbrowser
-import subprocess
+import queue
+import threading
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import font
-from tkinter.filedialog import askopenfilename
-from tkinter.filedialog import askdirectory
-from tkinter.filedialog import asksaveasfile
 
-import selenium_server_standalone
+import tracing
+from story_index import StoryIndex, metatag_table, read_story_text, write_story_text
+from story_watcher import StoryWatcher
+from requirements_store import RequirementsStore, RequirementsError
+from virtual_tree import VirtualTree
+from tree_sort import sort_key, sort_items
 
 __author__ = "Jared Musil"
 __email__ = "jared.musil@gmail.com"
 
+LOG_POLL_MS = 50  # how often test output is moved into the Execute tab log
+METAFILTER_PREVIEW_MS = 150  # typing pause before the metafilter's scenarios are listed
+METAFILTER_PREVIEW_ROWS = 1000
+EXPORT_FILETYPES = (('Text', '*.txt'), ('CSV', '*.csv'), ('JSON Lines', '*.jsonl'), ('Markdown', '*.md'), ('All files', '*.*'))
+
 class BDDToolbox:
     def __init__(self, root):
         self.root = root
         self.root.title('BDD Toolbox')
         #self.root.iconbitmap(os.path.dirname(os.path.abspath('__file__')) + '\\img\\logo.ico')
+        self.startup = StartupReport(STARTED)
+        self.startup.phase('Imports')
+
+        self.__init_variables()
+        self.startup.phase('Variables')
+
+        # Settings, requirements and stories are loaded on a worker thread while the splash screen
+        # shows progress, the GUI is built as soon as they are ready.
+        self.splash = SplashScreen(root, 'img\\splash-screen.gif')
+        self.splash.run(self.__load_data, self.__on_data_loaded)
+
+    def __load_data(self, progress):
+        """Runs on the splash screen's worker thread, so it must not touch any Tk objects."""
+        progress('Loading settings')
+        settings = self.__read_settings()
+
+        progress('Loading requirements')
+        for filepath in settings.get('Requirements', {}).values():
+            try:
+                self.requirements.get(filepath)
+            except (OSError, RequirementsError) as e:
+                print('Unable to load requirements', filepath, e)
+
+        progress('Scanning stories')
+        self.settings = settings  # get_index_workers() reads it, nothing else has started yet
+        index = StoryIndex(settings.get('Stories', ''))
+        index.build(self.get_story_cache(), self.get_index_workers(),
+                    lambda done, total: progress('Scanning {}/{} stories'.format(done, total)))
+        return settings, index
+
+    def __on_data_loaded(self, result, error):
+        self.startup.phase('Loading data')
+        self.splash.show('Building trees')
+        if error is None:
+            settings, self.index = result
+            self.__load_settings(settings)
+        else:
+            print('Loading failed:', repr(error))
+            self.settings = {'Requirements': {}}
+            # TODO refactor show_error() into a popup / modal
+            self.show_error("config.json file is missing or corrupt. Please manually enter your file locations")
 
-        # TODO Finish splash screen - add state messages like "Creating GUI | loading settings | updating tabs |"
-        with SplashScreen(root, 'img\\splash-screen.gif', 2):
-            self.__init_variables()
-            self.__load_settings()
-            self.__load_requirements_from_settings()
-            self.__init_widgets(root)
-
-            # if config.json is present, then pre-load the data file paths
-            # try:
-            #self.update_stories()
-            # except:
-            #    self.show_error("config.json file is missing or corrupt. Please manually enter your file locations")
+        self.__load_requirements_from_settings()
+        self.__init_widgets(self.root)
 
     def __init_variables(self):
         print('- Initialising variables')
         self.app_root = os.path.dirname(os.path.abspath('__file__'))
         self.data_root = self.app_root + '\\data'
         self.results_root = self.data_root + '\\results'
-        # TODO implement save method using results directory
 
         self.settings = {}
         self.stories = []
@@ -72,6 +109,23 @@ class BDDToolbox:
         self.metatags_key_value = []
         self.sites = {}
         self.filepath_stories = tk.StringVar()
+        self.index = None
+        self.story_cache = None
+        self.requirements = RequirementsStore()
+        self.story_watcher = None
+        self.meta_tree_prefix = None
+        self.meta_tree_rows = {}  # metatag -> (treeview item, row values)
+        self.relative_story_names_to_run = ''
+        self.maven_run = None
+        self.selenium_pool = None
+        self.remote_urls = []  # Selenium servers taken from the pool by the current test run
+        self.test_tree_loaded = set()  # stories whose scenarios have been loaded into the test tree
+        self.coverage_matrix = None
+        self.coverage_matrix_key = None  # the index and requirements the coverage matrix was built from
+        self.results = None  # Serenity outcomes of the last test runs, read when a tree first shows them
+        self.meta_index = None
+        self.meta_index_key = None  # the story index the meta index was built from
+        self.metafilter_pending = None  # after() id of the scheduled metafilter preview
         self.requirement_number = 0
         self.img = Icons()
 
@@ -84,6 +138,8 @@ class BDDToolbox:
         self.count_stories = tk.StringVar()
         self.count_scenerios = tk.StringVar()
         self.coverage_requirements = tk.StringVar()
+        self.metafilter = tk.StringVar()
+        self.metafilter_preview = tk.StringVar()
 
         # These should all get overwritten with real values before they are displayed to the user...
         self.requirement.set('NA')
@@ -92,6 +148,8 @@ class BDDToolbox:
         self.metatag_scenerios.set('NA')
         self.metatag_coverage.set('NA')
         self.count_requirements.set('NA')
+        self.coverage_requirements.set('NA')
+        self.metafilter.set('+smoke')
         self.count_stories.set('NA')
         self.count_scenerios.set('NA')
 
@@ -107,12 +165,21 @@ class BDDToolbox:
 
         self.__init_data()
         self.__init_menu()
+        self.startup.phase('Menu')
         self.__init_tabs(self.nb)
         self.__init_tab_data()
+        self.startup.phase('Story watcher')
+
+        # Runs once the splash screen is gone and the main window is drawn
+        self.root.after_idle(self.__report_startup)
+
+    def __report_startup(self):
+        self.startup.phase('First window')
+        self.startup.report()
 
     def __init_data(self):
         print('--- Processing Settings')
-        self.count_requirements.set(len(self.read_all_requirements('Usecases')))
+        self.count_requirements.set(self.get_requirement_count('Usecases'))
         self.count_stories.set(len(self.read_all_stories()))
         self.count_scenerios.set(len(self.read_all_scenerios()))
 
@@ -136,58 +203,87 @@ class BDDToolbox:
         file.add_command(label="Load Settings", command=lambda: self.update_label_filepath(self.filepath_stories))
         file.add_command(label="Configure Settings", command=self.show_settings)
         file.add_separator()
-        file.add_command(label="Save Stories", command=lambda: self.save('stories.txt', self.read_all_stories()))
-        file.add_command(label="Save Scenerios", command=lambda: self.save('scenerios.txt', self.read_all_scenerios()))
-        file.add_command(label="Save Stories & Scenerios", command=lambda: self.save('stories-and-scenerios.txt', self.read_all_stories_and_scenerios()))
-        file.add_command(label="Save Stories, Scenerios, & Steps", command=lambda: self.save('stories-scenerios-steps.txt', self.read_all_stories_scenerios_and_steps()))
+        file.add_command(label="Save Stories", command=lambda: self.save('stories'))
+        file.add_command(label="Save Scenerios", command=lambda: self.save('scenarios'))
+        file.add_command(label="Save Stories & Scenerios", command=lambda: self.save('stories-and-scenarios'))
+        file.add_command(label="Save Stories, Scenerios, & Steps", command=lambda: self.save('stories-scenarios-steps'))
+        file.add_command(label="Save All...", command=self.save_all)
         menu.add_cascade(label="File", menu=file)
 
         edit = tk.Menu(menu, tearoff=0)
-        edit.add_command(label="Selenium Server", command=lambda: self.on_selenium_server_start)
+        edit.add_command(label="Selenium Server", command=self.on_selenium_server_start)
         edit.add_command(label="Selenium Server As User", command=lambda: self.on_selenium_server_start_as)
+        edit.add_command(label="Refresh Results", command=self.refresh_results)
         menu.add_cascade(label="Run", menu=edit)
 
         edit = tk.Menu(menu, tearoff=0)
-        edit.add_command(label="jBehave", command=lambda: webbrowser.open('http://jbehave.org/'))
-        edit.add_command(label="Serenity", command=lambda: webbrowser.open('http://thucydides.info/docs/serenity/'))
-        edit.add_command(label="Selenium", command=lambda: webbrowser.open('http://www.seleniumhq.org/docs/'))
+        edit.add_command(label="jBehave", command=lambda: open_url('http://jbehave.org/'))
+        edit.add_command(label="Serenity", command=lambda: open_url('http://thucydides.info/docs/serenity/'))
+        edit.add_command(label="Selenium", command=lambda: open_url('http://www.seleniumhq.org/docs/'))
         menu.add_cascade(label="Documentation", menu=edit)
 
         help = tk.Menu(menu, tearoff=0)
+        help.add_command(label="Export Trace", command=self.export_trace)
         help.add_command(label="About...", command=self.show_about)
         menu.add_cascade(label="Help", menu=help)
 
         root.config(menu=menu)
 
     def __init_tabs(self, parent):
-        self.__init_tab_requirements(parent)
-        self.__init_tab_browse(parent)
-        self.__init_tab_tag(parent)
-        self.__init_tab_execute(parent)
+        # Every tab starts out empty, its widgets are built and populated the first time it is selected
+        self.tab_builders = {}  # tab widget path -> (name, build, populate)
+        self.tabs_built = set()
+        for name, text, build, populate in (
+                ('tab_requirements', 'Requirements', self.__init_tab_requirements, self.update_tab_requirements),
+                ('tab_browse', 'Browse', self.__init_tab_browse, self.populate_tab_browse),
+                ('tab_tag', 'Tag', self.__init_tab_tag, self.populate_tab_tag),
+                ('tab_execute', 'Execute', self.__init_tab_execute, None)):
+            tab = ttk.Frame()
+            setattr(parent, name, tab)
+            parent.add(tab, text=text)
+            self.tab_builders[str(tab)] = (name, build, populate)
+
+        parent.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        self.on_tab_changed()  # the tab shown first
+
+    def on_tab_changed(self, event=None):
+        name, build, populate = self.tab_builders[str(self.nb.select())]
+        if name in self.tabs_built:
+            return
 
-    def __init_tab_data(self):
-        self.update_variables()
+        self.tabs_built.add(name)
+        started = time.perf_counter()
+        with tracing.span('build tab', tab=name):
+            build(self.nb)
+            if populate is not None:
+                populate()
+        self.startup.phase('Tab ' + self.nb.tab(self.nb.select(), 'text'))
+        print('--- Tab {} ready in {:.0f} ms'.format(name, (time.perf_counter() - started) * 1000))
 
-        # Requirements Tab
-        self.update_tab_requirements()
+    def tab_built(self, name):
+        return name in self.tabs_built
 
-        # Browse Tab
+    def populate_tab_browse(self):
+        self.load_results()
         self.nb.tab_browse.pane.combobox_meta['values'] = self.metatags_key
         self.nb.tab_browse.pane.combobox_meta.current(0)
 
-        selection = self.nb.tab_browse.pane.combobox_meta.get()
-
         self.populate_meta_tree(self.filepath_stories.get(), '@metatag')
         self.populate_test_tree(self.nb.tab_browse.pane.tree_bdd)
 
-        # Tag Tab
+    def populate_tab_tag(self):
+        self.load_results()
         self.populate_story_tree(self.nb.tab_tag.pane.top.pane.left.tree)
 
+    def __init_tab_data(self):
+        self.update_variables()
+
+        self.start_story_watcher()
+        self.on_story_watcher_poll()
+
     def __init_tab_requirements(self, parent):
         print('--- Creating Tab Requirements')
-        parent.tab_requirements = ttk.Frame()
         tab = parent.tab_requirements
-        parent.add(tab, text='Requirements')
 
         # variables
         tab.selected_requirement = tk.StringVar()
@@ -203,7 +299,7 @@ class BDDToolbox:
         tab.footer.requirements_label = ttk.Label(tab.footer, text='Requirements:')
         tab.footer.requirements_val = ttk.Label(tab.footer, textvar=self.count_requirements)
         tab.footer.coverage_label = ttk.Label(tab.footer, text='Coverage:')
-        tab.footer.coverage_val = ttk.Label(tab.footer, text='TODO ##%')
+        tab.footer.coverage_val = ttk.Label(tab.footer, textvar=self.coverage_requirements)
         tab.footer.url_label = ttk.Label(tab.footer, text='Link:')
         tab.footer.url_val = ttk.Label(tab.footer, text='TODO: Lotus Notes URL to go here...')
 
@@ -381,9 +477,7 @@ class BDDToolbox:
 
     def __init_tab_browse(self, parent):
         print('--- Creating Tab Browse')
-        parent.tab_browse = ttk.Frame()
         tab = parent.tab_browse
-        parent.add(tab, text='Browse')
 
         # variables
         key_columns = ("Key", "Count", "Percent", "Coverage")
@@ -405,10 +499,10 @@ class BDDToolbox:
         tab.pane.add(tab.pane.frame_meta)
         tab.pane.tree_meta = ttk.Treeview(tab.pane.frame_meta, columns=key_columns)
         tab.pane.tree_meta['show'] = 'headings'
-        tab.pane.tree_meta.heading(text='Key', column=0, anchor=tk.W, command=lambda c=1: sortby(tab.pane.tree_meta, c, 0))
-        tab.pane.tree_meta.heading(text='Count', column=1, anchor=tk.W, command=lambda c=2: sortby(tab.pane.tree_meta, c, 0))
-        tab.pane.tree_meta.heading(text='Percent', column=2, anchor=tk.W, command=lambda c=3: sortby(tab.pane.tree_meta, c, 0))
-        tab.pane.tree_meta.heading(text='Coverage', column=3, anchor=tk.W, command=lambda c=4: sortby(tab.pane.tree_meta, c, 0))
+        tab.pane.tree_meta.heading(text='Key', column=0, anchor=tk.W, command=lambda c=0: sortby(tab.pane.tree_meta, c, 0))
+        tab.pane.tree_meta.heading(text='Count', column=1, anchor=tk.W, command=lambda c=1: sortby(tab.pane.tree_meta, c, 0))
+        tab.pane.tree_meta.heading(text='Percent', column=2, anchor=tk.W, command=lambda c=2: sortby(tab.pane.tree_meta, c, 0))
+        tab.pane.tree_meta.heading(text='Coverage', column=3, anchor=tk.W, command=lambda c=3: sortby(tab.pane.tree_meta, c, 0))
         tab.pane.tree_meta.column('Key', width=160)
         tab.pane.tree_meta.column('Count', width=40)
         tab.pane.tree_meta.column('Percent', width=50)
@@ -422,8 +516,14 @@ class BDDToolbox:
         # right pane
         tab.pane.frame_bdd = ttk.Frame(tab.pane)
         tab.pane.add(tab.pane.frame_bdd)
-        tab.pane.tree_bdd = ttk.Treeview(tab.pane.frame_bdd)#, columns=value_columns)
+        tab.pane.tree_bdd = VirtualTree(tab.pane.frame_bdd, columns=('Results', 'Duration'))#, columns=value_columns)
+        tab.pane.tree_bdd.heading('#0', text='Story', anchor=tk.W)
+        tab.pane.tree_bdd.heading('Results', text='Results', anchor=tk.W)
+        tab.pane.tree_bdd.heading('Duration', text='Duration', anchor=tk.W)
+        tab.pane.tree_bdd.column('Results', width=160, stretch=False)
+        tab.pane.tree_bdd.column('Duration', width=70, stretch=False)
         tab.pane.tree_bdd.bind("<Double-3>", lambda event, t=tab: self.show_editor(t))
+        tab.pane.tree_bdd.bind('<<TreeviewOpen>>', self.on_test_tree_open)
         ##tab.tree_bdd['show'] = 'headings'
         ##tab.tree_bdd.heading(text='Story', column=0, anchor=tk.W, command=lambda c=0: sortby(tab.tree_bdd, c, 0))
         ##tab.tree_bdd.heading(text='Tag', column=1, anchor=tk.W, command=lambda c=1: sortby(tab.tree_bdd, c, 0))
@@ -485,7 +585,10 @@ class BDDToolbox:
         tab.pane.tree_bdd['yscroll'] = tab.frame_bdd_yscroll.set
         tab.pane.tree_bdd['xscroll'] = tab.frame_bdd_xscroll.set
 
+        from serenity_results import FAILED, PASSED
         tab.pane.tree_bdd.tag_configure('invalid', background='red')
+        tab.pane.tree_bdd.tag_configure(FAILED, foreground='red')
+        tab.pane.tree_bdd.tag_configure(PASSED, foreground='dark green')
 
         #self.populate_tests(tab.pane.tree_bdd)
         #self.populate_stories(tab.pane.tree_meta)
@@ -494,13 +597,12 @@ class BDDToolbox:
 
     def __init_tab_tag(self, parent):
         print('--- Creating Tab Tag')
-        parent.tab_tag = ttk.Frame()
+        from serenity_results import FAILED
         tab = parent.tab_tag
-        parent.add(tab, text='Tag')
 
         # variables
         browser = tk.IntVar()
-        left_headings = ('Left',)
+        left_headings = ('Left', 'Results')
         right_headings = ('Right',)
 
         # widgets
@@ -510,10 +612,13 @@ class BDDToolbox:
         tab.pane.top.pane = ttk.PanedWindow(tab.pane.top, orient=tk.HORIZONTAL)
         tab.pane.top.pane.left = ttk.Frame(tab.pane.top.pane)
         tab.pane.top.pane.add(tab.pane.top.pane.left)
-        tab.pane.top.pane.left.tree = ttk.Treeview(tab.pane.top.pane.left, columns=left_headings)
+        tab.pane.top.pane.left.tree = VirtualTree(tab.pane.top.pane.left, columns=left_headings)
         tab.pane.top.pane.left.tree['show'] = 'headings'
         tab.pane.top.pane.left.tree.heading(text='Stories Available', column=0, anchor=tk.W, command=lambda c=0: sortby(tab.pane.top.pane.left.tree, c, 0))
+        tab.pane.top.pane.left.tree.heading(text='Results', column=1, anchor=tk.W, command=lambda c=1: sortby(tab.pane.top.pane.left.tree, c, 0))
         tab.pane.top.pane.left.tree.column('Left', width=356)
+        tab.pane.top.pane.left.tree.column('Results', width=140, stretch=False)
+        tab.pane.top.pane.left.tree.tag_configure(FAILED, foreground='red')
         tab.pane.top.pane.left.yscroll = ttk.Scrollbar(orient=tk.VERTICAL, command=tab.pane.top.pane.left.tree.yview)
         tab.pane.top.pane.left.add = ttk.Label(tab.pane.top.pane.left, text='<', background='#%02x%02x%02x' % (220, 220, 220))
         tab.pane.top.pane.left.add.bind('<Button-1>', lambda e, t=tab: self.on_test_remove(t))
@@ -525,7 +630,7 @@ class BDDToolbox:
         tab.pane.top.pane.right.remove.bind('<Button-1>', lambda e, t=tab: self.on_test_add(t))
         tab.pane.top.pane.right.remove.bind('<Enter>', lambda e: tab.pane.top.pane.right.remove.config(background='#%02x%02x%02x' % (200, 200, 200)))
         tab.pane.top.pane.right.remove.bind('<Leave>', lambda e: tab.pane.top.pane.right.remove.config(background='#%02x%02x%02x' % (220, 220, 220)))
-        tab.pane.top.pane.right.tree = ttk.Treeview(tab.pane.top.pane.right, columns=right_headings)
+        tab.pane.top.pane.right.tree = VirtualTree(tab.pane.top.pane.right, columns=right_headings)
         tab.pane.top.pane.right.tree['show'] = 'headings'
         tab.pane.top.pane.right.tree.heading(text='Stories To Add Metatag', column=0, anchor=tk.W, command=lambda c=0: sortby(tab.pane.top.pane.right.tree, c, 0))
         tab.pane.top.pane.right.tree.column('Right', width=356)
@@ -585,9 +690,7 @@ class BDDToolbox:
 
     def __init_tab_execute(self, parent):
         print('--- Creating Tab Execute')
-        parent.tab_execute = ttk.Frame()
         tab = parent.tab_execute
-        parent.add(tab, text='Execute')
 
         # variables
         browser = tk.IntVar()
@@ -595,14 +698,19 @@ class BDDToolbox:
         m2_settings = r'--settings C:\users\kbw5\.m2\settings.xml'
         serenity_filepath = r'file://' + self.filepath_stories.get() + r'\target\site\serenity\index.html'
         serenity_report = serenity_filepath.replace('/', '\\')
-        self.relative_story_names_to_run = ''
-        self.command = r'call mvn verify serenity:aggregate -Dmetafilter="+smoke" -Dwebdriver.driver=iexplorer -Dwebdriver.ie.driver=5555 -Dwebdriver.remote.url=' + webdriver_remote_url + ' -Dserenity.take.screenshots=FOR_FAILURES -Dmaven.tests.failure.ignore=true ' + m2_settings
+        self.command = r'call mvn verify serenity:aggregate -Dwebdriver.driver=iexplorer -Dwebdriver.ie.driver=5555 -Dwebdriver.remote.url=' + webdriver_remote_url + ' -Dserenity.take.screenshots=FOR_FAILURES -Dmaven.tests.failure.ignore=true ' + m2_settings
+        from metafilter import with_metafilter
+        self.command = with_metafilter(self.command, self.metafilter.get())
 
         # widgets
         tab.body = ttk.Frame(tab)
         tab.body.metafilter = ttk.LabelFrame(tab.body, text='Metafilter')
-        tab.body.metafilter.entry = ttk.Entry(tab.body.metafilter)
-        tab.body.metafilter.button = ttk.Button(tab.body.metafilter, image=self.img.help, command=lambda: webbrowser.open('http://jbehave.org/reference/stable/meta-filtering.html'))
+        tab.body.metafilter.entry = ttk.Entry(tab.body.metafilter, textvariable=self.metafilter)
+        tab.body.metafilter.button = ttk.Button(tab.body.metafilter, image=self.img.help, command=lambda: open_url('http://jbehave.org/reference/stable/meta-filtering.html'))
+        tab.body.metafilter.preview = ttk.Label(tab.body.metafilter, textvar=self.metafilter_preview)
+        tab.body.metafilter.tree = VirtualTree(tab.body.metafilter, columns=('Story', 'Scenario'), height=5)
+        tab.body.metafilter.tree['show'] = 'headings'
+        tab.body.metafilter.yscroll = ttk.Scrollbar(tab.body.metafilter, orient=tk.VERTICAL, command=tab.body.metafilter.tree.yview)
         tab.body.runas = ttk.LabelFrame(tab.body, text='Run As')
         tab.body.runas.run_as_checkbox = ttk.Checkbutton(tab.body.runas)
         tab.body.runas.username_label = ttk.Label(tab.body.runas, text='Username:')
@@ -616,21 +724,26 @@ class BDDToolbox:
         tab.body.browser.phantomjs = tk.Radiobutton(tab.body.browser, text='PhantomJS', variable=browser, value=4, indicatoron=0)
         tab.body.test = ttk.LabelFrame(tab.body, text='Test')
         tab.body.test.run = ttk.Button(tab.body.test, text='Run Tests', command=lambda: self.on_test_execution(tab.body))
-        tab.body.test.results = ttk.Button(tab.body.test, text='View Results', command=lambda: webbrowser.open(serenity_report))
+        tab.body.test.results = ttk.Button(tab.body.test, text='View Results', command=lambda: open_url(serenity_report))
         tab.body.maven = ttk.LabelFrame(tab.body, text='Maven')
         tab.body.maven.show_hide = ttk.Label(tab.body.maven, text='+', background='#%02x%02x%02x' % (220, 220, 220))
         tab.body.maven.show_hide.bind('<Button-1>', lambda e: print('Expand maven command'))
         tab.body.maven.text = tk.Text(tab.body.maven, height='1', relief=tk.FLAT, background='#%02x%02x%02x' % (240, 240, 237))
-        tab.body.maven.text.insert(tk.INSERT, self.command)
+        # Stories may have been picked in the Tag tab before this tab was first shown
+        tab.body.maven.text.insert(tk.INSERT, self.get_maven_command() if self.relative_story_names_to_run.strip() else self.command)
         tab.body.log = ttk.LabelFrame(tab.body, text='Log')
-        tab.body.log.text = tk.Text(tab.body.log, height='16', relief=tk.FLAT, background='#%02x%02x%02x' % (240, 240, 237))
+        from log_view import LogView
+        tab.body.log.text = LogView(tab.body.log, max_lines=self.get_log_lines(), height='16', relief=tk.FLAT, background='#%02x%02x%02x' % (240, 240, 237))
         tab.body.log.yscroll = ttk.Scrollbar(orient=tk.VERTICAL, command=tab.body.log.text.yview)
 
         # geometry
         tab.body.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
         tab.body.metafilter.grid(row=0, column=0, columnspan=3, sticky=tk.NSEW, padx=(0, 0), pady=(0, 0))
         tab.body.metafilter.entry.grid(row=0, column=0, sticky=tk.NSEW, padx=(5, 0), pady=(0, 5))
-        tab.body.metafilter.button.grid(row=0, column=1, sticky=tk.NSEW, padx=(5, 0), pady=(0, 5))
+        tab.body.metafilter.button.grid(row=0, column=1, columnspan=2, sticky=tk.NSEW, padx=(5, 5), pady=(0, 5))
+        tab.body.metafilter.preview.grid(row=1, column=0, columnspan=3, sticky=tk.NSEW, padx=5, pady=(0, 5))
+        tab.body.metafilter.tree.grid(row=2, column=0, columnspan=2, sticky=tk.NSEW, padx=(5, 0), pady=(0, 5))
+        tab.body.metafilter.yscroll.grid(row=2, column=2, sticky=tk.NS, padx=(0, 5), pady=(0, 5))
         tab.body.runas.grid(row=1, column=0, sticky=tk.NSEW, padx=(0, 5), pady=(0, 0))
         tab.body.runas.run_as_checkbox.grid(row=0, column=0, sticky=tk.NSEW, padx=(5, 0), pady=(0, 5))
         tab.body.runas.username_label.grid(row=0, column=1, sticky=tk.NSEW, padx=(0, 2), pady=(0, 5))
@@ -667,6 +780,11 @@ class BDDToolbox:
 
         # actions
         tab.body.log.text['yscroll'] = tab.body.log.yscroll.set
+        tab.body.metafilter.tree['yscroll'] = tab.body.metafilter.yscroll.set
+        for c, heading in enumerate(('Story', 'Scenario')):
+            tab.body.metafilter.tree.heading(c, text=heading, anchor=tk.W, command=lambda c=c: sortby(tab.body.metafilter.tree, c, 0))
+        self.metafilter.trace_add('write', lambda *args: self.on_metafilter_change())
+        self.on_metafilter_change()
 
         #self.populate_story_tree(tab.pane.top.pane.left.tree)
         # tab.pane.top.pane.right.tree.insert('', 'end', value='', tags=('',))
@@ -687,16 +805,14 @@ class BDDToolbox:
 
     # -----------------------------------------------------------------------------
 
-    def __load_settings(self):
+    def __read_settings(self):
         print('- Loading Settings')
-        try:
-            with open(self.data_root + '\\settings.json', encoding="utf8") as settings_filepath:
-                self.settings = json.load(settings_filepath)
-            self.filepath_stories.set(self.settings['Stories'])
+        with open(self.data_root + '\\settings.json', encoding="utf8") as settings_filepath:
+            return json.load(settings_filepath)
 
-        except:
-            # TODO refactor show_error() into a popup / modal
-            self.show_error("config.json file is missing or corrupt. Please manually enter your file locations")
+    def __load_settings(self, settings):
+        self.settings = settings
+        self.filepath_stories.set(self.settings.get('Stories', ''))
 
     def __load_requirements_from_settings(self):
         # TODO check if requirements are null
@@ -706,197 +822,162 @@ class BDDToolbox:
             self.settings[key].set(value)
         print("SETTINGS", self.settings)
 
+    def get_requirements(self, requirement):
+        """The requirements file for a settings.json requirement name, loaded through the requirements store."""
+        return self.requirements.get(self.settings[requirement].get())
+
     def read_usecase_headers(self):
         selection = self.nb.tab_requirements.settings.combobox.get()
+        return self.get_requirements(selection).headers
+
+    def get_story_index(self, directory=None):
+        """Return the index of the story directory, rescanning only when the story directory has changed.
 
-        for requirement in self.settings.keys():
-            if selection == requirement:
-                filepath = self.settings[requirement].get()
+        Any other directory gets an index of its own, which is not kept and
+        doesn't replace the one the tabs share.
+        """
+        stories = self.filepath_stories.get()
+        if directory is not None and directory != stories:
+            print('--- Indexing stories in', directory)
+            return StoryIndex(directory).build(self.get_story_cache(), self.get_index_workers())
+
+        if self.index is None or self.index.directory != stories:
+            print('--- Indexing stories in', stories)
+            self.index = StoryIndex(stories).build(self.get_story_cache(), self.get_index_workers())
+        return self.index
 
-        file = open(filepath, encoding="utf8")
-        data = csv.reader(file)
-        headers = next(data)
-        return tuple(headers)
+    def get_index_workers(self):
+        """Number of story parsing workers from settings.json, None (one per CPU) when not set or 0."""
+        try:
+            return int(self.settings['Index']['workers']) or None
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def get_log_lines(self):
+        """How many lines the Execute tab log keeps, from settings.json."""
+        from log_view import MAX_LINES
+        try:
+            return int(self.settings['Log']['lines']) or MAX_LINES
+        except (KeyError, TypeError, ValueError):
+            return MAX_LINES
+
+    def get_log_filepath(self):
+        """A new file under the results directory for the full output of a test run."""
+        from datetime import datetime
+        return os.path.join(self.results_root, datetime.now().strftime('maven-%Y%m%d-%H%M%S.log'))
+
+    def export_trace(self):
+        """Save the spans and counters recorded so far as a Chrome trace and print their summary."""
+        from datetime import datetime
+        filepath = os.path.join(self.results_root, datetime.now().strftime('trace-%Y%m%d-%H%M%S.json'))
+        try:
+            tracing.export_chrome_trace(filepath)
+        except OSError as error:
+            print('Unable to export trace:', repr(error))
+            return
+        print('- Trace written to', filepath, '(open it in chrome://tracing)')
+        tracing.print_summary()
+
+    def get_story_cache(self):
+        """The on-disk story cache, or None if it can't be opened (e.g. a read-only install)."""
+        if self.story_cache is None:
+            import sqlite3
+            from story_cache import StoryCache
+            try:
+                self.story_cache = StoryCache(os.path.join(self.data_root, 'story-index.sqlite'))
+            except sqlite3.Error as e:
+                print('Story cache unavailable, stories will be parsed on every launch:', e)
+        return self.story_cache
 
     def read_metatags(self, directory):
-        list_of_metatags = []
-        for path, directorys, files in os.walk(directory):
-            for file in files:
-                with open(path + '\\' + file, 'r') as story:
-                    for line in story:
-                        if '@' in line and '@' == line[0]:
-                            if line not in list_of_metatags:
-                                list_of_metatags.append(line)
+        list_of_metatags = self.get_story_index(directory).metatags()
 
         if len(list_of_metatags) <= 0:
             list_of_metatags.append('No @metatags found')
 
-        self.metatags_key_value = sorted(list_of_metatags)
+        self.metatags_key_value = list_of_metatags
 
     def read_metatags_key_only(self, directory):
-        list_of_metatags = []
-        for path, directorys, files in os.walk(directory):
-            for file in files:
-                with open(path + '\\' + file, 'r') as story:
-                    for line in story:
-                        # Only select metadata, AKA lines that start with "@"
-                        if '@' in line and '@' == line[0]:
-                            # Now that we know its metadata, strip away any trailing data
-                            # Example:
-                            #    "@usecase 5" becomes "@usecase"
-                            #    "@requirement 14" becomes "@requirement"
-                            line_split = line.split(' ')
-                            metatag_key = line_split[0]
-
-                            # filter out repeated metatag keys
-                            if metatag_key not in list_of_metatags:
-                                list_of_metatags.append(metatag_key)
+        list_of_metatags = self.get_story_index(directory).metatag_keys()
 
         # If the directory has not been set, this will likely have a length of zero
         if len(list_of_metatags) <= 0:
             list_of_metatags.append('No key / value metatags found')
 
-        self.metatags_key = sorted(list_of_metatags)
+        self.metatags_key = list_of_metatags
 
     def read_story(self, name):
-        text = ''
-        for path, directorys, files in os.walk(self.filepath_stories.get()):
-            for file in files:
-                if file == name:
-                    with open(path + '\\' + file, 'r') as story:
-                        for line in story:
-                            text += line
-        return text
-
-    def read_scenerios_in_file(self, directory, filename):
-        scenerios = []
-
-        with open(directory + '/' + filename, 'r') as story:
-            for line in story:
-                if "Scenario:" == line[:9]:
-                    scenerios.append(line)
-        return scenerios
+        path = self.get_story_index().path(name)
+        if path is None:
+            return ''
+        return read_story_text(path)[0]
 
     def read_scenerios_and_steps_in_file(self, directory, filename):
-        steps = []
-
-        with open(directory + '/' + filename, 'r') as story:
-            for line in story:
-                if "scenario:" == line[:9].lower():
-                    steps.append('-- ' + line)
-                if (
-                    'given' == line[:5].lower() or
-                    'when' == line[:4].lower() or
-                    'then' == line[:4].lower() or
-                    'and' == line[:3].lower()
-                ): steps.append('---- ' + line)
-        return steps
+        story = self.get_story_index(directory).story(filename)
+        return list(story.steps) if story else []
 
     def read_metatag_data(self, directory, metatag, with_stories):
-        metatags = []
-        for path, directorys, files in os.walk(directory):
-            for file in files:
-                story_specific_metatags = self.read_metatag_data_with_filename(path, file, metatag, with_stories)
-                metatags.extend(story_specific_metatags)
-
-        if not with_stories:
-            metatags = self.filter_unique_list(metatags)
-
-        return sorted(metatags)
+        return self.get_story_index(directory).metatag_data(metatag, with_stories)
 
     def read_metatag_data_with_filename(self, path, file, metatag, with_stories):
-        metatags = []
-        with open(path + '/' + file, 'r') as story:
-            for line in story:
-                if metatag in line:
-                    if with_stories:
-                        offset = len(metatag) + len(': ')
-                        metatags.append(file + ' ' + line[offset:])
-                    else:
-                        l = line.partition(':')[2]
-                        metatags.append(l[1:])
-        return metatags
+        story = self.get_story_index().story(file)
+        return story.metatag_data(metatag, with_stories) if story else []
 
     def read_stories(self, directory):
-        stories = []
-        for path, directorys, files in os.walk(directory):
-            for file in files:
-                if file.endswith('.story'):
-                    stories.append(file)
-        return sorted(stories)
+        return self.get_story_index(directory).story_files()
 
     def read_all_stories(self):
-        stories = []
-        filepath = self.filepath_stories.get()
-
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                stories.append(file)
-        stories.sort()
-        return stories
+        return self.get_story_index().stories()
 
     def read_all_scenerios(self):
-        scenerios = []
-        filepath = self.filepath_stories.get()
-
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                scenerios_in_file = self.read_scenerios_in_file(path, file)
-                scenerios.extend(scenerios_in_file)
-        scenerios.sort()
-        return scenerios
+        return self.get_story_index().scenarios()
 
     def read_all_stories_and_scenerios(self):
-        combined = []
-        filepath = self.filepath_stories.get()
-
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                combined.append(file)
-                scenerios_in_file = self.read_scenerios_in_file(path, file)
-                for scenerio in scenerios_in_file:
-                    combined.append('-- ' + scenerio)
-        return combined
+        return self.get_story_index().stories_and_scenarios()
 
     def read_all_stories_scenerios_and_steps(self):
-        combined = []
-        filepath = self.filepath_stories.get()
-
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                combined.append(file)
-                steps_in_file = self.read_scenerios_and_steps_in_file(path, file)
-                for step in steps_in_file:
-                    combined.append(step)
-        return combined
+        return self.get_story_index().stories_scenarios_and_steps()
 
     def read_all_requirements(self, requirement):
-        #TODO try/catch bad settings.json file
         try:
-            file = open(self.settings[requirement].get(), encoding="utf8")
-        except:
+            requirements = self.get_requirements(requirement)
+        except (KeyError, OSError, RequirementsError):
             print('Bad settings.json requirement, prompting for file')
-            file = askopenfilename(title='Load a requirements file (.json only)', filetypes=((".json files","*.json"),("all files","*.*")))
-
-        data = csv.reader(file)
-
-        requirements = []
-        for row in data:
-            requirements.append(row[0])
-        requirements.pop(0)  # Dont count the header
-        return requirements
+            from tkinter.filedialog import askopenfilename
+            filepath = askopenfilename(title='Load a requirements file (.csv only)', filetypes=((".csv files","*.csv"),("all files","*.*")))
+            requirements = self.requirements.get(filepath)
+
+        # The header is not counted
+        return list(requirements.column(0)) if len(requirements.headers) else []
+
+    def get_coverage_matrix(self):
+        """The coverage matrix of every requirements file, rebuilt only after the stories or a requirements file changed."""
+        requirements = {}
+        for name in self.settings.get('Requirements', {}):
+            try:
+                requirements[name] = self.get_requirements(name)
+            except (KeyError, OSError, RequirementsError) as e:
+                print('Unable to load requirements for coverage', name, e)
+
+        index = self.get_story_index()
+        # The requirements store hands out a new object whenever a file changes
+        key = (id(index), tuple(sorted((name, id(rows)) for name, rows in requirements.items())))
+        if self.coverage_matrix is None or key != self.coverage_matrix_key:
+            from coverage_matrix import CoverageMatrix
+            self.coverage_matrix = CoverageMatrix(index, requirements)
+            self.coverage_matrix_key = key
+        return self.coverage_matrix
+
+    def get_requirement_count(self, requirement):
+        """Number of requirements in a requirements file, or 0 if it can't be read."""
+        try:
+            return len(self.get_requirements(requirement))
+        except (KeyError, OSError, RequirementsError) as e:
+            print('Unable to count requirements for', requirement, e)
+            return 0
 
     def find_story_from_scenerio(self, scenerio):
-        found_story = ''
-        filepath = self.filepath_stories.get()
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                with open(filepath + '/' + file, 'r') as story:
-                    for line in story:
-                        if line == scenerio:
-                            found_story = story
-                            break
-        return found_story
+        return self.get_story_index().find_story_from_scenario(scenerio)
 
     def get_selected_story(self):
         return self.metatag.get()
@@ -928,21 +1009,67 @@ class BDDToolbox:
         m2_settings = r'--settings C:\users\kbw5\.m2\settings.xml'
 
         command = r'call mvn'\
-                  + ' tests'\
+                  + ' verify'\
                   + ' serenity:aggregate'\
                   + ' -Dwebdriver.driver=' + webdriver_driver\
                   + ' -Dwebdriver.ie.driver=' + webdriver_ie_driver\
                   + ' -Dwebdriver.remote.url=' + webdriver_remote_url\
                   + ' -Dserenity.take.screenshots=' + serenity_take_screenshots\
-                  + ' -Dmaven.tests.failure.ignore=true ' \
-                  + ' -Dmetafilter="+smoke'\
-                  + m2_settings
+                  + ' -Dmaven.tests.failure.ignore=true'\
+                  + ' ' + m2_settings
+                  #+ ' -DincludeAllSubFoldersInStoryPath=' + include_all_sub_folders_in_story_path\
 
-                  # + self.relative_story_names_to_run \
+        if self.relative_story_names_to_run.strip():
+            command += ' -DrelativeStoryNamesToRun=' + self.relative_story_names_to_run.strip()
+        from metafilter import with_metafilter
+        return with_metafilter(command, self.metafilter.get())
 
-                  #+ ' -DrelativeStoryNamesToRun=' + self.relative_story_names_to_run\
-                  #+ ' -DincludeAllSubFoldersInStoryPath=' + include_all_sub_folders_in_story_path\
-        return command
+    def get_maven_shards(self):
+        """Number of concurrent Maven processes a test run is split into, from settings.json."""
+        try:
+            return max(1, int(self.settings['Maven']['shards']))
+        except (KeyError, TypeError, ValueError):
+            return 1
+
+    def get_maven_port(self):
+        """Port of the first Selenium server, the others count up from it."""
+        try:
+            return int(self.settings['Maven']['port'])
+        except (KeyError, TypeError, ValueError):
+            return 5555
+
+    def get_selenium_servers(self):
+        """Number of Selenium servers to keep running, from settings.json. Defaults to one per shard."""
+        try:
+            return max(1, int(self.settings['Selenium']['servers']))
+        except (KeyError, TypeError, ValueError):
+            return self.get_maven_shards()
+
+    def get_selenium_command(self):
+        try:
+            return self.settings['Selenium']['command']
+        except (KeyError, TypeError):
+            return 'java.exe -Dwebdriver.ie.driver=' + self.app_root + '\\extra\\IEDriverServer.exe -jar ' + self.app_root + '\\extra\\selenium-server-standalone-2.43.1.jar -port {port}'
+
+    def acquire_remote_urls(self, count):
+        """Up to count Selenium servers for a test run, taken from the pool when it is running."""
+        port = self.get_maven_port()
+        if self.selenium_pool is None:
+            # Servers started outside of the toolbox, one per port
+            return ['http://127.0.0.1:{}/wd/hub'.format(port + number) for number in range(count)]
+
+        self.remote_urls = []
+        for number in range(count):
+            url = self.selenium_pool.acquire(timeout=0)
+            if url is None:
+                break
+            self.remote_urls.append(url)
+        return list(self.remote_urls)
+
+    def release_remote_urls(self):
+        for url in self.remote_urls:
+            self.selenium_pool.release(url)
+        self.remote_urls = []
 
     def create_tree_requirements_widgets(self):
         # variables
@@ -950,7 +1077,9 @@ class BDDToolbox:
         tab.columns = self.read_usecase_headers()
 
         # frame widgets
-        tab.requirement.treeview = ttk.Treeview(tab.requirement, columns=tab.columns)
+        if hasattr(tab.requirement, 'treeview'):
+            tab.requirement.treeview.destroy()
+        tab.requirement.treeview = VirtualTree(tab.requirement, columns=tab.columns)
         tab.requirement.treeview['show'] = 'headings'
         tab.requirement.treeview.heading(text='1', column=0, anchor=tk.W, command=lambda c=0: sortby(tab.requirement.treeview, c, 0))
         tab.requirement.treeview.heading(text='2', column=1, anchor=tk.W, command=lambda c=1: sortby(tab.requirement.treeview, c, 0))
@@ -967,22 +1096,58 @@ class BDDToolbox:
         tab.requirement.treeview['yscroll'] = tab.requirement.yscroll.set
         tab.requirement.treeview['xscroll'] = tab.requirement.xscroll.set
 
+    @tracing.span('populate test tree')
     def populate_test_tree(self, tree):
         print("--- Populating test tree")
-        filepath = self.filepath_stories.get()
-        for path, dirs, files in os.walk(filepath):
-            for file in files:
-                tree.insert('', 'end', file, text=file)
+        files = self.get_story_index().files
+        for story in files:
+            self.insert_test_tree_story(tree, story)
+        tracing.count('tree rows inserted', len(files))
+
+    def insert_test_tree_story(self, tree, story):
+        from serenity_results import FAILED, describe, format_duration
+        counts, duration = self.results.story(story.name)
+        values = (describe(counts), format_duration(duration)) if counts else ''
+        tags = (FAILED,) if counts.get(FAILED) else ()
+        if not tree.exists(story.name):
+            tree.insert('', 'end', story.name, text=story.name, values=values, tags=tags)
+        else:
+            tree.item(story.name, values=values, tags=tags)
+        tree.delete(*tree.get_children(story.name))
+
+        # Scenarios are only loaded once a story is expanded, until then a placeholder makes it expandable
+        if story.name in self.test_tree_loaded:
+            for scenerio in sorted(story.scenarios):
+                outcome = self.results.scenario(story.name, scenerio)
+                if outcome is None:
+                    tree.insert(story.name, 'end', text=scenerio)
+                else:
+                    tree.insert(story.name, 'end', text=scenerio, values=(outcome.result, format_duration(outcome.duration)), tags=(outcome.result,))
+        elif story.scenarios:
+            tree.insert(story.name, 'end', text='Loading scenarios...')
+
+    def on_test_tree_open(self, event):
+        tree = self.nb.tab_browse.pane.tree_bdd
+        name = tree.focus()
+        if name in self.test_tree_loaded or tree.parent(name) != '':
+            return
 
-                scenerios = []
-                with open(path + '/' + file, 'r') as story:
-                    for line in story:
-                        if "Scenario:" == line[:9]:
-                            scenerios.append(line)
-                scenerios.sort()
+        self.test_tree_loaded.add(name)
+        story = self.get_story_index().story(name)
+        if story is not None:
+            self.insert_test_tree_story(tree, story)
 
-                for scenerio in scenerios:
-                    tree.insert(file, 'end', text=scenerio)
+    def patch_test_tree(self, tree, old, new):
+        """Apply a single story change from StoryIndex.update() to the test tree."""
+        if old is not None and new is None:
+            if tree.exists(old.name):
+                tree.delete(old.name)
+            return
+
+        if old is not None and sorted(old.scenarios) == sorted(new.scenarios) and tree.exists(new.name):
+            return  # Nothing that the tree displays has changed
+
+        self.insert_test_tree_story(tree, new)
 
     def populate_scenerio_tree(self, tab):
         print("--- Populating scenerio tree")
@@ -991,21 +1156,115 @@ class BDDToolbox:
             scenerio = scenerio[:-1]
             tab.tree_bdd.insert('', 'end', value=(scenerio,))
 
+    @tracing.span('populate story tree')
     def populate_story_tree(self, tree):
         print("--- Populating story tree")
         stories = self.read_all_stories()
         for story in stories:
-            tag = 'valid'
-            if ' ' in story:
-                tag = 'invalid'
-                print('This story contains a space in its filename:', story)
-            if '.story' not in story:
-                tag = 'invalid'
-                print('This story does not have a lower case extension of .story', story)
-            tree.insert('', 'end', value=story, tags=(tag,))
+            self.insert_story_tree_item(tree, story)
+        tracing.count('tree rows inserted', len(stories))
 
         #self.count_story.set(len(stories))
 
+    def insert_story_tree_item(self, tree, story):
+        tag = 'valid'
+        if ' ' in story:
+            tag = 'invalid'
+            print('This story contains a space in its filename:', story)
+        if '.story' not in story:
+            tag = 'invalid'
+            print('This story does not have a lower case extension of .story', story)
+        from serenity_results import FAILED, describe
+        counts, duration = self.results.story(story)
+        tags = (tag, FAILED) if counts.get(FAILED) else (tag,)
+        tree.insert('', 'end', story, value=(story, describe(counts)), tags=tags)
+
+    def patch_story_tree(self, tree, old, new):
+        """Apply a single story change from StoryIndex.update() to the tag tab story tree."""
+        if new is None:
+            if tree.exists(old.name):
+                tree.delete(old.name)
+        elif old is None and not tree.exists(new.name):
+            self.insert_story_tree_item(tree, new.name)
+
+    def start_story_watcher(self):
+        """(Re)start watching the indexed story directory for changes made outside of the toolbox."""
+        if self.story_watcher is not None:
+            self.story_watcher.stop()
+            self.story_watcher = None
+
+        directory = self.get_story_index().directory
+        if os.path.isdir(directory):
+            self.story_watcher = StoryWatcher(directory).start()
+            print('--- Watching stories for changes using', self.story_watcher.backend)
+
+    def on_story_watcher_poll(self):
+        watcher = self.story_watcher
+        if watcher is not None and watcher.directory != self.get_story_index().directory:
+            self.start_story_watcher()  # The story directory was changed
+        elif watcher is not None:
+            changed = watcher.poll()
+            if changed is None:
+                self.refresh_stories()
+            elif changed:
+                self.apply_story_changes(changed)
+
+        self.root.after(500, self.on_story_watcher_poll)
+
+    def apply_story_changes(self, paths):
+        """Re-parse only the stories in paths and patch the trees that display them."""
+        index = self.get_story_index()
+
+        changes = []
+        for path in sorted(paths):
+            old, new = index.update(path, self.get_story_cache())
+            if old is None and new is None:
+                continue
+            print('* Story changed:', path)
+            changes.append((old, new))
+
+        if changes and self.results is not None:
+            self.results.match(index)  # scenarios may have been renamed
+        for old, new in changes:
+            # Tabs that haven't been shown yet are populated from the index when they are
+            if self.tab_built('tab_browse'):
+                self.patch_test_tree(self.nb.tab_browse.pane.tree_bdd, old, new)
+            if self.tab_built('tab_tag'):
+                self.patch_story_tree(self.nb.tab_tag.pane.top.pane.left.tree, old, new)
+
+        self.update_counts()
+
+    def refresh_stories(self):
+        """Rebuild the story index from scratch and repopulate every story tree."""
+        self.index = None
+        self.test_tree_loaded = set()
+        if self.results is not None:
+            self.results.match(self.get_story_index())
+        if self.tab_built('tab_browse'):
+            tree_bdd = self.nb.tab_browse.pane.tree_bdd
+            tree_bdd.delete(*tree_bdd.get_children())
+            self.populate_test_tree(tree_bdd)
+        if self.tab_built('tab_tag'):
+            tree_story = self.nb.tab_tag.pane.top.pane.left.tree
+            tree_story.delete(*tree_story.get_children())
+            self.populate_story_tree(tree_story)
+        self.update_counts()
+
+    def update_counts(self):
+        index = self.get_story_index()
+        self.coverage_matrix = None  # the stories changed
+        self.meta_index = None
+        self.update_variables()
+        if self.tab_built('tab_browse'):
+            self.nb.tab_browse.pane.combobox_meta['values'] = self.metatags_key
+            self.populate_meta_tree(index.directory, self.meta_tree_prefix)
+        self.count_stories.set(len(index.files))
+        self.count_scenerios.set(sum(len(story.scenarios) for story in index.files))
+        if self.tab_built('tab_execute'):
+            self.on_metafilter_change()
+        if self.tab_built('tab_requirements'):
+            self.update_coverage()
+
     def update_stories(self):
         #self.update_variables()
 
@@ -1044,7 +1303,13 @@ class BDDToolbox:
         self.create_tree_requirements_widgets()
         self.populate_requirements_tree()
 
-        self.count_requirements.set(len(self.read_all_requirements(self.get_selected_requirement())))
+        self.count_requirements.set(self.get_requirement_count(self.get_selected_requirement()))
+        self.update_coverage()
+
+    def update_coverage(self):
+        """Show how much of the selected requirements file the stories cover in the Requirements tab footer."""
+        coverage = self.get_coverage_matrix().coverage(self.get_selected_requirement())
+        self.coverage_requirements.set('~' if coverage is None else '{:.1%}'.format(coverage))
 
     def update_tab_browse(self):
         print('* Updating tab - Browse')
@@ -1058,66 +1323,47 @@ class BDDToolbox:
         #self.update_tab_browse_tree_meta(directory, metatag)
         #self.update_tab_browse_tree_bdd(directory, metatag)
 
+    @tracing.span('populate meta tree')
     def populate_meta_tree(self, directory, prefix_metatag):
         tree = self.nb.tab_browse.pane.tree_meta
-        stories = self.filepath_stories.get()
+        index = self.get_story_index(directory)
 
-        # Toggle between all metatags, or a specific metatag key
+        # Toggle between all metatags, or the values of a specific metatag key
         if prefix_metatag == '@metatag':
-            metatag_list = self.metatags_key
+            counts = index.metatag_counts()
         else:
-            metatag_list = self.read_metatag_data(stories, prefix_metatag, False)
+            counts = index.metatag_counts(prefix_metatag)
 
-        key_count = len(metatag_list)
-        value_requirement_count = 0
-        value_business_rule_count = 0
-        value_usecase_count = 0
+        # Coverage is per metatag key, the values of a single key have none
+        coverage = {}
+        if prefix_metatag == '@metatag':
+            matrix = self.get_coverage_matrix()
+            coverage = {key: matrix.key_coverage(key) for key in counts}
+
+        # Switching between all metatags and a single key replaces every row
+        if prefix_metatag != self.meta_tree_prefix:
+            tree.delete(*tree.get_children())
+            self.meta_tree_rows = {}
+            self.meta_tree_prefix = prefix_metatag
+
+        # Only touch the rows that actually changed
+        rows = {row[0]: row for row in metatag_table(counts, coverage)}
+        for key in self.meta_tree_rows.keys() - rows.keys():
+            tree.delete(self.meta_tree_rows.pop(key)[0])
+        inserted = len(rows.keys() - self.meta_tree_rows.keys())
+        for key, row in rows.items():
+            if key not in self.meta_tree_rows:
+                self.meta_tree_rows[key] = (tree.insert('', 'end', values=row), row)
+            elif self.meta_tree_rows[key][1] != row:
+                iid = self.meta_tree_rows[key][0]
+                tree.item(iid, values=row)
+                self.meta_tree_rows[key] = (iid, row)
+
+        tracing.count('tree rows inserted', inserted)
 
         # How many distinct metatag values do we have?
-        metatag_values = 0
-        for index, value in enumerate(metatag_list):
-            values_list = self.read_metatag_data(directory, value, True)
-            metatag_values += len(values_list)
-
-            # Keep track of predefined requirements
-            if (value == '@requirement'):
-                value_requirement_count += 1
-
-            # Is this a business rule?
-            if (value == '@business_rule'):
-                value_business_rule_count += 1
-
-            # Is this a usecase?
-            if (value == '@usecase'):
-                value_usecase_count += 1
-
-        # clear treeview contents
-        tree.delete(*tree.get_children())
-
-        try:
-            for index, value in enumerate(metatag_list):
-                values_list = self.read_metatag_data(directory, value, True)
-                key_count = len(values_list)
-                key_percentage = '{:.1%}'.format(key_count / metatag_values)  # One decimal format (0.00%)
-
-                count_usecases = len(self.read_all_requirements('Usecases'))
-                count_business_data = len(self.read_all_requirements('Business Data'))
-
-                # Is this a business requirement?
-                if (value == '@business_rule'):
-                    val_coverage = '{:.1%}'.format(key_count / count_business_data)  # One decimal format (0.00%)
-                elif (value == '@usecase'):
-                    val_coverage = '{:.1%}'.format(key_count / count_usecases)  # One decimal format (0.00%)
-                else:
-                    val_coverage = '~'  # Only provide coverage for requirements that are listed in the requirements tab
-
-                tree.insert('', 'end', values=(value, key_count, key_percentage, val_coverage))
-
-        except Exception as e:
-            pass
-
-        self.meta_values.set(metatag_values)
-        self.meta_keys.set(key_count)
+        self.meta_values.set(sum(counts.values()))
+        self.meta_keys.set(len(counts))
 
     def update_tab_browse_tree_bdd(self, directory, tag):
         tree = self.nb.tab_browse.tree_bdd
@@ -1136,28 +1382,29 @@ class BDDToolbox:
     #    label.set(askdirectory())
 
     def update_label_filepath(self, label):
+        from tkinter.filedialog import askopenfilename
         filepath = askopenfilename(initialdir='data', title='Load a settings file (.json only)', filetypes=((".json files","*.json"),("all files","*.*")))  # returns an empty string on cancel
         if filepath != '':
             label.set(os.path.join(filepath))
 
     def update_story_filepath(self):
+        from tkinter.filedialog import askdirectory
         filepath = askdirectory (initialdir='', title='Where are your test .story files located?')  # returns an empty string on cancel
         if filepath != '':
             self.filepath_stories.set(os.path.join(filepath))
 
+    @tracing.span('populate requirements tree')
     def populate_requirements_tree(self):
         requirement = self.nb.tab_requirements.settings.combobox.get()
         tree = self.nb.tab_requirements.requirement.treeview
-        file = open(self.settings[requirement].get(), encoding="utf8")
-        data = csv.reader(file)
-
-        # tags found - Update tags tab
-        for i_row, row in enumerate(data):
-            if i_row == 0:
-                for i_header, header in enumerate(self.nb.tab_requirements.columns):
-                    tree.heading(column=i_header, text=header, anchor=tk.W)
-            else:
-                tree.insert('', 'end', text=row, values=row)
+        requirements = self.get_requirements(requirement)
+
+        for i_header, header in enumerate(requirements.headers):
+            tree.heading(column=i_header, text=header, anchor=tk.W)
+
+        for row in requirements.rows():
+            tree.insert('', 'end', text=row, values=row)
+        tracing.count('tree rows inserted', len(requirements))
 
     def update_tab_requirements_dropdown(self):
         self.nb.tab_requirements.settings.combobox['values'] = self.settings.keys()
@@ -1169,16 +1416,34 @@ class BDDToolbox:
     def filter_unique_list(self, sequence):
         return list(set(sequence))
 
-    def save(self, file, list):
-        file = asksaveasfile(mode='w', defaultextension=".txt")
-
-        if file is None:  # asksaveasfile return `None` if dialog closed with "cancel".
+    def save(self, view):
+        """Save a view of the stories (see story_export.VIEWS) as TXT, CSV, JSON Lines or Markdown, going by the extension picked."""
+        from tkinter.filedialog import asksaveasfilename
+        filepath = asksaveasfilename(defaultextension='.txt', initialfile=view + '.txt', filetypes=EXPORT_FILETYPES)
+        if not filepath:  # the dialog was cancelled
             return
+        from story_export import Export
+        self.export_stories([Export(filepath, view)])
+
+    def save_all(self):
+        """Save every view of the stories in every format to a folder, in one pass over the stories."""
+        from tkinter.filedialog import askdirectory
+        directory = askdirectory(title='Save all story lists to', initialdir=self.results_root)
+        if not directory:
+            return
+        from story_export import Export, VIEWS, WRITERS
+        self.export_stories([Export(os.path.join(directory, view + '.' + format), view, format)
+                             for view in VIEWS for format in WRITERS])
 
-        for item in list:
-            file.write(item[:-1] + '\n')
-
-        file.close()
+    def export_stories(self, exports):
+        try:
+            from story_export import export
+            export(self.get_story_index(), exports)
+        except OSError as error:
+            print('Unable to save:', repr(error))
+            return
+        for item in exports:
+            print('- Saved', item.count, 'lines to', item.filepath)
 
     # Actions / clicks
     # -----------------------------------------------------------------------------
@@ -1189,7 +1454,7 @@ class BDDToolbox:
         left_selection = left.item(left.selection())['values']
 
         if left_selection != '':
-            right.insert('', 'end', text=left_selection, values=left_selection)
+            right.insert('', 'end', text=left_selection[0], values=left_selection[:1])  # the story, without its results
             left.delete(left.selection())
 
         stories = ''
@@ -1198,16 +1463,15 @@ class BDDToolbox:
                 stories = stories + value + ','
         stories = stories[:-1]
         self.relative_story_names_to_run = stories + ' '
-        tab.pane.bottom.maven.text.delete('1.0', 'end-1c')
-        tab.pane.bottom.maven.text.insert(tk.INSERT, self.get_maven_command())
+        self.update_maven_command()
 
     def on_test_remove(self, tab):
         left = tab.pane.top.pane.left.tree
         right = tab.pane.top.pane.right.tree
         right_selection = right.item(right.selection())["values"]
 
-        if right_selection != '':
-            left.insert('', 'end', text=right_selection, values=(right_selection,))
+        if right_selection != '' and not left.exists(right_selection[0]):
+            self.insert_story_tree_item(left, right_selection[0])
             right.delete(right.focus())
 
         stories = ''
@@ -1216,53 +1480,183 @@ class BDDToolbox:
                 stories = stories + value + ','
         stories = stories[:-1]
         self.relative_story_names_to_run = stories + ' '
-        tab.pane.bottom.maven.text.delete('1.0', 'end-1c')
-        tab.pane.bottom.maven.text.insert(tk.INSERT, self.get_maven_command())
+        self.update_maven_command()
+
+    def get_meta_index(self):
+        """Scenario bitsets by meta value for the metafilter preview, rebuilt after the stories change."""
+        index = self.get_story_index()
+        if self.meta_index is None or self.meta_index_key != id(index):
+            from metafilter import MetaIndex
+            self.meta_index = MetaIndex(index)
+            self.meta_index_key = id(index)
+        return self.meta_index
+
+    def on_metafilter_change(self):
+        """Count what the metafilter selects as it is typed, and list it once typing pauses."""
+        from coverage_matrix import popcount
+        from metafilter import MetaFilterError, parse_metafilter
+        try:
+            meta = self.get_meta_index()
+            selected = parse_metafilter(self.metafilter.get()).evaluate(meta)
+        except MetaFilterError as error:
+            self.metafilter_preview.set('Metafilter error: {}'.format(error))
+            return
+
+        count = popcount(selected)
+        self.metafilter_preview.set('{} of {} scenarios selected'.format(count, meta.size))
+        if self.metafilter_pending is not None:
+            self.root.after_cancel(self.metafilter_pending)
+        self.metafilter_pending = self.root.after(METAFILTER_PREVIEW_MS, self.show_metafilter_preview, selected, count)
+
+    def show_metafilter_preview(self, selected, count):
+        self.metafilter_pending = None
+        meta = self.get_meta_index()
+        body = self.nb.tab_execute.body
+        stories = meta.stories(selected)
+
+        tree = body.metafilter.tree
+        tree.delete(*tree.get_children())
+        for values in meta.select(selected, METAFILTER_PREVIEW_ROWS):
+            tree.insert('', 'end', values=values)
+
+        text = '{} of {} scenarios selected, in {} stories'.format(count, meta.size, len(stories))
+        if count > METAFILTER_PREVIEW_ROWS:
+            text += ' (first {} listed)'.format(METAFILTER_PREVIEW_ROWS)
+        self.metafilter_preview.set(text)
+
+        # Keep whatever else has been typed into the Maven command
+        command = body.maven.text.get('1.0', 'end-1c')
+        body.maven.text.delete('1.0', 'end-1c')
+        from metafilter import with_metafilter
+        body.maven.text.insert(tk.INSERT, with_metafilter(command, self.metafilter.get()))
+
+    def get_project_root(self):
+        """Where Maven runs from, four levels above src/test/resources/stories."""
+        return os.path.abspath(os.path.join(self.filepath_stories.get(), '..', '..', '..', '..'))
+
+    def get_serenity_directory(self):
+        return os.path.join(self.get_project_root(), 'target', 'site', 'serenity')
+
+    def load_results(self):
+        """Read the Serenity outcomes the first time a tree shows them."""
+        if self.results is None:
+            from serenity_results import ResultIndex
+            self.results = ResultIndex()
+        if self.results.directory != self.get_serenity_directory():
+            self.results.ingest(self.get_serenity_directory(), self.get_story_index())
+
+    def refresh_results(self):
+        """Read new Serenity outcomes, e.g. after a test run, and show them in the Browse and Tag trees."""
+        from serenity_results import describe
+        self.load_results()
+        read = self.results.ingest(self.get_serenity_directory(), self.get_story_index())
+        print('- Read {} Serenity outcome files, results: {}'.format(read, describe(self.results.totals()) or 'none'))
+        self.show_results()
+
+    def show_results(self):
+        from serenity_results import FAILED, describe
+        index = self.get_story_index()
+        if self.tab_built('tab_browse'):
+            tree = self.nb.tab_browse.pane.tree_bdd
+            for story in index.files:
+                self.insert_test_tree_story(tree, story)
+        if self.tab_built('tab_tag'):
+            tree = self.nb.tab_tag.pane.top.pane.left.tree
+            for name in tree.get_children():
+                counts, duration = self.results.story(name)
+                tags = [tag for tag in tree.item(name, 'tags') if tag != FAILED] + ([FAILED] if counts.get(FAILED) else [])
+                tree.item(name, values=(name, describe(counts)), tags=tags)
+
+    def update_maven_command(self):
+        if not self.tab_built('tab_execute'):
+            return  # picked up when the tab is built
+        maven = self.nb.tab_execute.body.maven
+        maven.text.delete('1.0', 'end-1c')
+        maven.text.insert(tk.INSERT, self.get_maven_command())
 
     def on_test_execution(self, tab):
-        tab.pane.bottom.log.text.insert(tk.INSERT, 'Starting Tests\nPlease be patient while they run in the background\n\n------\n\n')
+        if self.maven_run is not None and not self.maven_run.finished():
+            return  # Already running
+        from maven_runner import MavenRun, ShardedMavenRun, find_argument, with_remote_url
 
-        os.chdir(self.filepath_stories.get())
-        os.chdir('..')
-        os.chdir('..')
-        os.chdir('..')
-        os.chdir('..')
-        input = tab.pane.bottom.maven.text.get('1.0', 'end-1c')
-        input_list = input.split(' ')  # avoid the 'input line too long error' that happens when a line is > 255 chars
+        try:
+            filepath = tab.log.text.open_file(self.get_log_filepath())
+        except OSError as error:
+            filepath = None
+            print('Unable to open log file:', repr(error))
+        tab.log.text.write('Starting Tests\nPlease be patient while they run in the background\n\n------\n\n')
+        if filepath:
+            tab.log.text.write('Full output: {}\n\n'.format(filepath))
+
+        project_root = self.get_project_root()
+        input = tab.maven.text.get('1.0', 'end-1c')
+        shards = self.get_maven_shards()
+
+        remote_urls = self.acquire_remote_urls(shards)
+        if not remote_urls:
+            tab.log.text.write('No Selenium server is ready yet, try again in a moment\n')
+            tab.log.text.close_file()
+            return
 
-        process = subprocess.Popen(input_list, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            if shards > 1:
+                # Either the stories picked in the Tag tab or every story
+                selected = find_argument(input, 'relativeStoryNamesToRun')
+                index = self.get_story_index()
+                stories = selected.split(',') if selected else index.story_files()
+                weights = {story: len(index.scenarios_in(story)) for story in stories}
+                self.maven_run = ShardedMavenRun(input, stories, shards, remote_urls, cwd=project_root, weights=weights)
+                tab.log.text.write('Running {} stories as {} shards\n\n'.format(len(stories), len(self.maven_run.shards)))
+            else:
+                if self.selenium_pool is not None:
+                    input = with_remote_url(input, remote_urls[0])
+                input_list = input.split(' ')  # avoid the 'input line too long error' that happens when a line is > 255 chars
+                self.maven_run = MavenRun(input_list, cwd=project_root)
+            self.maven_run.start()
+        except OSError as error:
+            # e.g. the project root in settings.json doesn't exist
+            tab.log.text.write('Unable to start Maven in {}: {}\n'.format(project_root, error))
+            self.maven_run = None
+            self.release_remote_urls()
+            tab.log.text.close_file()
+            return
+        tab.test.run.state(['disabled'])
+        self.on_test_output(tab)
 
-        while True:
-            nextline = process.stdout.readline()
-            if nextline == b'' and process.poll() != None:
-                break
-            tab.pane.bottom.log.text.insert(tk.END, nextline.decode('utf-8'))
-            tab.pane.bottom.log.text.update_idletasks()
+    def on_test_output(self, tab):
+        """Move whatever Maven printed since the last call into the log in a single insert."""
+        run = self.maven_run
+        finished = run.finished()
 
-        # output = process.communicate()[0]
-        exitCode = process.returncode
-        process.terminate()
+        output = run.drain()
+        tab.log.text.write(output)
 
-        # process.terminate()
+        if not finished:
+            self.root.after(LOG_POLL_MS, self.on_test_output, tab)
+            return
 
-        # display cmd text
-        # tab.pane.bottom.log.text.insert(tk.END, output)
-        # tab.pane.bottom.log.text.insert(tk.END, '\n')
+        tab.test.run.state(['!disabled'])
+        self.release_remote_urls()
+        self.refresh_results()
         # only show errors if they actually happen
-        if exitCode is not 0:
-            pass
-            # tab.pane.bottom.log.text.insert(tk.END,'ERROR(S):\n ')
-            # tab.pane.bottom.log.text.insert(tk.END,error)
-            # tab.pane.bottom.log.text.insert(tk.END,'\n')
+        if run.returncode != 0:
+            tab.log.text.write('\n------\n\nMaven exited with code {}\n'.format(run.returncode))
+        tab.log.text.close_file()
 
     def on_selenium_server_start(self):
-        cmd = 'java.exe -Dwebdriver.ie.driver=' + self.app_root + '\extra\IEDriverServer.exe -jar ' + self.app_root + '\extra\selenium-server-standalone-2.43.1.jar -port 5555"'
-        process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
-        output, error = process.communicate()
-        print(cmd)
-        process.terminate()
+        """Start the pool of Selenium servers test runs take their WebDriver endpoints from."""
+        if self.selenium_pool is not None:
+            print('Selenium servers ready:', self.selenium_pool.ready())
+            return
+
+        from selenium_pool import SeleniumPool
+        port = self.get_maven_port()
+        ports = range(port, port + self.get_selenium_servers())
+        self.selenium_pool = SeleniumPool(self.get_selenium_command(), ports, cwd=self.app_root).start()
+        print('Starting Selenium servers on ports', list(ports))
 
     def on_selenium_server_start_as(self):
+        import selenium_server_standalone
         selenium_server_standalone.server()
 
     def on_story_edit(self, event):
@@ -1347,47 +1741,112 @@ class BDDToolbox:
         about.grid_columnconfigure(1, weight=1)
 
     def show_coverage_matrix(self):
-        text = 'Coverage matrix to go here...'
+        from coverage_matrix import popcount
+        matrix = self.get_coverage_matrix()
+        names = sorted(matrix.bits)
 
         top_level = tk.Toplevel()
-        top_level.title('')
+        top_level.title('Coverage Matrix')
         # TODO This will error after test execution becaue the os.path.dirname has been changed and the icon cant be found
         # top_level.iconbitmap(os.path.dirname(os.path.abspath('__file__')) + '\\img\\transparent.ico')
 
+        # variables
+        selected = tk.StringVar()
+        summary = tk.StringVar()
+
         # widgets
         frame = ttk.Frame(top_level)
-        about = ttk.Frame(frame)
-        contents = tk.Label(frame, text=text, image=self.img.information_blue, compound=tk.LEFT)
+        header = ttk.Frame(frame)
+        combobox = ttk.Combobox(header, textvariable=selected, values=names, state='readonly')
+        label = ttk.Label(header, textvar=summary, image=self.img.information_blue, compound=tk.LEFT)
+        pane = ttk.PanedWindow(frame, orient=tk.HORIZONTAL)
+        left = ttk.Frame(pane)
+        right = ttk.Frame(pane)
+        pane.add(left, weight=1)
+        pane.add(right, weight=1)
+
+        requirement_columns = ('ID', 'Scenarios', 'Stories')
+        requirements = VirtualTree(left, columns=requirement_columns, selectmode='browse')
+        requirements['show'] = 'headings'
+        scenarios = VirtualTree(left, columns=('Story', 'Scenario'))
+        scenarios['show'] = 'headings'
+        story_columns = ('Story', 'Tagged Scenarios', 'Requirements', 'Only Here')
+        stories = VirtualTree(right, columns=story_columns)
+        stories['show'] = 'headings'
+
+        for tree, columns in ((requirements, requirement_columns), (scenarios, ('Story', 'Scenario')), (stories, story_columns)):
+            for c, column in enumerate(columns):
+                tree.heading(c, text=column, anchor=tk.W, command=lambda tree=tree, c=c: sortby(tree, c, 0))
+                tree.column(c, width=300 if column in ('Story', 'Scenario') else 90)
+            yscroll = ttk.Scrollbar(tree.master, orient=tk.VERTICAL, command=tree.yview)
+            tree['yscroll'] = yscroll.set
+            tree.yscroll = yscroll
+
+        def on_requirements_change(event=None):
+            name = selected.get()
+            covered, total = matrix.covered(name), len(matrix.bits[name])
+            tagged = popcount(matrix.tagged_scenarios(name))
+            summary.set('{} of {} requirements covered ({}), by {} of {} scenarios'.format(
+                covered, total, '{:.1%}'.format(covered / total) if total else '~', tagged, matrix.size))
+
+            for tree in (requirements, scenarios, stories):
+                tree.delete(*tree.get_children())
+            for row, values in enumerate(matrix.rows(name)):
+                requirements.insert('', 'end', str(row), values=values)
+            for values in matrix.story_contributions(name):
+                stories.insert('', 'end', values=values)
+
+        def on_requirement_select(event=None):
+            scenarios.delete(*scenarios.get_children())
+            for row in requirements.selection():
+                for values in matrix.scenarios_for(selected.get(), int(row)):
+                    scenarios.insert('', 'end', values=values)
+
+        combobox.bind('<<ComboboxSelected>>', on_requirements_change)
+        requirements.bind('<<TreeviewSelect>>', on_requirement_select, add=True)
 
         # geometry
         frame.grid(row=0, column=0, sticky=tk.NSEW, padx=0, pady=0)
-        about.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
-        contents.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
+        header.grid(row=0, column=0, sticky=tk.NSEW, padx=5, pady=5)
+        combobox.grid(row=0, column=0, sticky=tk.W)
+        label.grid(row=0, column=1, sticky=tk.W, padx=5)
+        pane.grid(row=1, column=0, sticky=tk.NSEW, padx=5, pady=(0, 5))
+        requirements.grid(row=0, column=0, sticky=tk.NSEW)
+        requirements.yscroll.grid(row=0, column=1, sticky=tk.NS)
+        scenarios.grid(row=1, column=0, sticky=tk.NSEW, pady=(5, 0))
+        scenarios.yscroll.grid(row=1, column=1, sticky=tk.NS, pady=(5, 0))
+        stories.grid(row=0, column=0, sticky=tk.NSEW)
+        stories.yscroll.grid(row=0, column=1, sticky=tk.NS)
 
         # weights
         top_level.grid_rowconfigure(0, weight=1)
         top_level.grid_columnconfigure(0, weight=1)
         frame.grid_rowconfigure(1, weight=1)
         frame.grid_columnconfigure(0, weight=1)
-        about.grid_columnconfigure(1, weight=1)
+        left.grid_rowconfigure(0, weight=2)
+        left.grid_rowconfigure(1, weight=1)
+        left.grid_columnconfigure(0, weight=1)
+        right.grid_rowconfigure(0, weight=1)
+        right.grid_columnconfigure(0, weight=1)
+
+        if names:
+            selected.set(self.get_selected_requirement() if self.get_selected_requirement() in names else names[0])
+            on_requirements_change()
+        else:
+            summary.set('No requirements files are set up, add them under "Requirements" in settings.json')
 
     def show_editor(self, tab):
 
         def on_save():
-            # Overwrite opened file
-            for path, directorys, files in os.walk(self.filepath_stories.get()):
-                for file in files:
-                    if file == item:
-                        print('Overwriting', file)
-                        f = open(path + '\\' + file, 'r+')
-                        edits = text.get('1.0', 'end-1c')
-                        print('----------------------------------------------------------------------------------------')
-                        print(edits)
-                        f.seek(0)
-                        f.write(edits)
-                        f.truncate()
-                        f.close()
-                        break
+            # Overwrite the file that was opened, by its full path
+            print('Overwriting', path)
+            try:
+                write_story_text(path, text.get('1.0', 'end-1c'), newline)
+            except OSError as error:
+                from tkinter.messagebox import showerror
+                showerror('Unable to save story', 'Unable to save {}:\n\n{}'.format(path, error), parent=top_level)
+                return text
+            self.apply_story_changes([path])
             return text
 
         def on_bigger():
@@ -1410,33 +1869,6 @@ class BDDToolbox:
             else:
                 frame.custom_font.configure(family=monospaced)
 
-        def on_hightlight_syntax():
-            regexs = {}
-            regexs['NARRATIVE'] = re.compile('(\W|^)(Narrative:|In order to|As a|I want to)(\W|$)')
-            regexs['SCENARIO'] = re.compile('(\W|^)Scenario:(\W|$)')
-            regexs['META_KEYWORD'] = re.compile('(\W|^)Meta:(\W|$)')
-            regexs['META'] = re.compile('(\W|^)@(\W|$)')
-            regexs['KEYWORD'] = re.compile('(\W|^)(Given|When|Then|And)(\W|$)')
-            regexs['EXAMPLES_TABLE'] = re.compile('(\W|^)Examples(\W|$)')
-            text.tag_configure('NARRATIVE', foreground='Blue')
-            text.tag_configure('SCENARIO', foreground='Purple')
-            text.tag_configure('META_KEYWORD', foreground ='Orange')
-            text.tag_configure('META', foreground ='Green')
-            text.tag_configure('KEYWORD', foreground='Orange')
-            text.tag_configure('EXAMPLES_TABLE', foreground='Red')
-
-            for line_index, line in enumerate(story.split('\n')):
-                for regex in regexs.keys():
-                    try:  # to find text to color
-                        start_index, end_index = regexs[regex].search(line).span()
-                        line_offset_by_one = str(1+ line_index)
-                        start = line_offset_by_one + '.' + str(start_index)
-                        end = line_offset_by_one + '.' + str(end_index)
-
-                        text.tag_add(regex, start, end)
-                    except:
-                        pass  # regex match failed
-
         # item = tab.tree.item(tab.tree.selection())["values"][0]
         item = tab.pane.tree_bdd.selection()
         item = str(item)
@@ -1446,7 +1878,21 @@ class BDDToolbox:
         if (item[-6:] != '.story'):
             return
 
-        story = self.read_story(item)
+        # The tree shows stories by file name, which is only safe to open when one folder has a story of that name
+        paths = self.get_story_index().paths(item)
+        if len(paths) > 1:
+            from tkinter.messagebox import showerror
+            showerror('Story Editor', 'More than one story is called {}, rename all but one to edit it here:\n\n{}'.format(item, '\n'.join(paths)))
+            return
+        if not paths:
+            return
+        path = paths[0]
+        try:
+            story, newline = read_story_text(path)
+        except OSError as error:
+            from tkinter.messagebox import showerror
+            showerror('Story Editor', 'Unable to open {}:\n\n{}'.format(path, error))
+            return
 
         # TODO allow user to edit story by choosing ascenarioo
         #     try:
@@ -1476,12 +1922,14 @@ class BDDToolbox:
         text = tk.Text(editor, font=frame.custom_font)
         text.insert(tk.INSERT, story)
 
-        # highlight text by default
-        on_hightlight_syntax()
+        # highlight text by default, and the lines being edited as the user types
+        from story_highlighter import StoryHighlighter
+        highlighter = StoryHighlighter(text)
+        highlighter.highlight_all()
         # text.yscroll = ttk.Scrollbar(orient=tk.VERTICAL, command=text.yview)
         # text['yscroll'] = text.yscroll.set
         save = ttk.Button(settings, text='Save', command=on_save)
-        highlight = ttk.Button(settings, text='Highlight', command=on_hightlight_syntax)
+        highlight = ttk.Button(settings, text='Highlight', command=highlighter.highlight_all)
         increase_font = ttk.Button(settings, text='Increase Fontsize', command=on_bigger)
         reduce_font = ttk.Button(settings, text='Reduce Fontsize', command=on_smaller)
         toggle_font = ttk.Button(settings, text='Monospaced', command=on_toggle_monospaceing)
@@ -1531,10 +1979,60 @@ class BDDToolbox:
         self.error.grid_columnconfigure(2, weight=1)
 
 class SplashScreen:
-    def __init__(self, root, file, wait):
+    """Shows the splash screen while work runs on a worker thread.
+
+    The worker reports its progress through a thread safe queue, which the
+    Tk thread polls with after() and displays on the splash screen.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, file):
         self.__root = root
         self.__file = file
-        self.__wait = wait + time.clock()
+        self.__queue = queue.Queue()
+
+    def run(self, work, done):
+        """Call work(progress) on a worker thread, then done(result, error) on the Tk thread."""
+        self.__enter__()
+
+        def worker():
+            try:
+                self.__queue.put((True, work(self.progress), None))
+            except Exception as e:
+                self.__queue.put((True, None, e))
+
+        threading.Thread(target=worker, name='splash-screen', daemon=True).start()
+        self.__root.after(self.POLL_MS, self.__poll, done)
+
+    def progress(self, message):
+        """Queue up a progress message, safe to call from any thread."""
+        self.__queue.put((False, message, None))
+
+    def show(self, message):
+        """Display a progress message right away, only call from the Tk thread."""
+        self.__canvas.itemconfigure(self.__message, text=message)
+        self.__window.update_idletasks()
+
+    def __poll(self, done):
+        message = None
+        while True:
+            try:
+                finished, value, error = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if finished:
+                try:
+                    done(value, error)
+                finally:
+                    self.__exit__(None, None, None)
+                return
+            message = value
+
+        if message is not None:
+            self.show(message)
+        self.__root.after(self.POLL_MS, self.__poll, done)
 
     def __enter__(self):
         # Hide the root while it is built.
@@ -1560,17 +2058,16 @@ class SplashScreen:
         canvas.grid()
         # Show the splash screen on the monitor.
         canvas.create_image(imgW // 2, imgH // 2, image=splash)
+        message = canvas.create_text(8, imgH - 6, anchor=tk.SW, fill='white', text='')
         window.update()
         # Save the variables for later cleanup.
         self.__window = window
         self.__canvas = canvas
         self.__splash = splash
+        self.__message = message
+        return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # Ensure that required time has passed.
-        now = time.clock()
-        if now < self.__wait:
-            time.sleep(self.__wait - now)
         # Free used resources in reverse order.
         del self.__splash
         self.__canvas.destroy()
@@ -1580,6 +2077,31 @@ class SplashScreen:
         self.__root.deiconify()
 
 
+class StartupReport:
+    """Time spent in each phase of start up, each phase running from the end of the previous one."""
+
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.phases = []  # (name, seconds)
+        self.reported = False
+
+    def phase(self, name):
+        if self.reported:
+            return  # tabs opened later aren't part of start up
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        tracing.record('startup: ' + name, now - self.last)
+        self.last = now
+
+    def report(self):
+        self.reported = True
+        print('- Startup')
+        for name, seconds in self.phases:
+            print('    {:<20} {:>7.0f} ms'.format(name, seconds * 1000))
+        print('    {:<20} {:>7.0f} ms'.format('Total', (self.last - self.started) * 1000))
+
+
 class StoryEditor:
     def __init__(self, root, file):
         self.__root = root
@@ -1638,17 +2160,20 @@ class Icons:
         # http://tango.freedesktop.org/Tango_Showroom  # Public domain
 
 
-def sortby(tree, col, descending):
-    """Sort tree contents when a column is clicked on."""
-    # grab values to sort
-    data = [(tree.set(child, col), child) for child in tree.get_children('')]
+def open_url(url):
+    import webbrowser  # slow to import and only needed for the help links
+    webbrowser.open(url)
 
-    # TODO: This only sorts on the first character. Needs to convert to an int, sort, and the go back to a string.
 
-    # reorder data
-    data.sort(reverse=descending)
-    for index, item in enumerate(data):
-        tree.move(item[1], '', index)
+def sortby(tree, col, descending):
+    """Sort tree contents when a column is clicked on."""
+    if isinstance(tree, VirtualTree):
+        # sort keys are cached on the rows
+        tree.sort(col, descending)
+    else:
+        # grab values to sort, then reorder every item in a single call
+        data = [(sort_key(tree.set(child, col)), child) for child in tree.get_children('')]
+        tree.set_children('', *sort_items(data, descending))
 
     # switch the heading so that it will sort in the opposite direction
     tree.heading(col, command=lambda col=col: sortby(tree, col, int(not descending)))
@@ -1656,6 +2181,8 @@ def sortby(tree, col, descending):
 # -----------------------------------------------------------------------------
 
 if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()  # Story parsing workers in the frozen executable
     root = tk.Tk()
     BDDToolbox(root)
     root.mainloop()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+"""
+bdd-toolbox: the story counts, metatag tables and requirement coverage of the
+BDD Toolbox without the GUI, e.g. on CI agents that have no display. Nothing
+here imports tkinter.
+
+    bdd-toolbox summary
+    bdd-toolbox metatags --key @usecase --format csv --output usecases.csv
+    bdd-toolbox coverage --stories C:\\dev\\project\\src\\test\\resources\\stories --format json
+    bdd-toolbox export --export stories stories.txt --export stories-scenarios-steps steps.md
+
+The story folder and requirements files are read from settings.json, the
+same file the GUI uses.
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+
+import tracing
+from story_index import StoryIndex, metatag_table
+from coverage_matrix import CoverageMatrix, requirement_keys
+from requirements_store import RequirementsError, read_requirements
+from story_export import Export, VIEWS, export
+
+DATA_ROOT = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), 'data')
+
+
+def load_settings(filepath):
+    try:
+        with open(filepath, encoding='utf8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as error:
+        print('Unable to load settings:', error, file=sys.stderr)
+        return {}
+
+
+def requirement_files(settings):
+    """Requirement name -> CSV file path, from settings.json."""
+    files = {}
+    for name, value in settings.get('Requirements', {}).items():
+        files[name] = value.get('filepath', '') if isinstance(value, dict) else value
+    return files
+
+
+def load_requirements(settings):
+    """Requirement name -> Requirements, for the files in settings.json that can be read."""
+    requirements = {}
+    for name, filepath in requirement_files(settings).items():
+        try:
+            requirements[name] = read_requirements(filepath)
+        except (OSError, RequirementsError) as error:
+            print('Unable to read requirements for', name, error, file=sys.stderr)
+    return requirements
+
+
+def requirement_counts(settings):
+    requirements = load_requirements(settings)
+    return {name: len(requirements[name]) if name in requirements else 0 for name in requirement_files(settings)}
+
+
+def build_index(directory, settings, use_cache):
+    cache = None
+    if use_cache:
+        from story_cache import StoryCache  # sqlite3 is only loaded when the cache is used
+        try:
+            cache = StoryCache(os.path.join(DATA_ROOT, 'story-index.sqlite'))
+        except Exception as error:
+            print('Story cache unavailable:', error, file=sys.stderr)
+
+    try:
+        workers = int(settings['Index']['workers']) or None
+    except (KeyError, TypeError, ValueError):
+        workers = None
+    return StoryIndex(directory).build(cache, workers)
+
+
+# Reports, each returns (headers, rows)
+# -----------------------------------------------------------------------------
+
+def summary(index, settings):
+    counts = index.metatag_counts()
+    rows = [
+        ('Stories', len(index.story_files())),
+        ('Scenarios', len(index.scenarios())),
+        ('Metatag keys', len(counts)),
+        ('Metatag values', sum(counts.values())),
+    ]
+    rows += [('Requirements: ' + name, count) for name, count in sorted(requirement_counts(settings).items())]
+    return ('Name', 'Count'), rows
+
+
+def stories(index, settings):
+    return ('Story', 'Path', 'Scenarios'), [(story.name, story.path, len(story.scenarios))
+                                            for story in sorted(index.files, key=lambda story: story.name)]
+
+
+def scenarios(index, settings):
+    return ('Story', 'Scenario'), [(story.name, scenario.strip())
+                                   for story in sorted(index.files, key=lambda story: story.name)
+                                   for scenario in story.scenarios]
+
+
+def metatag_key(index, key):
+    """key as it is written in the stories, i.e. with or without a colon after it."""
+    keys = index.metatag_keys() if key else ()
+    if key and key not in keys and key + ':' in keys:
+        return key + ':'
+    return key
+
+
+def metatags(index, settings, key=None):
+    counts = index.metatag_counts(metatag_key(index, key))
+    coverage = {}
+    if key is None:  # coverage is per metatag key, not per value
+        matrix = CoverageMatrix(index, load_requirements(settings))
+        coverage = {metatag: matrix.key_coverage(metatag) for metatag in counts}
+    return ('Key', 'Count', 'Percent', 'Coverage'), metatag_table(counts, coverage)
+
+
+def coverage(index, settings):
+    matrix = CoverageMatrix(index, load_requirements(settings))
+    rows = []
+    for name in sorted(matrix.bits):
+        total = len(matrix.bits[name])
+        covered = matrix.covered(name)
+        rows.append((name, ' '.join(requirement_keys(name)), total, covered, '{:.1%}'.format(covered / total) if total else '~'))
+    return ('Requirements', 'Metatags', 'Requirement Count', 'Covered', 'Coverage'), rows
+
+
+REPORTS = {
+    'summary': summary,
+    'stories': stories,
+    'scenarios': scenarios,
+    'metatags': metatags,
+    'coverage': coverage,
+}
+
+
+# Output
+# -----------------------------------------------------------------------------
+
+def write(headers, rows, format, file):
+    if format == 'json':
+        json.dump([dict(zip(headers, row)) for row in rows], file, indent=2)
+        file.write('\n')
+    elif format == 'csv':
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(headers)
+        writer.writerows(rows)
+    else:
+        widths = [max([len(str(value)) for value in column] + [len(header)]) for header, column in zip(headers, zip(*rows or [headers]))]
+        for row in [headers] + list(rows):
+            file.write('  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip() + '\n')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='bdd-toolbox', description='Story, metatag and requirement coverage reports without the GUI.')
+    parser.add_argument('report', nargs='?', default='summary', choices=sorted(REPORTS) + ['export'], help='what to report (default: summary)')
+    parser.add_argument('--key', help='metatags: count the values of this metatag key, e.g. @usecase')
+    parser.add_argument('--stories', help='story folder (default: "Stories" in settings.json)')
+    parser.add_argument('--settings', default=os.path.join(DATA_ROOT, 'settings.json'), help='settings.json to use')
+    parser.add_argument('--format', default='text', choices=('text', 'json', 'csv'))
+    parser.add_argument('--output', help='write to this file instead of stdout')
+    parser.add_argument('--no-cache', action='store_true', help='parse every story instead of using the story cache')
+    parser.add_argument('--export', nargs=2, action='append', default=[], metavar=('VIEW', 'FILE'),
+                        help='export: save VIEW ({}) to FILE as .txt, .csv, .jsonl or .md, can be given more than once'.format(', '.join(sorted(VIEWS))))
+    parser.add_argument('--trace', metavar='FILE', help='save a Chrome trace of where the time went to FILE and print a summary to stderr')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = load_settings(args.settings)
+
+    directory = args.stories or settings.get('Stories', '')
+    if not os.path.isdir(directory):
+        print('Story folder not found:', directory or '(not set)', file=sys.stderr)
+        return 1
+
+    if args.report == 'export':
+        try:
+            exports = [Export(filepath, view) for view, filepath in args.export]
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+        if not exports:
+            print('Nothing to export, give at least one --export VIEW FILE', file=sys.stderr)
+            return 1
+
+    index = build_index(directory, settings, not args.no_cache)
+    if args.report == 'export':
+        # Every file is written in the same pass over the stories
+        for item in export(index, exports):
+            print('Saved', item.count, 'lines to', item.filepath, file=sys.stderr)
+    else:
+        with tracing.span('report', report=args.report):
+            if args.report == 'metatags':
+                headers, rows = metatags(index, settings, args.key)
+            else:
+                headers, rows = REPORTS[args.report](index, settings)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf8', newline='') as file:
+                write(headers, rows, args.format, file)
+        else:
+            write(headers, rows, args.format, sys.stdout)
+
+    if args.trace:
+        tracing.export_chrome_trace(args.trace)
+        tracing.print_summary(sys.stderr)
+    return 0
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Story parsing workers in the frozen executable
+    sys.exit(main())
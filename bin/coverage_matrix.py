@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Requirements x scenarios coverage. Each requirement's ID (from the ID column
+of its requirements file) is joined against the values of the @usecase,
+@requirement and @business_rule metatags, and the scenarios tagged with it
+are kept as a bitset: a Python int with bit n set when scenario n covers
+the requirement. Story level metatags cover every scenario in the story.
+
+Coverage, uncovered requirements and the scenarios of a story are then
+whole-int operations, which stay fast at 5k requirements x 50k scenarios.
+"""
+
+import bisect
+
+import tracing
+COVERAGE_KEYS = ('@usecase', '@requirement', '@business_rule')
+# Requirements files (by their name in settings.json) joined on only some of the keys, any other file is joined on all of them
+REQUIREMENT_KEYS = {
+    'Usecases': ('@usecase',),
+    'Business Data': ('@business_rule',),
+}
+
+try:
+    popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def bitset(indices, size):
+    """An int with the bits in indices set, built in one go rather than one shift and or per bit."""
+    if not indices:
+        return 0
+    buffer = bytearray((size + 7) // 8)
+    for index in indices:
+        buffer[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def requirement_keys(name):
+    """The metatag keys a requirements file is joined on, e.g. only @usecase for "Usecases"."""
+    return REQUIREMENT_KEYS.get(name, COVERAGE_KEYS)
+
+
+class CoverageMatrix:
+    """Coverage of every requirements file in requirements ({name: Requirements}) by the scenarios in a StoryIndex."""
+
+    def __init__(self, index, requirements):
+        self.scenarios = []  # (story name, scenario) for each bit
+        self.stories = []    # (story name, first bit, scenario count) in index order
+        # (key, value) -> scenario numbers tagged with it
+        tagged = {}
+
+        with tracing.span('coverage matrix', requirements=len(requirements)):
+            for story in index.files:
+                first = len(self.scenarios)
+                self.stories.append((story.name, first, len(story.scenarios)))
+                self.scenarios.extend((story.name, scenario.strip()) for scenario in story.scenarios)
+
+                for line, scenario in zip(story.meta, story.meta_scenario):
+                    # e.g. "@usecase: 12" or "@usecase 12"
+                    key, _, value = line.partition(' ')
+                    key = key.rstrip(':')
+                    if key not in COVERAGE_KEYS:
+                        continue
+                    numbers = tagged.setdefault((key, value.strip()), [])
+                    if scenario >= 0:
+                        numbers.append(first + scenario)
+                    else:
+                        numbers.extend(range(first, first + len(story.scenarios)))
+
+            self.size = len(self.scenarios)
+            self.__starts = [first for name, first, count in self.stories]
+            self.__tagged = {}  # (key, value) -> bitset
+            for key, numbers in tagged.items():
+                self.__tagged[key] = bitset(numbers, self.size)
+
+            self.requirements = requirements
+            self.bits = {}     # requirements name -> [bitset per requirement row]
+            self.numbers = {}  # requirements name -> [scenario numbers per requirement row], to list them without scanning bits
+            for name, rows in requirements.items():
+                keys = requirement_keys(name)
+                ids = rows.column(rows.id_column) if rows.headers else []
+                self.bits[name] = []
+                self.numbers[name] = []
+                for id in ids:
+                    bits, numbers = self.__join(tagged, keys, id.strip())
+                    self.bits[name].append(bits)
+                    self.numbers[name].append(numbers)
+            tracing.count('coverage matrix requirements', sum(len(bits) for bits in self.bits.values()))
+
+    def __join(self, tagged, keys, id):
+        bits = 0
+        lists = []
+        for key in keys:
+            if (key, id) in tagged:
+                bits |= self.__tagged[(key, id)]
+                lists.append(tagged[(key, id)])
+        return bits, lists[0] if len(lists) == 1 else sorted(set().union(*lists))
+
+    def story_mask(self, first, count):
+        return ((1 << count) - 1) << first
+
+    def covered(self, name):
+        """Number of requirements in name that at least one scenario covers."""
+        return sum(1 for bits in self.bits.get(name, ()) if bits)
+
+    def coverage(self, name):
+        """Fraction of the requirements in name that are covered, or None for an empty file."""
+        bits = self.bits.get(name, ())
+        return self.covered(name) / len(bits) if bits else None
+
+    def key_coverage(self, key):
+        """Fraction of the requirements joined on metatag key that are covered, or None when none are.
+
+        The files joined on key alone are used if there are any, otherwise
+        the ones joined on every key.
+        """
+        key = key.rstrip(':')
+        names = [name for name in self.bits if requirement_keys(name) == (key,)] or \
+                [name for name in self.bits if key in requirement_keys(name)]
+        total = sum(len(self.bits[name]) for name in names)
+        return sum(self.covered(name) for name in names) / total if total else None
+
+    def uncovered(self, name):
+        """IDs of the requirements in name that no scenario covers."""
+        rows = self.requirements[name]
+        ids = rows.column(rows.id_column)
+        return [ids[row] for row, bits in enumerate(self.bits[name]) if not bits]
+
+    def scenarios_for(self, name, row):
+        """(story, scenario) of every scenario covering requirement row of name."""
+        return [self.scenarios[number] for number in sorted(set(self.numbers[name][row]))]
+
+    def story_of(self, number):
+        """Position in self.stories of the story scenario number belongs to."""
+        return bisect.bisect_right(self.__starts, number) - 1
+
+    def tagged_scenarios(self, name):
+        """Bitset of the scenarios that cover at least one requirement in name."""
+        union = 0
+        for bits in self.bits.get(name, ()):
+            union |= bits
+        return union
+
+    def rows(self, name):
+        """(ID, scenarios, stories) for every requirement in name, where scenarios and stories count what covers it."""
+        rows = self.requirements[name]
+        ids = rows.column(rows.id_column)
+        table = []
+        for row, bits in enumerate(self.bits[name]):
+            table.append((ids[row], popcount(bits), len(self.__covering_stories(name, row))))
+        return table
+
+    def __covering_stories(self, name, row):
+        """Positions of the stories with a scenario covering requirement row of name."""
+        bits = self.bits[name][row]
+        if not bits:
+            return set()
+        # Stories are contiguous runs of bits, so one story covers it when its lowest and highest bits are in the same run
+        low, high = self.story_of((bits & -bits).bit_length() - 1), self.story_of(bits.bit_length() - 1)
+        if low == high:
+            return {low}
+        return {self.story_of(number) for number in self.numbers[name][row]}
+
+    def story_contributions(self, name):
+        """(story, tagged scenarios, requirements covered, requirements only it covers) for every story."""
+        covered = [0] * len(self.stories)
+        only = [0] * len(self.stories)
+        for row in range(len(self.bits.get(name, ()))):
+            stories = self.__covering_stories(name, row)
+            for story in stories:
+                covered[story] += 1
+            if len(stories) == 1:
+                only[story] += 1
+
+        union = self.tagged_scenarios(name)
+        return [(story, popcount(union & self.story_mask(first, count)), covered[position], only[position])
+                for position, (story, first, count) in enumerate(self.stories)]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+A tk.Text log that only keeps the last max_lines lines. Once the cap is
+exceeded the oldest lines are deleted in one bulk delete, trimming a little
+further than needed so it doesn't happen on every write. This keeps memory
+use and redraw cost flat no matter how long a Maven run goes on for.
+
+The full output can be streamed to a file at the same time with open_file(),
+so nothing is lost when the head of the log is trimmed.
+
+Anything LogView doesn't implement is passed through to the underlying Text,
+e.g. grid(), yview() and get().
+"""
+
+import os
+import tkinter as tk
+
+MAX_LINES = 10000
+TRIM_SLACK = 0.1  # fraction of max_lines trimmed on top of the excess
+
+
+def trim_count(lines, max_lines):
+    """How many of the oldest lines to delete once a log holds lines, 0 while it is within max_lines."""
+    if lines <= max_lines:
+        return 0
+    return min(lines - max_lines + int(max_lines * TRIM_SLACK), lines)
+
+
+def tail(data, max_lines):
+    """(the last max_lines lines of data plus any unfinished line, how many complete lines that is)."""
+    count = data.count('\n')
+    if count <= max_lines:
+        return data, count
+    index = len(data)
+    for _ in range(max_lines + 1):
+        index = data.rfind('\n', 0, index)
+    return data[index + 1:], max_lines
+
+
+class LogView:
+    def __init__(self, master=None, max_lines=MAX_LINES, **kw):
+        self.text = tk.Text(master, **kw)
+        self.max_lines = max_lines
+        self.lines = 0  # complete lines currently in the widget
+        self.file = None
+
+    def __getattr__(self, name):
+        return getattr(self.text, name)
+
+    def __getitem__(self, key):
+        return self.text[key]
+
+    def __setitem__(self, key, value):
+        self.text[key] = value
+
+    def open_file(self, filepath):
+        """Stream everything written from now on to filepath as well."""
+        self.close_file()
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        self.file = open(filepath, 'w', encoding='utf-8')
+        return filepath
+
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def write(self, data):
+        """Append data to the log, trimming the oldest lines if it grows past max_lines."""
+        if not data:
+            return
+        if self.file is not None:
+            self.file.write(data)
+
+        # Only follow the output if the user hasn't scrolled up to read something
+        following = self.text.yview()[1] >= 1.0
+
+        trimmed, count = tail(data, self.max_lines)
+        if trimmed is not data:
+            # More than a screenful of history arrived at once, don't bother inserting what would be trimmed
+            data = trimmed
+            self.clear()
+
+        self.text.insert(tk.END, data)
+        self.lines += count
+
+        excess = trim_count(self.lines, self.max_lines)
+        if excess:
+            self.text.delete('1.0', '{}.0'.format(excess + 1))
+            self.lines -= excess
+
+        if following:
+            self.text.see(tk.END)
+
+    def clear(self):
+        self.text.delete('1.0', tk.END)
+        self.lines = 0
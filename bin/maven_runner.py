@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs Maven (or any other command) in the background. stdout and stderr are
+read on their own threads and pushed onto a queue as decoded lines, so the
+Tk thread can drain the output in batches from an after() callback instead
+of blocking on readline().
+
+ShardedMavenRun splits a run's stories into shards that run as concurrent
+Maven processes, each against its own Selenium server and output directory,
+and merges their Serenity outputs into one report afterwards.
+"""
+
+import os
+import re
+import time
+import codecs
+import queue
+import shutil
+import threading
+import subprocess
+
+import tracing
+
+CHUNK_SIZE = 64 * 1024
+
+# The Maven executable in a command, e.g. mvn, mvn.cmd or mvnw
+MAVEN = re.compile(r'^mvnw?(?:\.cmd|\.bat)?$', re.IGNORECASE)
+# Maven options whose value is the next word, e.g. --settings C:\Users\me\.m2\settings.xml
+OPTIONS_WITH_VALUES = {'-s', '--settings', '-gs', '--global-settings', '-t', '--toolchains', '-P', '--activate-profiles',
+                       '-f', '--file', '-pl', '--projects', '-rf', '--resume-from', '-T', '--threads', '-l', '--log-file'}
+# Phases that run the integration tests, i.e. the failsafe plugin
+INTEGRATION_PHASES = ('pre-integration-test', 'integration-test', 'post-integration-test', 'verify', 'install', 'deploy')
+# Default for ShardedMavenRun's compile and aggregate commands: derive them from the command being sharded
+FROM_COMMAND = 'from command'
+
+
+class MavenRun:
+    def __init__(self, command, cwd=None, env=None):
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.output = queue.Queue()
+        self.process = None
+        self.__readers = []
+        self.__started = None
+        self.__recorded = False
+
+    def start(self):
+        self.__started = time.perf_counter()
+        self.process = subprocess.Popen(self.command, shell=True, cwd=self.cwd, env=self.env,
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for name, stream in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+            reader = threading.Thread(target=self.__read, args=(stream,), name='maven-' + name, daemon=True)
+            reader.start()
+            self.__readers.append(reader)
+        return self
+
+    def __read(self, stream):
+        # Only whole lines are queued, so stdout and stderr don't interleave mid-line
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        partial = ''
+        with stream:
+            while True:
+                chunk = stream.read1(CHUNK_SIZE)
+                if not chunk:
+                    break
+                tracing.count('maven output bytes', len(chunk))
+                lines, newline, partial = (partial + decoder.decode(chunk)).rpartition('\n')
+                if newline:
+                    self.output.put(lines + newline)
+        partial += decoder.decode(b'', final=True)
+        if partial:
+            self.output.put(partial)
+
+    def drain(self):
+        """All of the output queued up since the last drain, as one string."""
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.output.get_nowait())
+            except queue.Empty:
+                return ''.join(chunks)
+
+    def finished(self):
+        """True once the process has exited and both streams have been read to the end."""
+        if self.process.poll() is not None and not any(reader.is_alive() for reader in self.__readers):
+            self.__record()
+            return True
+        return False
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def wait(self):
+        self.process.wait()
+        for reader in self.__readers:
+            reader.join()
+        self.__record()
+        return self.process.returncode
+
+    def __record(self):
+        if not self.__recorded:
+            self.__recorded = True
+            tracing.record('maven run', time.perf_counter() - self.__started, returncode=self.process.returncode)
+
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+# Sharding
+# -----------------------------------------------------------------------------
+
+def shard_stories(stories, count, weights=None):
+    """Split stories into at most count shards of roughly equal weight (e.g. scenario counts)."""
+    weights = weights or {}
+    shards = [[] for _ in range(max(1, min(count, len(stories))))]
+    totals = [0] * len(shards)
+    # Heaviest first, each onto the lightest shard so far
+    for story in sorted(stories, key=lambda story: (-weights.get(story, 1), story)):
+        lightest = totals.index(min(totals))
+        shards[lightest].append(story)
+        totals[lightest] += weights.get(story, 1)
+    return [sorted(shard) for shard in shards if shard]
+
+
+def find_argument(command, name):
+    """The value of a -Dname=value argument in command, or None."""
+    match = re.search(r'(?:^|\s)-D' + re.escape(name) + r'=(\S*)', command)
+    return match.group(1) if match else None
+
+
+def remove_arguments(command, *names):
+    """command without serenity:aggregate or any of the -Dname=value arguments."""
+    words = [word for word in command.split() if word != 'serenity:aggregate']
+    for name in names:
+        words = [word for word in words if not word.startswith('-D' + name + '=')]
+    return ' '.join(words)
+
+
+def split_goals(command):
+    """(words before the goals, goals, options after the Maven executable), or None if command doesn't run Maven."""
+    words = command.split()
+    start = next((i + 1 for i, word in enumerate(words) if MAVEN.match(os.path.basename(word.strip('"')))), None)
+    if start is None:
+        return None
+
+    goals = []
+    options = []
+    value = False
+    for word in words[start:]:
+        if value or word.startswith('-'):
+            options.append(word)
+            value = not value and word in OPTIONS_WITH_VALUES
+        else:
+            goals.append(word)
+    return words[:start], goals, options
+
+
+def maven_goals(command):
+    """The goals and phases command runs, e.g. ['verify', 'serenity:aggregate']."""
+    parts = split_goals(command)
+    return parts[1] if parts else []
+
+
+def with_goals(command, goals):
+    """command running goals instead of its own, keeping everything else (call, --settings, -P, -D, ...) as it is.
+
+    Commands that don't run Maven are returned unchanged.
+    """
+    parts = split_goals(command)
+    if parts is None:
+        return command
+    prefix, old, options = parts
+    return ' '.join(prefix + list(goals) + options)
+
+
+def shard_goals(goals):
+    """What a shard runs instead of goals: only the test plugin, so shards never compile or clean the target directory they share."""
+    plugins = [goal for goal in goals if ':' in goal and goal != 'serenity:aggregate']
+    if any(goal in INTEGRATION_PHASES for goal in goals):
+        return ['failsafe:integration-test'] + plugins
+    if 'test' in goals:
+        return ['surefire:test'] + plugins
+    return plugins
+
+
+def with_remote_url(command, remote_url):
+    """command pointed at the Selenium server at remote_url instead of the one it names."""
+    words = [word for word in command.split() if not word.startswith('-Dwebdriver.remote.url=')]
+    return ' '.join(words + ['-Dwebdriver.remote.url=' + remote_url])
+
+
+def shard_command(command, stories, remote_url, output_directory):
+    """The command for one shard, running only its stories against its own Selenium server and output directory.
+
+    A Maven command runs the test plugin goals alone (see shard_goals). It
+    isn't forced offline: test-compile doesn't resolve the test and Serenity
+    plugins, and surefire/failsafe resolve their test framework provider
+    when they run, so each shard may still need to download them into a
+    fresh local repository. An -o in command is kept.
+    """
+    if maven_goals(command):
+        command = with_goals(command, shard_goals(maven_goals(command)))
+    command = remove_arguments(command, 'relativeStoryNamesToRun', 'webdriver.remote.url', 'serenity.outputDirectory')
+    return (command
+            + ' -DrelativeStoryNamesToRun=' + ','.join(stories)
+            + ' -Dwebdriver.remote.url=' + remote_url
+            + ' -Dserenity.outputDirectory=' + output_directory)
+
+
+def compile_step(command):
+    """The step before the shards: command compiling the tests (after a clean, if it cleans) instead of running them."""
+    goals = maven_goals(command)
+    command = remove_arguments(command, 'relativeStoryNamesToRun', 'webdriver.remote.url', 'serenity.outputDirectory')
+    return with_goals(command, (['clean'] if 'clean' in goals else []) + ['test-compile'])
+
+
+def aggregate_step(command):
+    """The step after the shards: command building the Serenity report from the merged outputs."""
+    command = remove_arguments(command, 'relativeStoryNamesToRun', 'webdriver.remote.url', 'serenity.outputDirectory')
+    return with_goals(command, ['serenity:aggregate'])
+
+
+def merge_directories(sources, destination):
+    """Copy the contents of every source directory into destination, later sources overwriting earlier ones.
+
+    Serenity names its outputs uniquely per test, so shards that ran different stories don't collide.
+    """
+    os.makedirs(destination, exist_ok=True)
+    for source in sources:
+        if os.path.isdir(source):
+            shutil.copytree(source, destination, dirs_exist_ok=True)
+
+
+class ShardedMavenRun:
+    """
+    Runs the same Maven command as N concurrent shards. The test classes are
+    compiled once up front and the shards only run the test plugin (see
+    shard_command), so they don't race each other in target/classes. Once
+    every shard is done their Serenity outputs are merged into
+    report_directory and aggregated into one report.
+
+    The compile and aggregate commands are derived from command, so they
+    keep its call prefix, --settings, profiles and -D arguments. Pass None
+    to skip either step.
+
+    Has the same interface as MavenRun, each line of output is prefixed with
+    the shard it came from.
+    """
+
+    def __init__(self, command, stories, shards, remote_urls, cwd=None, env=None, weights=None,
+                 compile_command=FROM_COMMAND, aggregate_command=FROM_COMMAND,
+                 report_directory=os.path.join('target', 'site', 'serenity')):
+        self.cwd = cwd
+        self.env = env
+        self.compile_command = compile_step(command) if compile_command == FROM_COMMAND else compile_command
+        self.aggregate_command = aggregate_step(command) if aggregate_command == FROM_COMMAND else aggregate_command
+        self.report_directory = os.path.join(cwd or '', report_directory)
+        self.shards = []  # (label, command, output directory)
+        # One Selenium server per shard
+        for number, shard in enumerate(shard_stories(stories, min(shards, len(remote_urls)), weights)):
+            output_directory = os.path.join(cwd or '', 'target', 'shards', 'shard-{}'.format(number + 1))
+            self.shards.append(('shard {}'.format(number + 1),
+                                shard_command(command, shard, remote_urls[number], output_directory),
+                                output_directory))
+        self.remote_urls = list(remote_urls[:len(self.shards)])
+
+        self.returncode = None
+        self.__runs = []  # (label, MavenRun) in the order they were started
+        self.__errors = []  # (label, message) of stages that couldn't run, until drained
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__coordinate, name='maven-shards', daemon=True)
+        self.__thread.start()
+        return self
+
+    def __launch(self, label, command):
+        """Start a stage, or return None if the run was stopped or the stage couldn't be started."""
+        run = MavenRun(command, cwd=self.cwd, env=self.env)
+        with self.__lock:
+            if self.__stop.is_set():
+                return None
+            try:
+                run.start()
+            except OSError as error:  # e.g. a cwd that doesn't exist
+                self.__errors.append((label, 'Unable to start {}: {!r}\n'.format(command, error)))
+                return None
+            self.__runs.append((label, run))
+        return run
+
+    def __coordinate(self):
+        with tracing.span('sharded maven run', shards=len(self.shards)):
+            try:
+                self.returncode = self.__run_stages()
+            except OSError as error:  # e.g. the shard outputs couldn't be merged
+                with self.__lock:
+                    self.__errors.append(('shards', 'Sharded run failed: {!r}\n'.format(error)))
+                self.returncode = -1
+
+    def __run_stages(self):
+        if self.compile_command:
+            run = self.__launch('compile', self.compile_command)
+            if run is None or run.wait() != 0:
+                return run.returncode if run else -1
+
+        # Serenity reuses its output file names from run to run, so a shard folder left from an earlier run with a
+        # different split would merge in stale outcomes of scenarios that have since moved to another shard
+        for label, command, output_directory in self.shards:
+            shutil.rmtree(output_directory, ignore_errors=True)
+        runs = [self.__launch(label, command) for label, command, output_directory in self.shards]
+        codes = [run.wait() if run else -1 for run in runs]
+        if self.__stop.is_set() or not any(runs):
+            return -1
+
+        with tracing.span('merge shard outputs', shards=len(self.shards)):
+            merge_directories([output_directory for label, command, output_directory in self.shards], self.report_directory)
+        if self.aggregate_command:
+            run = self.__launch('aggregate', self.aggregate_command)
+            if run is None:
+                return -1
+            codes.append(run.wait())
+        return next((code for code in codes if code != 0), 0)
+
+    def drain(self):
+        """All of the output queued up by every stage since the last drain, one [label] per line."""
+        with self.__lock:
+            runs = list(self.__runs)
+            errors, self.__errors = self.__errors, []
+        chunks = ['[{}] {}'.format(label, message) for label, message in errors]
+        for label, run in runs:
+            output = run.drain()
+            if output:
+                prefix = '[{}] '.format(label)
+                chunks.append(''.join(prefix + line for line in output.splitlines(True)))
+        return ''.join(chunks)
+
+    def finished(self):
+        return self.__thread is not None and not self.__thread.is_alive()
+
+    def wait(self):
+        self.__thread.join()
+        return self.returncode
+
+    def terminate(self):
+        with self.__lock:
+            self.__stop.set()
+            runs = list(self.__runs)
+        for label, run in runs:
+            run.terminate()
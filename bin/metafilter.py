@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+"""
+jBehave metafilters evaluated against the story index, so the Execute tab
+can show what a filter selects before Maven is started.
+
+Both of jBehave's syntaxes are understood:
+
+    +smoke -wip +usecase 200          include / exclude by meta name and value, * is a wildcard
+    groovy: smoke && !wip && usecase == '200'
+
+As in jBehave, a scenario's meta is its story's meta overridden by its own,
+an include matches if any one of the +properties matches, and excludes win
+over includes. In groovy expressions a bare name is true when the scenario
+has that meta property, ==, !=, =~ and ==~ compare its value and &&, ||, !
+and parentheses combine them. Anything else groovy can do is not supported.
+
+Meta names are compared without the trailing colon, so "@usecase: 200" in a
+story is matched by "+usecase 200".
+
+MetaIndex keeps a bitset (see coverage_matrix) of the scenarios that have
+each meta name and each name/value pair, so a filter is evaluated with a few
+int operations however many scenarios there are.
+"""
+
+import re
+import fnmatch
+
+import tracing
+from coverage_matrix import bitset
+
+GROOVY = 'groovy:'
+
+GROOVY_TOKENS = re.compile(r'''
+    \s*(?:
+        (?P<op>&&|\|\||==~|=~|==|!=|!|\(|\))
+      | '(?P<single>(?:[^'\\]|\\.)*)'
+      | "(?P<double>(?:[^"\\]|\\.)*)"
+      | /(?P<slashy>(?:[^/\\]|\\.)*)/
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<name>[A-Za-z_][\w.-]*)
+    )''', re.VERBOSE)
+
+
+class MetaFilterError(ValueError):
+    pass
+
+
+def meta_properties(line):
+    """(name, value) of every property on a meta line, e.g. "@author Mauro @themes UI" has two."""
+    properties = []
+    for part in line.strip().lstrip('@').split(' @'):
+        name, _, value = part.strip().partition(' ')
+        name = name.rstrip(':')
+        if name:
+            properties.append((name, value.strip()))
+    return properties
+
+
+class MetaIndex:
+    """Bitsets of the scenarios in a StoryIndex by meta name and by meta name and value."""
+
+    def __init__(self, index):
+        self.scenarios = []  # (story name, scenario) for each bit
+        names = {}   # name -> scenario numbers
+        values = {}  # name -> {value -> scenario numbers}
+
+        with tracing.span('meta index'):
+            for story in index.files:
+                story_meta = {}
+                scenario_meta = [{} for scenario in story.scenarios]
+                for line, scenario in zip(story.meta, story.meta_scenario):
+                    meta = story_meta if scenario < 0 else scenario_meta[scenario]
+                    meta.update(meta_properties(line))
+
+                first = len(self.scenarios)
+                for number, (scenario, meta) in enumerate(zip(story.scenarios, scenario_meta), first):
+                    self.scenarios.append((story.name, scenario.strip()))
+                    merged = dict(story_meta, **meta) if story_meta else meta
+                    for name, value in merged.items():
+                        names.setdefault(name, []).append(number)
+                        values.setdefault(name, {}).setdefault(value, []).append(number)
+
+            self.size = len(self.scenarios)
+            self.all = (1 << self.size) - 1
+            self.names = {name: bitset(numbers, self.size) for name, numbers in names.items()}
+            self.values = {name: {value: bitset(numbers, self.size) for value, numbers in by_value.items()}
+                           for name, by_value in values.items()}
+
+    def has(self, name):
+        return self.names.get(name, 0)
+
+    def equal(self, name, value):
+        return self.values.get(name, {}).get(value, 0)
+
+    def matching(self, name, pattern):
+        """Scenarios whose value of name matches the compiled regular expression pattern."""
+        bits = 0
+        for value, scenarios in self.values.get(name, {}).items():
+            if pattern.search(value):
+                bits |= scenarios
+        return bits
+
+    def select(self, bits, limit=None):
+        """(story, scenario) of the scenarios in bits, in index order, at most limit of them."""
+        digits = bin(bits)[:1:-1]  # least significant bit first
+        selected = []
+        number = digits.find('1')
+        while number >= 0 and (limit is None or len(selected) < limit):
+            selected.append(self.scenarios[number])
+            number = digits.find('1', number + 1)
+        return selected
+
+    def stories(self, bits):
+        """Names of the stories with at least one scenario in bits."""
+        return {story for story, scenario in self.select(bits)}
+
+
+# +/- filters
+# -----------------------------------------------------------------------------
+
+class PropertyFilter:
+    """The jBehave "+name value -name value" syntax."""
+
+    def __init__(self, text):
+        self.include = {}
+        self.exclude = {}
+        properties = None
+        name = None
+        for word in text.split():
+            if word[0] in '+-':
+                properties = self.include if word[0] == '+' else self.exclude
+                name = word[1:].rstrip(':')
+                if not name:
+                    raise MetaFilterError('"{}" needs a meta name after it'.format(word[0]))
+                properties[name] = ''  # a later +name replaces an earlier one, as in jBehave
+            elif properties is None:
+                raise MetaFilterError('"{}" should start with + or -'.format(word))
+            else:
+                properties[name] = (properties[name] + ' ' + word).strip()
+
+    @staticmethod
+    def match(properties, meta):
+        bits = 0
+        for name, value in properties.items():
+            if not value:
+                bits |= meta.has(name)
+            elif '*' in value:
+                bits |= meta.matching(name, re.compile(fnmatch.translate(value)))
+            else:
+                bits |= meta.equal(name, value)
+        return bits
+
+    def evaluate(self, meta):
+        bits = self.match(self.include, meta) if self.include else meta.all
+        if self.exclude:
+            bits &= ~self.match(self.exclude, meta)
+        return bits & meta.all
+
+
+# groovy: filters
+# -----------------------------------------------------------------------------
+
+class GroovyFilter:
+    """The subset of jBehave's "groovy: expression" syntax described above."""
+
+    def __init__(self, text):
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.tree = self.expression() if self.tokens else ('true',)
+        if self.position < len(self.tokens):
+            raise MetaFilterError('Unexpected "{}"'.format(self.tokens[self.position][1]))
+
+    @staticmethod
+    def tokenize(text):
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = GROOVY_TOKENS.match(text, position)
+            if match is None or match.end() == position:
+                raise MetaFilterError('Unexpected "{}"'.format(text[position:].strip()[:20]))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind in ('single', 'double'):
+                kind, value = 'string', re.sub(r'\\(.)', r'\1', value)
+            tokens.append((kind, value))
+            position = match.end()
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, *accepted):
+        kind, value = self.peek()
+        if kind == 'op' and value in accepted:
+            self.position += 1
+            return value
+        return None
+
+    def expression(self):
+        node = self.conjunction()
+        while self.take('||'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.unary()
+        while self.take('&&'):
+            node = ('and', node, self.unary())
+        return node
+
+    def unary(self):
+        if self.take('!'):
+            return ('not', self.unary())
+        return self.primary()
+
+    def primary(self):
+        if self.take('('):
+            node = self.expression()
+            if not self.take(')'):
+                raise MetaFilterError('Missing ")"')
+            return node
+
+        kind, name = self.peek()
+        if kind != 'name':
+            raise MetaFilterError('Expected a meta name' + (', not "{}"'.format(name) if name else ''))
+        self.position += 1
+        if name in ('true', 'false'):
+            return (name,)
+
+        operator = self.take('==', '!=', '=~', '==~')
+        if operator is None:
+            return ('has', name)
+
+        kind, value = self.peek()
+        if kind not in ('string', 'number', 'slashy', 'name'):
+            raise MetaFilterError('Expected a value after "{}"'.format(operator))
+        self.position += 1
+        if operator in ('=~', '==~'):
+            try:
+                # =~ finds the pattern anywhere in the value, ==~ has to match all of it
+                pattern = re.compile(value if operator == '=~' else r'(?:{})\Z'.format(value))
+            except re.error as error:
+                raise MetaFilterError('Bad regular expression: {}'.format(error))
+            return ('matching', name, pattern)
+        return ('equal' if operator == '==' else 'not equal', name, value)
+
+    def evaluate(self, meta, node=None):
+        node = node or self.tree
+        kind = node[0]
+        if kind == 'or':
+            return self.evaluate(meta, node[1]) | self.evaluate(meta, node[2])
+        if kind == 'and':
+            return self.evaluate(meta, node[1]) & self.evaluate(meta, node[2])
+        if kind == 'not':
+            return meta.all & ~self.evaluate(meta, node[1])
+        if kind == 'true':
+            return meta.all
+        if kind == 'false':
+            return 0
+        if kind == 'has':
+            return meta.has(node[1])
+        if kind == 'equal':
+            return meta.equal(node[1], node[2])
+        if kind == 'not equal':
+            return meta.all & ~meta.equal(node[1], node[2])
+        return meta.matching(node[1], node[2])
+
+
+def parse_metafilter(text):
+    """A filter for text, raises MetaFilterError if it can't be parsed."""
+    text = text.strip()
+    if text.startswith(GROOVY):
+        return GroovyFilter(text[len(GROOVY):])
+    return PropertyFilter(text)
+
+
+def with_metafilter(command, text):
+    """command with its -Dmetafilter argument replaced by text, or removed when text is empty."""
+    command = re.sub(r'\s*-Dmetafilter=(?:"[^"]*"|\S*)', '', command)
+    text = text.strip()
+    if text:
+        command += ' -Dmetafilter="{}"'.format(text)
+    return command
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Requirements files (the CSVs listed under "Requirements" in settings.json)
+loaded once into column arrays with an ID -> row index. A file is only read
+again after its modification time or size changes. The CSV dialect and an
+optional UTF-8 byte order mark are detected, since spreadsheet exports are
+a mix of comma and tab separated files.
+"""
+
+import os
+
+import tracing
+
+DELIMITERS = ',\t;|'
+
+
+class RequirementsError(ValueError):
+    """A requirements file that can't be parsed as CSV."""
+
+
+class Requirements:
+    """The contents of one requirements file, stored by column."""
+
+    def __init__(self, filepath, headers, rows):
+        self.filepath = filepath
+        self.headers = tuple(headers)
+        self.columns = [[] for header in self.headers]
+        for row in rows:
+            for index, column in enumerate(self.columns):
+                column.append(row[index] if index < len(row) else '')
+
+        # ID -> row number, using the "ID" column when there is one
+        self.id_column = self.find_column('ID')
+        if self.id_column is None:
+            self.id_column = 0
+        ids = self.columns[self.id_column] if self.columns else []
+        self.ids = {value.strip(): row for row, value in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def find_column(self, name):
+        for index, header in enumerate(self.headers):
+            if header.strip().lower() == name.lower():
+                return index
+        return None
+
+    def column(self, index):
+        return self.columns[index]
+
+    def row(self, number):
+        return tuple(column[number] for column in self.columns)
+
+    def rows(self):
+        return zip(*self.columns)
+
+    def find(self, id):
+        """The row for a requirement ID, or None."""
+        number = self.ids.get(str(id).strip())
+        return None if number is None else self.row(number)
+
+
+@tracing.span('load requirements')
+def read_requirements(filepath):
+    """Read a requirements file, raises OSError or RequirementsError."""
+    import csv  # loaded with the first requirements file rather than when the toolbox starts
+
+    with open(filepath, encoding='utf-8-sig', newline='') as file:
+        sample = file.read(64 * 1024)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+
+        data = csv.reader(file, dialect)
+        try:
+            headers = next(data, [])
+            requirements = Requirements(filepath, headers, [row for row in data if row])
+        except csv.Error as error:
+            raise RequirementsError('{}: {}'.format(filepath, error)) from error
+    tracing.count('requirement rows read', len(requirements))
+    tracing.count('requirement bytes read', os.path.getsize(filepath))
+    return requirements
+
+
+class RequirementsStore:
+    def __init__(self):
+        self.__loaded = {}  # filepath -> ((mtime, size), Requirements)
+
+    def get(self, filepath):
+        """Requirements for filepath, re-read only if the file changed since it was last loaded."""
+        stat = os.stat(filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        loaded = self.__loaded.get(filepath)
+        if loaded is None or loaded[0] != version:
+            loaded = (version, read_requirements(filepath))
+            self.__loaded[filepath] = loaded
+        return loaded[1]
+
+    def clear(self):
+        self.__loaded.clear()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Keeps a pool of Selenium servers running on a range of ports. Each server is
+started from the same command with {port} filled in, and is only handed out
+once its /wd/hub/status endpoint answers. A monitor thread restarts servers
+that die or never come up, and everything is shut down when the toolbox exits.
+
+    pool = SeleniumPool('java -jar selenium-server-standalone.jar -port {port}', range(5555, 5559)).start()
+    url = pool.acquire()    # e.g. http://127.0.0.1:5556/wd/hub
+    ...
+    pool.release(url)
+"""
+
+import os
+import json
+import time
+import shlex
+import atexit
+import threading
+import subprocess
+import urllib.request
+
+import tracing
+
+STATUS_TIMEOUT = 2.0     # seconds to wait for /wd/hub/status to answer
+STARTUP_TIMEOUT = 60.0   # seconds a server gets to become ready before it is restarted
+
+STARTING = 'starting'
+READY = 'ready'
+STOPPED = 'stopped'
+
+
+def is_ready(url, timeout=STATUS_TIMEOUT):
+    """True if the Selenium server at url (http://host:port/wd/hub) reports it is ready for new sessions."""
+    try:
+        with urllib.request.urlopen(url + '/status', timeout=timeout) as response:
+            status = json.loads(response.read().decode('utf-8') or '{}')
+    except (OSError, ValueError):
+        return False
+
+    # Selenium 2 answers {"status": 0, ...}, Selenium 3+ {"value": {"ready": true, ...}}
+    value = status.get('value')
+    if isinstance(value, dict) and 'ready' in value:
+        return bool(value['ready'])
+    return status.get('status', 0) == 0
+
+
+class Node:
+    def __init__(self, port, host='127.0.0.1'):
+        self.port = port
+        self.url = 'http://{}:{}/wd/hub'.format(host, port)
+        self.process = None
+        self.state = STOPPED
+        self.started = 0.0
+        self.restarts = 0
+        self.busy = False
+
+
+class SeleniumPool:
+    def __init__(self, command, ports, cwd=None, env=None, interval=1.0, startup_timeout=STARTUP_TIMEOUT):
+        self.command = command  # with a {port} placeholder
+        self.nodes = [Node(port) for port in ports]
+        self.cwd = cwd
+        self.env = env
+        self.interval = interval  # seconds between health checks
+        self.startup_timeout = startup_timeout
+        self.__lock = threading.Condition()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        for node in self.nodes:
+            self.__spawn(node)
+        self.__thread = threading.Thread(target=self.__monitor, name='selenium-pool', daemon=True)
+        self.__thread.start()
+        atexit.register(self.shutdown)
+        return self
+
+    def __spawn(self, node):
+        command = self.command.format(port=node.port)
+        # A plain argument list on POSIX, so terminate() reaches the server rather than a shell
+        args = command if os.name == 'nt' else shlex.split(command)
+        node.process = subprocess.Popen(args, cwd=self.cwd, env=self.env, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        node.state = STARTING
+        node.started = time.monotonic()
+
+    def __monitor(self):
+        while not self.__stop.wait(self.interval):
+            for node in self.nodes:
+                self.check(node)
+
+    def check(self, node):
+        """Bring node's state up to date, restarting its server if it died or never came up."""
+        if self.__stop.is_set():
+            return
+
+        if node.process.poll() is not None:
+            print('Selenium server on port {} exited with code {}, restarting'.format(node.port, node.process.returncode))
+        elif is_ready(node.url):
+            if node.state == STARTING:
+                tracing.record('selenium server start', time.monotonic() - node.started, port=node.port, restarts=node.restarts)
+            with self.__lock:
+                node.state = READY
+                self.__lock.notify_all()
+            return
+        elif node.state == STARTING and time.monotonic() - node.started < self.startup_timeout:
+            return  # still booting
+        elif node.state == READY:
+            with self.__lock:
+                node.state = STARTING  # alive but not answering, give it a startup timeout to recover
+                node.started = time.monotonic()
+            return
+        else:
+            print('Selenium server on port {} did not become ready, restarting'.format(node.port))
+
+        with self.__lock:
+            node.state = STOPPED  # so it isn't handed out while it restarts
+        self.__kill(node)
+        with self.__lock:
+            if self.__stop.is_set():
+                return
+            self.__spawn(node)
+            node.restarts += 1
+
+    def ready(self):
+        """URLs of the servers that are up, whether they are in use or not."""
+        with self.__lock:
+            return [node.url for node in self.nodes if node.state == READY]
+
+    def wait_ready(self, timeout=None):
+        """Wait until every server is up. Returns False if that didn't happen within timeout seconds."""
+        with self.__lock:
+            return self.__lock.wait_for(lambda: all(node.state == READY for node in self.nodes), timeout)
+
+    def acquire(self, timeout=None):
+        """Reserve a ready server that isn't in use and return its URL, or None if none frees up within timeout seconds."""
+        with self.__lock:
+            free = self.__lock.wait_for(lambda: self.__free() or self.__stop.is_set(), timeout)
+            if not free or self.__stop.is_set():
+                return None
+            node = self.__free()
+            node.busy = True
+            return node.url
+
+    def __free(self):
+        return next((node for node in self.nodes if node.state == READY and not node.busy), None)
+
+    def release(self, url):
+        with self.__lock:
+            for node in self.nodes:
+                if node.url == url:
+                    node.busy = False
+            self.__lock.notify_all()
+
+    def shutdown(self):
+        """Stop every server. Safe to call more than once."""
+        with self.__lock:
+            self.__stop.set()
+            self.__lock.notify_all()
+        if self.__thread is not None:
+            self.__thread.join(self.interval + STATUS_TIMEOUT + 1)
+        for node in self.nodes:
+            self.__kill(node)
+            node.state = STOPPED
+        atexit.unregister(self.shutdown)
+
+    @staticmethod
+    def __kill(node):
+        if node.process is not None and node.process.poll() is None:
+            node.process.terminate()
+            try:
+                node.process.wait(5)
+            except subprocess.TimeoutExpired:
+                node.process.kill()
+                node.process.wait()
@@ -9,10 +9,11 @@ Email:    jared.musil.kbw5@statefarm.com
 """
 
 import os
-import subprocess
 import tkinter as tk
 import tkinter.ttk as ttk
 
+from selenium_pool import SeleniumPool
+
 __author__ = "Jared Musil"
 __email__ = "jared.musil.kbw5@statefarm.com"
 
@@ -30,6 +31,7 @@ class Server:
         self.data_root = self.app_root + '\\data'
         self.results_root = self.data_root + '\\results'
         #TODO implement save method using results directory
+        self.pool = None
 
 
     def __init_widgets(self, parent):
@@ -82,11 +84,12 @@ class Server:
         _java = 'java.exe -jar "C:\path-to-selenium-rc-server\selenium-server.jar" -interactive'
         _runas = 'runas.exe /netonly /user:' + _domain + '\\' + _password + ' "C:\path-to-other-batch-file\start-selenium-server.bat"'
 
-        cmd = 'java.exe ' + _ie_driver_path + ' ' + _selenium_server_path + ' ' + _port
-        process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None)
-        output, error = process.communicate()
-        print(cmd)
-        process.terminate()
+        cmd = 'java.exe -Dwebdriver.ie.driver=' + self.app_root + '\\extra\\IEDriverServer.exe -jar ' + self.app_root + '\\extra\\selenium-server-standalone-2.43.1.jar -port {port}'
+        if self.pool is not None:
+            self.pool.shutdown()
+        # Runs in the background and is restarted if it dies, instead of blocking the window until it exits
+        self.pool = SeleniumPool(cmd, [_port], cwd=self.app_root).start()
+        print(cmd.format(port=_port))
 
 # -----------------------------------------------------------------------------
 
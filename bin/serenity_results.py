@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scenario outcomes read from the Serenity JSON files in
+target\\site\\serenity, so the story trees can show what passed and failed
+without opening the HTML report.
+
+Serenity writes one JSON file per test outcome. The files are read one at
+a time and only the few fields needed here are kept. When ijson is
+installed each file is parsed as a stream, so the test steps, screenshots
+and stack traces that make up most of a large outcome file are never held
+in memory. Without it every file is loaded whole with json, one at a time.
+
+Outcomes are matched to the story index by story file name (or Serenity's
+story name) and scenario title. Files that haven't changed since the last
+ingest() are not read again.
+"""
+
+import os
+import re
+import json
+
+import tracing
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Serenity results, grouped the way the trees count them
+PASSED = 'passed'
+FAILED = 'failed'
+PENDING = 'pending'
+RESULTS = {
+    'SUCCESS': PASSED,
+    'FAILURE': FAILED,
+    'ERROR': FAILED,
+    'COMPROMISED': FAILED,
+    'PENDING': PENDING,
+    'IGNORED': PENDING,
+    'SKIPPED': PENDING,
+    'UNDEFINED': PENDING,
+}
+
+# Outcome fields that are read, by their ijson prefix. Serenity 1 calls the story "user-story", later versions "userStory"
+FIELDS = {
+    'title': 'title',
+    'name': 'name',
+    'result': 'result',
+    'duration': 'duration',
+    'startTime': 'start',
+    'user-story.storyName': 'story name',
+    'user-story.path': 'story path',
+    'userStory.storyName': 'story name',
+    'userStory.path': 'story path',
+}
+
+
+class Outcome:
+    """The result of one scenario run."""
+
+    def __init__(self, story, scenario, result, duration, start=''):
+        self.story = story        # story file name, as in the StoryIndex
+        self.scenario = scenario  # the scenario line, as in the StoryIndex
+        self.result = result      # PASSED, FAILED or PENDING
+        self.duration = duration  # seconds
+        self.start = start
+
+
+def normalise(text):
+    """Names compared the way Serenity writes them, e.g. "Scenario: Buy an_item" and "buy an item" are the same."""
+    text = re.sub(r'^scenario:\s*', '', text.strip(), flags=re.IGNORECASE)
+    if text.endswith('.story'):
+        text = text[:-len('.story')]
+    return ' '.join(re.split(r'[\s_-]+', text.lower())).strip()
+
+
+def read_fields(path):
+    """The FIELDS of the outcome file at path, or {} if it isn't one."""
+    if ijson is None:
+        with open(path, 'rb') as file:
+            data = json.load(file)
+        if not isinstance(data, dict):
+            return {}
+        fields = {}
+        for prefix, field in FIELDS.items():
+            value = data
+            for key in prefix.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                fields[field] = value
+        return fields
+
+    fields = {}
+    with open(path, 'rb') as file:
+        for prefix, event, value in ijson.parse(file):
+            if prefix in FIELDS and event in ('string', 'number'):
+                fields[FIELDS[prefix]] = value
+    return fields
+
+
+def describe(counts):
+    """e.g. "3 passed, 1 failed" for a story row."""
+    return ', '.join('{} {}'.format(counts[result], result) for result in (PASSED, FAILED, PENDING) if counts.get(result))
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return '{:.1f} s'.format(seconds)
+    return '{}m {:02}s'.format(int(seconds // 60), int(seconds % 60))
+
+
+class ResultIndex:
+    """The latest outcome of every scenario in a StoryIndex found in a Serenity output folder."""
+
+    def __init__(self):
+        self.directory = None
+        self.outcomes = {}    # (story, scenario) -> Outcome
+        self.stories = {}     # story -> ({result: count}, seconds)
+        self.unmatched = []   # outcome files that don't match an indexed scenario
+        self.__files = {}     # path -> (mtime_ns, size, fields), to skip files read before
+
+    def ingest(self, directory, index):
+        """Read the outcome files in directory and match them to index. Returns the number of files read."""
+        if directory != self.directory:
+            self.__files = {}
+            self.directory = directory
+
+        read = 0
+        files = {}
+        with tracing.span('ingest serenity results'):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                entries = []
+
+            for entry in entries:
+                if not entry.name.endswith('.json') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                cached = self.__files.get(entry.path)
+                if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                    files[entry.path] = cached
+                    continue
+                try:
+                    fields = read_fields(entry.path)
+                except (OSError, ValueError) as error:
+                    print('Unable to read Serenity outcome', entry.path, repr(error))
+                    fields = {}
+                files[entry.path] = (stat.st_mtime_ns, stat.st_size, fields)
+                read += 1
+                tracing.count('serenity bytes read', stat.st_size)
+
+            self.__files = files
+            self.match(index)
+        tracing.count('serenity outcomes read', read)
+        return read
+
+    def match(self, index):
+        """Map the outcomes read so far onto the stories and scenarios in index, e.g. after the stories changed."""
+        self.outcomes = {}
+        self.stories = {}
+        self.unmatched = []
+        if not self.__files:
+            return
+
+        stories = {}  # story file name, or its normalised name -> (story file name, {normalised scenario: scenario})
+        for story in index.files:
+            entry = (story.name, {normalise(scenario): scenario for scenario in story.scenarios})
+            stories[story.name] = entry
+            stories.setdefault(normalise(story.name), entry)
+
+        for path, (mtime, size, fields) in sorted(self.__files.items()):
+            if 'result' not in fields:
+                continue  # not a test outcome
+            name = os.path.basename(str(fields.get('story path', '')).replace('\\', '/'))
+            story, scenarios = stories.get(name) or stories.get(normalise(str(fields.get('story name', name)))) or (None, {})
+            scenario = scenarios.get(normalise(str(fields.get('title') or fields.get('name', ''))))
+            if scenario is None:
+                self.unmatched.append(path)
+                continue
+
+            outcome = Outcome(story, scenario, RESULTS.get(str(fields['result']).upper(), PENDING),
+                              float(fields.get('duration', 0)) / 1000, str(fields.get('start', '')))
+            current = self.outcomes.get((story, scenario))
+            if current is None or outcome.start >= current.start:  # reruns replace earlier results
+                self.outcomes[(story, scenario)] = outcome
+
+        for (story, scenario), outcome in self.outcomes.items():
+            counts, duration = self.stories.get(story, ({}, 0.0))
+            counts[outcome.result] = counts.get(outcome.result, 0) + 1
+            self.stories[story] = (counts, duration + outcome.duration)
+
+    def scenario(self, story, scenario):
+        """The Outcome of a scenario, or None if it hasn't been run."""
+        return self.outcomes.get((story, scenario))
+
+    def story(self, story):
+        """({result: count}, total seconds) of the scenarios of story that have been run."""
+        return self.stories.get(story, ({}, 0.0))
+
+    def totals(self):
+        counts = {}
+        for outcome in self.outcomes.values():
+            counts[outcome.result] = counts.get(outcome.result, 0) + 1
+        return counts
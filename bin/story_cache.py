@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent SQLite cache of parsed story files. Each entry is keyed by the
+story's path and remembers the file's modification time and size, so a
+StoryIndex only has to re-parse the stories that changed since the last
+time the toolbox was launched.
+"""
+
+import os
+import json
+import sqlite3
+
+import tracing
+
+SCHEMA_VERSION = 2
+
+
+class StoryCache:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        # Built on the splash screen's worker thread, then only used from the Tk thread
+        self.connection = sqlite3.connect(filepath, check_same_thread=False)
+        self.__init_schema()
+
+    def __init_schema(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # The cache is disposable, rebuild it rather than migrate it
+            self.connection.execute('DROP TABLE IF EXISTS stories')
+            self.connection.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS stories ('
+            ' path TEXT PRIMARY KEY,'
+            ' mtime INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' data TEXT NOT NULL)'
+        )
+        self.connection.commit()
+
+    @tracing.span('story cache load')
+    def load(self, directory):
+        """Return {path: (mtime, size, data)} for every cached story below directory."""
+        prefix = os.path.join(directory, '')
+        rows = self.connection.execute(
+            'SELECT path, mtime, size, data FROM stories WHERE path >= ? AND path < ?',
+            (prefix, prefix + '\uffff')
+        )
+        return {path: (mtime, size, json.loads(data)) for path, mtime, size, data in rows}
+
+    @tracing.span('story cache save')
+    def save(self, changed, removed):
+        """Store the (path, mtime, size, data) rows in changed and forget the paths in removed."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO stories (path, mtime, size, data) VALUES (?, ?, ?, ?)',
+                ((path, mtime, size, json.dumps(data)) for path, mtime, size, data in changed)
+            )
+            self.connection.executemany('DELETE FROM stories WHERE path = ?', ((path,) for path in removed))
+
+    def close(self):
+        self.connection.close()
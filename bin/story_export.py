@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+"""
+Exports of the story index to TXT, CSV, JSON Lines and Markdown files,
+streamed from one walk over the index so any number of exports are written
+in a single pass without building the lists in memory first.
+
+    exports = [Export('stories.txt', 'stories'), Export('steps.md', 'stories-scenarios-steps')]
+    export(index, exports)
+
+A view picks which records an export gets: the stories, their scenarios,
+or both with the steps as well. The format comes from the file extension
+unless it is given.
+"""
+
+import os
+import csv
+import json
+
+import tracing
+
+VIEWS = {
+    'stories': ('story',),
+    'scenarios': ('scenario',),
+    'stories-and-scenarios': ('story', 'scenario'),
+    'stories-scenarios-steps': ('story', 'scenario', 'step'),
+}
+
+# The fields of each kind of record, a CSV gets the ones of the deepest kind in its view
+FIELDS = {
+    'story': ('story', 'path', 'scenarios'),
+    'scenario': ('story', 'scenario'),
+    'step': ('story', 'scenario', 'step'),
+}
+
+EXTENSIONS = {'.txt': 'txt', '.csv': 'csv', '.jsonl': 'jsonl', '.md': 'md'}
+
+
+def records(index):
+    """Yield a dict for every story, scenario and step in the index, stories sorted by name.
+
+    Every record has a 'type' of 'story', 'scenario' or 'step' plus the
+    FIELDS of that type.
+    """
+    for story in sorted(index.files, key=lambda story: story.name):
+        yield {'type': 'story', 'story': story.name, 'path': story.path, 'scenarios': len(story.scenarios)}
+        scenario = ''
+        for line in story.steps:
+            line = line.rstrip('\r\n')
+            if line.startswith('---- '):
+                yield {'type': 'step', 'story': story.name, 'scenario': scenario, 'step': line[5:]}
+            else:
+                scenario = line[3:]  # '-- Scenario: ...'
+                yield {'type': 'scenario', 'story': story.name, 'scenario': scenario}
+
+
+# Writers, one per format. They are given the records of their view, one at a time
+# -----------------------------------------------------------------------------
+
+class TextWriter:
+    """The layout of the toolbox's original save files: one line per record, scenarios and steps indented with dashes."""
+
+    def __init__(self, file, view):
+        self.file = file
+        self.nested = len(VIEWS[view]) > 1
+
+    def write(self, record):
+        if record['type'] == 'story':
+            self.file.write(record['story'] + '\n')
+        elif record['type'] == 'scenario':
+            self.file.write(('-- ' if self.nested else '') + record['scenario'] + '\n')
+        else:
+            self.file.write('---- ' + record['step'] + '\n')
+
+
+class CsvWriter:
+    def __init__(self, file, view):
+        self.kind = VIEWS[view][-1]
+        self.writer = csv.writer(file, lineterminator='\n')
+        self.writer.writerow([field.capitalize() for field in FIELDS[self.kind]])
+
+    def write(self, record):
+        if record['type'] == self.kind:
+            self.writer.writerow([record[field] for field in FIELDS[self.kind]])
+
+
+class JsonLinesWriter:
+    def __init__(self, file, view):
+        self.file = file
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+
+class MarkdownWriter:
+    """Stories as headings, scenarios as sub headings (or list items when they are the deepest level) and steps as list items."""
+
+    def __init__(self, file, view):
+        self.file = file
+        self.kinds = VIEWS[view]
+        self.listing = False  # whether the last line written was a list item
+
+    def write(self, record):
+        kind = record['type']
+        if kind == self.kinds[-1]:
+            self.file.write('- {}\n'.format(record[kind]))
+            self.listing = True
+            return
+        if self.listing:
+            self.file.write('\n')
+        self.file.write('{} {}\n\n'.format('##' if kind == 'story' else '###', record[kind]))
+        self.listing = False
+
+
+WRITERS = {
+    'txt': TextWriter,
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'md': MarkdownWriter,
+}
+
+
+class Export:
+    """One file to export a view of the index to, in the format given or the one its extension implies (TXT otherwise)."""
+
+    def __init__(self, filepath, view, format=None):
+        if view not in VIEWS:
+            raise ValueError('Unknown view "{}", expected one of {}'.format(view, ', '.join(sorted(VIEWS))))
+        if format is None:
+            format = EXTENSIONS.get(os.path.splitext(filepath)[1].lower(), 'txt')
+        if format not in WRITERS:
+            raise ValueError('Unknown format "{}", expected one of {}'.format(format, ', '.join(sorted(WRITERS))))
+        self.filepath = filepath
+        self.view = view
+        self.format = format
+        self.kinds = VIEWS[view]
+        self.count = 0  # records written
+
+
+def export(index, exports):
+    """Write every export in one pass over index. Returns the exports, with their record counts."""
+    files = []
+    try:
+        with tracing.span('export', files=len(exports)):
+            writers = []
+            for item in exports:
+                file = open(item.filepath, 'w', encoding='utf8', newline='')
+                files.append(file)
+                writers.append((item, WRITERS[item.format](file, item.view)))
+
+            for record in records(index):
+                for item, writer in writers:
+                    if record['type'] in item.kinds:
+                        writer.write(record)
+                        item.count += 1
+    finally:
+        for file in files:
+            file.close()
+    return exports
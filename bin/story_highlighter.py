@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Syntax highlighting for the story editor. Every kind of token is a named
+group in one alternation regex, so each line is scanned once and every match
+on it is tagged, not just the first one.
+
+StoryHighlighter keeps a tk.Text highlighted as it is edited. It sits in
+front of the widget's Tcl command to see which lines each insert and delete
+touches, and when <<Modified>> fires it re-highlights just those lines after
+a short delay, so typing in a large story doesn't rescan the whole file.
+"""
+
+import re
+
+DEBOUNCE_MS = 100
+
+TOKENS = re.compile(
+    r'(?P<NARRATIVE>(?<!\w)(?:Narrative:|In order to|As an?|I want to|So that)(?!\w))'
+    r'|(?P<SCENARIO>(?<!\w)Scenario:)'
+    r'|(?P<META_KEYWORD>(?<!\w)Meta:)'
+    r'|(?P<META>(?<!\w)@\S+)'
+    r'|(?P<KEYWORD>(?<!\w)(?:Given|When|Then|And)(?!\w))'
+    r'|(?P<EXAMPLES_TABLE>(?<!\w)Examples:?)'
+)
+
+COLORS = {
+    'NARRATIVE': 'Blue',
+    'SCENARIO': 'Purple',
+    'META_KEYWORD': 'Orange',
+    'META': 'Green',
+    'KEYWORD': 'Orange',
+    'EXAMPLES_TABLE': 'Red',
+}
+
+
+def tokens(line):
+    """(tag, start column, end column) of every token in line."""
+    return [(match.lastgroup, match.start(), match.end()) for match in TOKENS.finditer(line)]
+
+
+def token_ranges(block, first):
+    """{tag: [start, end, start, end, ...]} Text indices of every token in block, whose first line is line number first."""
+    ranges = {tag: [] for tag in COLORS}
+    for number, line in enumerate(block.split('\n'), first):
+        for tag, column, column_end in tokens(line):
+            ranges[tag] += ['{}.{}'.format(number, column), '{}.{}'.format(number, column_end)]
+    return ranges
+
+
+def touch(dirty, line, shift):
+    """The (first, last) lines to re-highlight once line is edited and the lines after it move by shift.
+
+    dirty is the range edited before, or None.
+    """
+    first, last = dirty or (line, line)
+    if first > line:
+        first = max(line, first + shift)
+    if last > line:
+        last = max(line, last + shift)
+    return min(first, line), max(last, line + max(shift, 0))
+
+
+class StoryHighlighter:
+    def __init__(self, text, delay=DEBOUNCE_MS):
+        self.text = text
+        self.delay = delay
+        self.__dirty = None    # (first line, last line) edited since the last highlight
+        self.__pending = None  # after() id of the scheduled highlight
+
+        for tag, color in COLORS.items():
+            text.tag_configure(tag, foreground=color)
+
+        # Route the widget's Tcl command through __proxy to see what each edit touches
+        self.__widget = str(text)
+        self.__original = self.__widget + '_unhighlighted'
+        text.tk.call('rename', self.__widget, self.__original)
+        text.tk.createcommand(self.__widget, self.__proxy)
+
+        text.edit_modified(False)
+        text.bind('<<Modified>>', self.on_modified, add='+')
+        text.bind('<Destroy>', self.close, add='+')
+
+    def close(self, event=None):
+        if event is not None and str(event.widget) != self.__widget:
+            return
+        if self.__pending is not None:
+            self.text.after_cancel(self.__pending)
+            self.__pending = None
+        try:
+            self.text.tk.deletecommand(self.__widget)
+            self.text.tk.call('rename', self.__original, self.__widget)
+        except Exception:
+            pass  # already gone along with the widget
+
+    def __call(self, *args):
+        return self.text.tk.call((self.__original,) + args)
+
+    def __line(self, index):
+        return int(str(self.__call('index', index)).split('.')[0])
+
+    def __proxy(self, command, *args):
+        if command == 'insert':
+            line = self.__line(args[0])
+            result = self.__call(command, *args)
+            self.__dirty = touch(self.__dirty, line, sum(chars.count('\n') for chars in args[1::2]))
+        elif command == 'delete':
+            first = self.__line(args[0])
+            last = self.__line(args[1]) if len(args) > 1 else first
+            result = self.__call(command, *args)
+            self.__dirty = touch(self.__dirty, first, first - last)
+        elif command == 'replace':
+            first, last = self.__line(args[0]), self.__line(args[1])
+            result = self.__call(command, *args)
+            self.__dirty = touch(self.__dirty, first, sum(chars.count('\n') for chars in args[2::2]) - (last - first))
+        else:
+            result = self.__call(command, *args)
+        return result
+
+    def on_modified(self, event=None):
+        if not self.text.edit_modified():
+            return  # the flag being reset below
+        self.text.edit_modified(False)
+        if self.__pending is None:
+            self.__pending = self.text.after(self.delay, self.__highlight_dirty)
+
+    def __highlight_dirty(self):
+        self.__pending = None
+        if self.__dirty is not None:
+            first, last = self.__dirty
+            self.__dirty = None
+            self.highlight(first, last)
+
+    def highlight_all(self):
+        self.__dirty = None
+        self.highlight(1, self.__line('end'))
+
+    def highlight(self, first, last):
+        """Re-tag lines first to last, inclusive."""
+        end = self.__line('end-1c')
+        first, last = max(1, first), min(last, end)
+        if first > last:
+            return
+
+        start, stop = '{}.0'.format(first), '{}.end'.format(last)
+        for tag in COLORS:
+            self.__call('tag', 'remove', tag, start, stop)
+
+        # One tag add per kind of token for the whole block
+        for tag, indices in token_ranges(str(self.__call('get', start, stop)), first).items():
+            if indices:
+                self.__call('tag', 'add', tag, *indices)
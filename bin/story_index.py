@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+
+"""
+Single pass index over a directory of jBehave .story files. Every story is
+read exactly once and the stories, scenarios, steps and @metatag lines it
+contains are kept in memory so the toolbox tabs can be populated without
+walking the story directory again.
+"""
+
+import os
+import re
+import mmap
+
+import tracing
+
+# Below this many stories to parse, a thread pool is used instead of a process pool
+PARALLEL_THRESHOLD = 1000
+# Stories handed to a worker at a time
+CHUNK_SIZE = 64
+# How often build() reports progress, in stories
+PROGRESS_INTERVAL = 100
+
+# The only lines add_line() keeps: metatags, scenarios and steps
+STORY_LINES = re.compile(rb'^(?:@|(?i:scenario:|given|when|then|and)).*', re.MULTILINE)
+LONE_CARRIAGE_RETURN = re.compile(rb'\r(?!\n)')
+
+
+class StoryFile:
+    """The parsed contents of a single story file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.scenarios = []  # "Scenario:" lines, in file order
+        self.steps = []      # scenarios and Given/When/Then/And steps, prefixed with '-- ' and '---- '
+        self.meta = []       # lines that start with "@"
+        self.meta_scenario = []  # for each meta line, the index of its scenario or -1 for story level meta
+
+    def postings(self):
+        """Yield (key, value, scenario) for every meta line, where scenario is '' for story level meta."""
+        for line, scenario in zip(self.meta, self.meta_scenario):
+            key, _, value = line.partition(' ')
+            yield key, value.strip(), self.scenarios[scenario] if scenario >= 0 else ''
+
+    def to_dict(self):
+        return {'scenarios': self.scenarios, 'steps': self.steps, 'meta': self.meta, 'meta_scenario': self.meta_scenario}
+
+    @classmethod
+    def from_dict(cls, path, data):
+        story = cls(path)
+        story.scenarios = data['scenarios']
+        story.steps = data['steps']
+        story.meta = data['meta']
+        story.meta_scenario = data['meta_scenario']
+        return story
+
+    def metatag_data(self, metatag, with_stories):
+        """The values of metatag on the story's meta lines, i.e. only lines that start with "@"."""
+        metatags = []
+        for line in self.meta:
+            if metatag in line:
+                if with_stories:
+                    offset = len(metatag) + len(': ')
+                    metatags.append(self.name + ' ' + line[offset:])
+                else:
+                    metatags.append(line.partition(':')[2][1:])
+        return metatags
+
+
+def parse_story(path):
+    story = scan_story(path)
+    if story is None:
+        story = read_story_lines(path)
+    return story
+
+
+def read_story_lines(path):
+    """Parse a story line by line in text mode."""
+    story = StoryFile(path)
+
+    with open(path, 'r', encoding='utf8', errors='replace') as file:
+        for line in file:
+            add_line(story, line)
+    return story
+
+
+def scan_story(path):
+    """Parse a story by memory mapping it and only decoding the lines STORY_LINES matches.
+
+    Returns None for stories that need the text mode reader, i.e. ones
+    using lone carriage returns as line endings.
+    """
+    story = StoryFile(path)
+
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return story  # Empty files can't be mapped
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if LONE_CARRIAGE_RETURN.search(buffer):
+                return None
+
+            for match in STORY_LINES.finditer(buffer):
+                line = match.group()
+                if line[-1:] == b'\r':
+                    line = line[:-1]  # Windows line ending
+                line = line.decode('utf8', 'replace')
+                if match.end() < size:
+                    line += '\n'
+                add_line(story, line)
+    return story
+
+
+def add_line(story, line):
+    if '@' == line[:1]:
+        story.meta.append(line)
+        story.meta_scenario.append(len(story.scenarios) - 1)
+
+    if 'Scenario:' == line[:9]:
+        story.scenarios.append(line)
+
+    lowered = line[:9].lower()
+    if 'scenario:' == lowered:
+        story.steps.append('-- ' + line)
+    if (
+        'given' == lowered[:5] or
+        'when' == lowered[:4] or
+        'then' == lowered[:4] or
+        'and' == lowered[:3]
+    ): story.steps.append('---- ' + line)
+
+
+def read_story_text(path):
+    """Read a story for editing in a single read.
+
+    Returns (text, newline), with the text's line endings normalised to \\n
+    and newline being the line ending the file uses, so it can be saved back
+    the same way.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    newline = '\r\n' if b'\r\n' in data else '\n'
+    return data.decode('utf8', 'replace').replace('\r\n', '\n'), newline
+
+
+def write_story_text(path, text, newline='\n'):
+    """Replace a story's contents atomically: written to a temporary file next to it, then renamed over it."""
+    import shutil
+    import tempfile
+
+    directory, name = os.path.split(path)
+    descriptor, temporary = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+    try:
+        try:
+            file = open(descriptor, 'w', encoding='utf8', newline=newline)
+        except BaseException:
+            os.close(descriptor)  # the file object never took it over
+            raise
+        with file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temporary)  # mkstemp files are private to the user
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def parse_stories(paths):
+    """Parse a chunk of stories into compact, picklable dicts. Runs inside the worker pool."""
+    return [parse_story(path).to_dict() for path in paths]
+
+
+def parse_all(paths, workers=None):
+    """Yield a StoryFile for each path, in order.
+
+    Stories are parsed in chunks across a process pool for large trees and a
+    thread pool for small ones, where starting processes would cost more than
+    it saves. workers=1 parses serially, None uses one worker per CPU.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            yield parse_story(path)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # only needed once there are stories to parse
+
+    if len(paths) >= PARALLEL_THRESHOLD:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    with executor:
+        for chunk, results in zip(chunks, executor.map(parse_stories, chunks)):
+            for path, data in zip(chunk, results):
+                yield StoryFile.from_dict(path, data)
+
+
+class StoryIndex:
+    def __init__(self, directory=''):
+        self.directory = directory
+        self.by_name = {}  # filename -> StoryFile, the first in walk order when several folders have one of that name
+        self.by_path = {}  # full path -> StoryFile, in walk order with stories created since at the end
+        self.paths_by_name = {}  # filename -> full paths of every story of that name
+        self._postings = None
+
+    @property
+    def files(self):
+        """Every StoryFile in walk order. A view of by_path, so update() swaps or drops a story without scanning the list."""
+        return self.by_path.values()
+
+    def build(self, cache=None, workers=None, progress=None):
+        """Walk the story directory and parse every story.
+
+        When a StoryCache is given, stories whose modification time and size
+        match the cached entry are loaded from the cache instead of being
+        parsed, and the cache is updated with whatever had to be re-parsed.
+        The remaining stories are parsed in parallel, see parse_all().
+
+        progress, when given, is called with (stories done, total stories)
+        every PROGRESS_INTERVAL stories.
+        """
+        self.by_name = {}
+        self.by_path = {}
+        self.paths_by_name = {}
+        self._postings = None
+
+        if not self.directory:
+            return self
+
+        cached = cache.load(self.directory) if cache else {}
+        walked = []  # (path, stat, cached story or None) in walk order
+        with tracing.span('scan stories'):
+            for path, dirs, files in os.walk(self.directory):
+                dirs.sort()
+                for file in sorted(files):
+                    filepath = os.path.join(path, file)
+                    stat = os.stat(filepath)
+                    entry = cached.pop(filepath, None)
+
+                    if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                        walked.append((filepath, stat, StoryFile.from_dict(filepath, entry[2])))
+                    else:
+                        walked.append((filepath, stat, None))
+
+        unparsed = [(filepath, stat) for filepath, stat, story in walked if story is None]
+        tracing.count('stories from cache', len(walked) - len(unparsed))
+        tracing.count('stories parsed', len(unparsed))
+        tracing.count('story bytes read', sum(stat.st_size for filepath, stat in unparsed))
+
+        changed = []
+        with tracing.span('parse stories', stories=len(unparsed)):
+            parsed = parse_all([filepath for filepath, stat in unparsed], workers)
+            for done, (filepath, stat, story) in enumerate(walked, 1):
+                if story is None:
+                    story = next(parsed)
+                    changed.append((filepath, stat.st_mtime_ns, stat.st_size, story.to_dict()))
+                self.add(story)
+
+                if progress and (done % PROGRESS_INTERVAL == 0 or done == len(walked)):
+                    progress(done, len(walked))
+
+        if cache:
+            # Anything left over in cached was deleted since the last scan
+            cache.save(changed, cached.keys())
+        return self
+
+    def add(self, story):
+        self.by_name.setdefault(story.name, story)
+        self.by_path[story.path] = story
+        self.paths_by_name.setdefault(story.name, []).append(story.path)
+        self._postings = None
+
+    def update(self, path, cache=None):
+        """Re-parse a single story after it was created, edited or deleted.
+
+        Returns the (old, new) StoryFile for the path, where old is None for
+        a new story and new is None for a deleted one.
+        """
+        if not path.startswith(os.path.join(self.directory, '')):
+            return None, None
+
+        old = self.by_path.get(path)
+        try:
+            with tracing.span('parse story'):
+                stat = os.stat(path)
+                new = parse_story(path)
+            tracing.count('stories parsed')
+            tracing.count('story bytes read', stat.st_size)
+        except OSError:
+            new = None
+
+        if new is None:
+            if old is not None:
+                del self.by_path[path]
+                self.paths_by_name[old.name].remove(path)
+                self.__rename(old.name)
+        else:
+            if old is None:
+                self.paths_by_name.setdefault(new.name, []).append(path)
+            self.by_path[path] = new  # a story that is already indexed keeps its place
+            self.__rename(new.name)
+        self._postings = None
+
+        if cache:
+            if new is None:
+                cache.save([], [path])
+            else:
+                cache.save([(path, stat.st_mtime_ns, stat.st_size, new.to_dict())], [])
+        return old, new
+
+    def __rename(self, name):
+        """Point by_name at the first story still called name, as build() would."""
+        paths = self.paths_by_name.get(name)
+        if paths:
+            self.by_name[name] = self.by_path[paths[0]]
+        else:
+            self.by_name.pop(name, None)
+            self.paths_by_name.pop(name, None)
+
+    def story(self, name):
+        return self.by_name.get(name)
+
+    def paths(self, name):
+        """Full paths of every story called name, more than one when several folders have a story of that name."""
+        return list(self.paths_by_name.get(name, []))
+
+    def path(self, name):
+        """Full path of the story called name, or None if there is no such story or more than one."""
+        paths = self.paths_by_name.get(name, [])
+        return paths[0] if len(paths) == 1 else None
+
+    def stories(self):
+        """Every file in the story directory, sorted by name."""
+        return sorted(story.name for story in self.files)
+
+    def story_files(self):
+        """Only the files that have a .story extension, sorted by name."""
+        return sorted(story.name for story in self.files if story.name.endswith('.story'))
+
+    def scenarios(self):
+        scenarios = []
+        for story in self.files:
+            scenarios.extend(story.scenarios)
+        return sorted(scenarios)
+
+    def scenarios_in(self, name):
+        story = self.story(name)
+        if story is None:
+            return []
+        return list(story.scenarios)
+
+    def stories_and_scenarios(self):
+        combined = []
+        for story in self.files:
+            combined.append(story.name)
+            for scenario in story.scenarios:
+                combined.append('-- ' + scenario)
+        return combined
+
+    def stories_scenarios_and_steps(self):
+        combined = []
+        for story in self.files:
+            combined.append(story.name)
+            combined.extend(story.steps)
+        return combined
+
+    def metatags(self):
+        """Unique "@key value" lines, sorted."""
+        unique = set()
+        for story in self.files:
+            unique.update(story.meta)
+        return sorted(unique)
+
+    def metatag_keys(self):
+        """Unique "@key" names, sorted.
+
+        Example:
+            "@usecase 5" becomes "@usecase"
+            "@requirement 14" becomes "@requirement"
+        """
+        unique = set()
+        for story in self.files:
+            for line in story.meta:
+                unique.add(line.split(' ')[0])
+        return sorted(unique)
+
+    def metatag_data(self, metatag, with_stories):
+        metatags = []
+        for story in self.files:
+            metatags.extend(story.metatag_data(metatag, with_stories))
+
+        if not with_stories:
+            metatags = list(set(metatags))
+
+        return sorted(metatags)
+
+    def postings(self):
+        """Inverted metatag index: {"@key": [(value, story name, scenario), ...]}"""
+        if self._postings is None:
+            self._postings = {}
+            for story in self.files:
+                for key, value, scenario in story.postings():
+                    self._postings.setdefault(key, []).append((value, story.name, scenario))
+        return self._postings
+
+    def metatag_counts(self, key=None):
+        """How many times each metatag key is used, or each value of key when one is given."""
+        postings = self.postings()
+        if key is None:
+            return {k: len(v) for k, v in postings.items()}
+
+        counts = {}
+        for value, story, scenario in postings.get(key, []):
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def find_story_from_scenario(self, scenario):
+        for story in self.files:
+            if scenario in story.scenarios:
+                return story.name
+        return ''
+
+
+def metatag_table(counts, coverage):
+    """Aggregate metatag counts into (key, count, percent, coverage) rows.
+
+    counts maps each metatag to the number of times it is used and coverage
+    maps metatags to the fraction of their requirements that are covered
+    (see CoverageMatrix.key_coverage), or None.
+    """
+    total = sum(counts.values())
+
+    rows = []
+    for key in sorted(counts):
+        count = counts[key]
+        percent = '{:.1%}'.format(count / total) if total else '~'  # One decimal format (0.0%)
+
+        # Only provide coverage for requirements that are listed in the requirements tab
+        covered = coverage.get(key)
+        rows.append((key, count, percent, '~' if covered is None else '{:.1%}'.format(covered)))
+    return rows
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Watches the story directory for stories that are created, edited or deleted
+outside of the toolbox (e.g. in an IDE). Uses inotify on Linux and falls back
+to polling file modification times everywhere else. Changed paths are queued
+up for the Tk thread, which drains them with poll() from an after() callback.
+"""
+
+import os
+import sys
+import queue
+import select
+import struct
+import threading
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def load_inotify():
+    """Return libc if it provides inotify, otherwise None."""
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class StoryWatcher:
+    def __init__(self, directory, interval=2.0, backend=None):
+        """backend is 'polling' to poll even where inotify is available, None uses inotify where it is."""
+        self.directory = directory
+        self.interval = interval  # seconds between scans when polling
+        self.changes = queue.Queue()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__libc = load_inotify() if backend != 'polling' else None
+
+    @property
+    def backend(self):
+        return 'inotify' if self.__libc else 'polling'
+
+    def start(self):
+        target = self.__watch_inotify if self.__libc else self.__watch_polling
+        self.__thread = threading.Thread(target=target, name='story-watcher', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(self.interval + 1)
+
+    def poll(self):
+        """Return the set of changed paths since the last poll, or None if everything must be rescanned."""
+        changed = set()
+        while True:
+            try:
+                path = self.changes.get_nowait()
+            except queue.Empty:
+                return changed
+
+            if path is None:
+                # Drain whatever else is queued, a full rescan covers it anyway
+                while not self.changes.empty():
+                    self.changes.get_nowait()
+                return None
+            changed.add(path)
+
+    # Polling
+    # -----------------------------------------------------------------------------
+
+    def snapshot(self):
+        stats = {}
+        for path, dirs, files in os.walk(self.directory):
+            for file in files:
+                filepath = os.path.join(path, file)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue  # deleted while walking
+                stats[filepath] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def __watch_polling(self):
+        previous = self.snapshot()
+        while not self.__stop.wait(self.interval):
+            current = self.snapshot()
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self.changes.put(path)
+            previous = current
+
+    # inotify
+    # -----------------------------------------------------------------------------
+
+    def __add_watches(self, fd, directories, top, announce):
+        """Watch top and every directory below it. With announce, files already inside are queued up as changed."""
+        for path, dirs, files in os.walk(top):
+            wd = self.__libc.inotify_add_watch(fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                directories[wd] = path
+            if announce:
+                for file in files:
+                    self.changes.put(os.path.join(path, file))
+
+    def __watch_inotify(self):
+        fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            self.__watch_polling()
+            return
+
+        directories = {}  # watch descriptor -> directory path
+        try:
+            self.__add_watches(fd, directories, self.directory, False)
+            while not self.__stop.is_set():
+                ready, _, _ = select.select([fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    buffer = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self.__read_events(fd, directories, buffer)
+        finally:
+            os.close(fd)
+
+    def __read_events(self, fd, directories, buffer):
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.changes.put(None)
+                continue
+
+            directory = directories.get(wd)
+            if directory is None:
+                continue
+
+            if mask & IN_DELETE_SELF:
+                del directories[wd]
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.__add_watches(fd, directories, path, True)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    # Every story that lived in the directory is gone
+                    self.changes.put(None)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE):
+                self.changes.put(path)
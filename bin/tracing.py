@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight spans and counters for the toolbox's slow paths: story scans,
+requirements loads, tree population, Maven runs and Selenium start up.
+
+    with tracing.span('populate test tree'):
+        ...
+        tracing.count('tree rows', len(rows))
+
+A span costs two perf_counter() calls and a deque append, so tracing is
+always on. The most recent MAX_EVENTS events are kept and can be exported
+as a Chrome trace-event file (open it in chrome://tracing or Perfetto) or
+summarised per span name.
+
+Counters are meant to be bumped once per batch, not once per item, since
+every count() is also recorded as a counter event in the trace.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import collections
+from functools import wraps
+
+MAX_EVENTS = 100000
+
+SPAN = 'X'     # Chrome trace "complete" event
+COUNTER = 'C'  # Chrome trace counter event
+
+enabled = True
+
+_events = collections.deque(maxlen=MAX_EVENTS)  # (kind, name, start, duration or value, thread id, args)
+_counters = {}
+_threads = {}  # thread id -> name
+_lock = threading.Lock()
+_epoch = time.perf_counter()
+
+
+class span:
+    """Time the code in a with block, or every call of a decorated function."""
+
+    __slots__ = ('name', 'args', 'started')
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if enabled:
+            if exc_type is not None:
+                self.args['error'] = exc_type.__name__
+            _add(SPAN, self.name, self.started, time.perf_counter() - self.started, self.args)
+
+    def __call__(self, function):
+        name, args = self.name, self.args
+
+        @wraps(function)
+        def traced(*a, **kw):
+            with span(name, **args):
+                return function(*a, **kw)
+        return traced
+
+
+def record(name, seconds, **args):
+    """Add a span that ended just now and took seconds, for work timed elsewhere (e.g. across after() callbacks)."""
+    if enabled:
+        _add(SPAN, name, time.perf_counter() - seconds, seconds, args)
+
+
+def count(name, amount=1):
+    """Add amount to the counter name."""
+    if not enabled:
+        return
+    with _lock:
+        total = _counters[name] = _counters.get(name, 0) + amount
+    _add(COUNTER, name, time.perf_counter(), total, None)
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def _add(kind, name, start, value, args):
+    thread = threading.get_ident()
+    if thread not in _threads:
+        _threads[thread] = threading.current_thread().name
+    _events.append((kind, name, start, value, thread, args))
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _counters.clear()
+
+
+# Output
+# -----------------------------------------------------------------------------
+
+def chrome_trace():
+    """The recorded events in Chrome's trace-event format."""
+    pid = os.getpid()
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread, 'args': {'name': name}}
+              for thread, name in list(_threads.items())]
+    for kind, name, start, value, thread, args in list(_events):
+        ts = (start - _epoch) * 1e6  # microseconds
+        if kind == SPAN:
+            events.append({'name': name, 'ph': SPAN, 'ts': ts, 'dur': value * 1e6, 'pid': pid, 'tid': thread, 'args': args or {}})
+        else:
+            events.append({'name': name, 'ph': COUNTER, 'ts': ts, 'pid': pid, 'tid': thread, 'args': {name: value}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export_chrome_trace(filepath):
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    with open(filepath, 'w') as file:
+        json.dump(chrome_trace(), file)
+    return filepath
+
+
+def summary():
+    """(name, calls, total ms, mean ms, max ms) per span name, slowest in total first."""
+    totals = {}
+    for kind, name, start, value, thread, args in list(_events):
+        if kind == SPAN:
+            calls, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (calls + 1, total + value, max(longest, value))
+
+    rows = [(name, calls, total * 1000, total * 1000 / calls, longest * 1000)
+            for name, (calls, total, longest) in totals.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def print_summary(file=None):
+    file = file or sys.stdout
+    print('{:<32} {:>7} {:>11} {:>11} {:>11}'.format('Span', 'Calls', 'Total ms', 'Mean ms', 'Max ms'), file=file)
+    for name, calls, total, mean, longest in summary():
+        print('{:<32} {:>7} {:>11.1f} {:>11.1f} {:>11.1f}'.format(name, calls, total, mean, longest), file=file)
+
+    totals = counters()
+    if totals:
+        print(file=file)
+        print('{:<32} {:>7}'.format('Counter', 'Total'), file=file)
+        for name in sorted(totals):
+            print('{:<32} {:>7}'.format(name, totals[name]), file=file)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sort keys for Treeview columns. Cells are compared by what they hold rather
+than as strings: counts and percentages ("12.5%") numerically, and text in
+natural order, so "Story 9" comes before "Story 10". Blank cells and the "~"
+used for "not applicable" always sort last.
+"""
+
+import re
+from operator import itemgetter
+
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)%?$')
+DIGITS = re.compile(r'(\d+)')
+
+# Keys are (rank, value) so numbers, text and blanks never get compared with each other
+BLANK = (2,)
+
+
+def sort_key(value):
+    if isinstance(value, (int, float)):
+        return (0, value)
+
+    text = str(value).strip()
+    if text in ('', '~'):
+        return BLANK
+    if NUMBER.match(text):
+        return (0, float(text.rstrip('%')))
+    # Text and numbers alternate, so the parts always line up as str, int, str, ...
+    return (1, tuple(int(part) if index % 2 else part for index, part in enumerate(DIGITS.split(text.casefold()))))
+
+
+def sort_items(keyed, descending=False):
+    """The items of (sort key, item) pairs in sorted order, with blank cells last either way."""
+    filled = [pair for pair in keyed if pair[0] != BLANK]
+    filled.sort(key=itemgetter(0), reverse=descending)
+    return [item for key, item in filled] + [item for key, item in keyed if key == BLANK]
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+
+"""
+A virtualized stand-in for ttk.Treeview. The rows are kept in Python and only
+the ones inside the viewport (plus a small overscan) are materialized as
+Treeview items, which are recycled as the view scrolls. This keeps trees with
+100k+ rows responsive and the Tcl item count constant.
+
+VirtualTree mimics the parts of the Treeview API the toolbox uses (insert,
+delete, item, set, get_children, selection, yview, ...) so it can be dropped
+in where a Treeview was used. Anything it doesn't implement is passed through
+to the underlying Treeview, e.g. grid(), heading() and column().
+
+Nested rows are drawn indented with a disclosure marker, because every
+materialized item is a top level Treeview item. Opening a row generates
+<<TreeviewOpen>> on the Treeview just like a real one, with focus() set to
+the row being opened.
+"""
+
+import tkinter as tk
+import tkinter.ttk as ttk
+from tkinter import font
+
+from tree_sort import sort_key, sort_items
+
+OVERSCAN = 2            # rows materialized below the viewport
+INDENT = '    '
+MARKER_CLOSED = '▸ '
+MARKER_OPEN = '▾ '
+MARKER_LEAF = '  '
+
+
+class Node:
+    __slots__ = ('key', 'parent', 'text', 'values', 'tags', 'open', 'children', 'sort_keys')
+
+    def __init__(self, key, parent, text, values, tags, open):
+        self.key = key
+        self.parent = parent
+        self.text = text
+        self.values = values
+        self.tags = tags
+        self.open = open
+        self.children = []
+        self.sort_keys = None  # column -> sort key, until the values change
+
+
+# Row bookkeeping, kept apart from the widget so it can be used (and tested) without Tk
+# -----------------------------------------------------------------------------
+
+def visible_rows(nodes, root=''):
+    """(key, depth) of every row under root that isn't hidden inside a closed parent, in display order."""
+    rows = []
+    stack = [(key, 0) for key in reversed(nodes[root].children)]
+    while stack:
+        key, depth = stack.pop()
+        rows.append((key, depth))
+        node = nodes[key]
+        if node.open:
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+    return rows
+
+
+def clamp_first(first, total, visible):
+    """The first row to show, kept within the rows so the viewport is never scrolled past the end."""
+    return max(0, min(first, total - visible))
+
+
+def row_window(rows, first, visible):
+    """The rows to materialize for a viewport that starts at first."""
+    return rows[first:first + visible + OVERSCAN]
+
+
+def scroll_fractions(first, total, visible):
+    """The (top, bottom) fractions a scrollbar shows for the viewport."""
+    if total == 0:
+        return 0.0, 1.0
+    return first / total, min(1.0, (first + visible) / total)
+
+
+def sorted_children(nodes, parent, position, descending=False):
+    """The children of parent sorted by the value in column position, caching each row's sort key on its Node."""
+    keyed = []
+    for item in nodes[parent].children:
+        node = nodes[item]
+        if node.sort_keys is None:
+            node.sort_keys = {}
+        key = node.sort_keys.get(position)
+        if key is None:
+            key = sort_key(node.values[position] if position < len(node.values) else '')
+            node.sort_keys[position] = key
+        keyed.append((key, item))
+    return sort_items(keyed, descending)
+
+
+def row_label(node, depth):
+    """The text of a row: indented by its depth, with a marker showing whether it can be opened."""
+    if node.children:
+        marker = MARKER_OPEN if node.open else MARKER_CLOSED
+    else:
+        marker = MARKER_LEAF
+    return INDENT * depth + marker + node.text
+
+
+class VirtualTree:
+    def __init__(self, master=None, **kw):
+        self.tree = ttk.Treeview(master, **kw)
+        self.__nodes = {'': Node('', None, '', '', (), True)}
+        self.__counter = 0
+        self.__rows = None        # flattened (key, depth) of every visible row, None when stale
+        self.__pool = []          # recycled Treeview item ids
+        self.__shown = {}         # Treeview item id -> key currently drawn in it
+        self.__first = 0          # index of the first visible row
+        self.__selection = []
+        self.__focus = ''
+        self.__yscroll = None
+        self.__pending = None
+
+        style = ttk.Style(self.tree)
+        self.rowheight = int(style.lookup('Treeview', 'rowheight') or 0) or font.nametofont('TkDefaultFont').metrics('linespace') + 4
+
+        self.tree.bind('<Configure>', lambda e: self.__schedule(), add=True)
+        self.tree.bind('<<TreeviewSelect>>', self.__on_select, add=True)
+        self.tree.bind('<Button-1>', self.__on_click, add=True)
+        self.tree.bind('<Double-1>', self.__on_double_click, add=True)
+        self.tree.bind('<MouseWheel>', lambda e: self.__on_wheel(-1 * (e.delta // 120 or (1 if e.delta > 0 else -1)) * 3), add=True)
+        self.tree.bind('<Button-4>', lambda e: self.__on_wheel(-3), add=True)
+        self.tree.bind('<Button-5>', lambda e: self.__on_wheel(3), add=True)
+        self.tree.bind('<Up>', lambda e: self.__on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self.__on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self.__on_arrow(-self.__visible_rows()))
+        self.tree.bind('<Next>', lambda e: self.__on_arrow(self.__visible_rows()))
+        self.tree.bind('<Right>', lambda e: self.__on_expand(True))
+        self.tree.bind('<Left>', lambda e: self.__on_expand(False))
+        self.tree.bind('<Return>', lambda e: self.__on_expand(None))
+
+    def __getattr__(self, name):
+        # grid(), heading(), column(), tag_configure(), bind(), ... go straight to the Treeview
+        if name == 'tree':
+            raise AttributeError(name)
+        return getattr(self.tree, name)
+
+    def __setitem__(self, option, value):
+        if option in ('yscroll', 'yscrollcommand'):
+            self.__yscroll = value
+            self.__schedule()
+        else:
+            self.tree[option] = value
+
+    def __getitem__(self, option):
+        if option in ('yscroll', 'yscrollcommand'):
+            return self.__yscroll
+        return self.tree[option]
+
+    # Treeview API
+    # -----------------------------------------------------------------------------
+
+    def insert(self, parent, index, iid=None, text='', values='', tags=(), open=False, **kw):
+        if iid is None:
+            self.__counter += 1
+            iid = 'V{:06X}'.format(self.__counter)
+        if iid in self.__nodes:
+            raise tk.TclError('Item {} already exists'.format(iid))
+
+        values = kw.get('value', values)
+        if isinstance(values, str):
+            values = (values,) if values else ''
+        if isinstance(tags, str):
+            tags = (tags,)
+
+        node = Node(iid, parent, text, tuple(values) if values != '' else '', tuple(tags), open)
+        siblings = self.__nodes[parent].children
+        if index == 'end':
+            siblings.append(iid)
+        else:
+            siblings.insert(int(index), iid)
+        self.__nodes[iid] = node
+        self.__changed(parent)
+        return iid
+
+    def delete(self, *items):
+        doomed = set(key for key in self.__flatten(items) if key in self.__nodes)
+        parents = set(self.__nodes[key].parent for key in doomed)
+
+        # Filter each parent once, so clearing a 100k row tree stays linear
+        for parent in parents:
+            if parent in self.__nodes:
+                node = self.__nodes[parent]
+                node.children = [child for child in node.children if child not in doomed]
+        for key in doomed:
+            if key in self.__nodes:
+                self.__forget(self.__nodes[key])
+        for parent in parents:
+            if parent in self.__nodes:
+                self.__changed(parent)
+
+        self.__selection = [key for key in self.__selection if key in self.__nodes]
+        if self.__focus not in self.__nodes:
+            self.__focus = ''
+
+    def exists(self, item):
+        return item in self.__nodes
+
+    def get_children(self, item=''):
+        return tuple(self.__nodes[item].children)
+
+    def parent(self, item):
+        return self.__nodes[item].parent
+
+    def index(self, item):
+        node = self.__nodes[item]
+        return self.__nodes[node.parent].children.index(item)
+
+    def item(self, item, option=None, **kw):
+        items = self.__flatten((item,))
+        node = self.__nodes[items[0] if items else '']
+
+        if kw:
+            if 'text' in kw:
+                node.text = kw['text']
+            if 'values' in kw:
+                node.values = tuple(kw['values']) if kw['values'] != '' else ''
+                node.sort_keys = None
+            if 'tags' in kw:
+                node.tags = (kw['tags'],) if isinstance(kw['tags'], str) else tuple(kw['tags'])
+            if 'open' in kw and bool(kw['open']) != node.open:
+                node.open = bool(kw['open'])
+                self.__rows = None
+            self.__schedule()
+            return
+
+        options = {'text': node.text, 'values': list(node.values) if node.values else '', 'tags': list(node.tags) or '', 'open': node.open, 'image': ''}
+        return options[option] if option else options
+
+    def set(self, item, column=None, value=None):
+        node = self.__nodes[item]
+        columns = self.__columns()
+        if column is None:
+            return dict(zip(columns, node.values))
+
+        position = column if isinstance(column, int) else columns.index(column)
+        if value is None:
+            return node.values[position] if position < len(node.values) else ''
+
+        values = list(node.values) + [''] * (len(columns) - len(node.values))
+        values[position] = value
+        node.values = tuple(values)
+        node.sort_keys = None
+        self.__schedule()
+
+    def move(self, item, parent, index):
+        node = self.__nodes[item]
+        self.__nodes[node.parent].children.remove(item)
+        self.__changed(node.parent)
+        node.parent = parent
+        siblings = self.__nodes[parent].children
+        if index == 'end':
+            siblings.append(item)
+        else:
+            siblings.insert(int(index), item)
+        self.__changed(parent)
+
+    def reorder(self, parent, items):
+        """Replace the order of parent's children in one go, e.g. after sorting."""
+        self.__nodes[parent].children = list(items)
+        self.__changed(parent)
+
+    def sort(self, column, descending=False, parent=''):
+        """Sort parent's children by a column. Each row's sort key is cached until its values change."""
+        position = column if isinstance(column, int) else self.__columns().index(column)
+        self.reorder(parent, sorted_children(self.__nodes, parent, position, descending))
+
+    def selection(self):
+        return tuple(self.__selection)
+
+    def selection_set(self, *items):
+        self.__selection = [key for key in self.__flatten(items) if key in self.__nodes]
+        self.__schedule()
+
+    def focus(self, item=None):
+        if item is None:
+            return self.__focus
+        self.__focus = item
+
+    def see(self, item):
+        # Open every ancestor, then scroll the row into view
+        parent = self.__nodes[item].parent
+        while parent:
+            if not self.__nodes[parent].open:
+                self.__nodes[parent].open = True
+                self.__rows = None
+            parent = self.__nodes[parent].parent
+
+        rows = self.__visible()
+        position = next(i for i, (key, depth) in enumerate(rows) if key == item)
+        if position < self.__first:
+            self.__first = position
+        elif position >= self.__first + self.__visible_rows():
+            self.__first = position - self.__visible_rows() + 1
+        self.__schedule()
+
+    def yview(self, *args):
+        total = len(self.__visible())
+        visible = self.__visible_rows()
+        if not args:
+            return scroll_fractions(self.__first, total, visible)
+
+        if args[0] == 'moveto':
+            self.__first = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            self.__first += amount * visible if args[2].startswith('page') else amount
+        self.__schedule()
+
+    # Rendering
+    # -----------------------------------------------------------------------------
+
+    def __flatten(self, items):
+        flat = []
+        for item in items:
+            if isinstance(item, (tuple, list)):
+                flat.extend(item)
+            elif item != '':
+                flat.append(item)
+        return flat
+
+    def __forget(self, node):
+        for child in node.children:
+            self.__forget(self.__nodes[child])
+        del self.__nodes[node.key]
+
+    def __changed(self, parent):
+        # Only invalidate the flattened rows when the change can be seen
+        node = self.__nodes.get(parent)
+        while node is not None and node.open:
+            if node.key == '':
+                self.__rows = None
+                break
+            node = self.__nodes.get(node.parent)
+        self.__schedule()
+
+    def __columns(self):
+        columns = self.tree['columns']
+        return list(self.tree.tk.splitlist(columns)) if isinstance(columns, str) else list(columns)
+
+    def __visible(self):
+        if self.__rows is None:
+            self.__rows = visible_rows(self.__nodes)
+        return self.__rows
+
+    def __visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            height = int(self.tree['height'] or 10) * self.rowheight
+        if 'headings' in str(self.tree['show']):
+            height -= self.rowheight + 4
+        return max(1, height // self.rowheight)
+
+    def __schedule(self):
+        if self.__pending is None:
+            self.__pending = self.tree.after_idle(self.__render)
+
+    def __refresh(self):
+        """Draw now rather than when idle, e.g. before generating events that read the selection."""
+        if self.__pending is not None:
+            self.tree.after_cancel(self.__pending)
+        self.__render()
+
+    def __render(self):
+        self.__pending = None
+        rows = self.__visible()
+        visible = self.__visible_rows()
+        self.__first = clamp_first(self.__first, len(rows), visible)
+        window = row_window(rows, self.__first, visible)
+
+        # Grow the pool as the viewport grows, hide any rows that aren't needed
+        while len(self.__pool) < len(window):
+            self.__pool.append(self.tree.insert('', 'end'))
+        for iid in self.__pool[len(window):]:
+            if iid in self.__shown:
+                del self.__shown[iid]
+                self.tree.detach(iid)
+
+        selected = []
+        for position, (key, depth) in enumerate(window):
+            iid = self.__pool[position]
+            node = self.__nodes[key]
+            self.tree.item(iid, text=row_label(node, depth), values=node.values, tags=node.tags)
+            if iid not in self.__shown:
+                self.tree.move(iid, '', position)
+            self.__shown[iid] = key
+            if key in self.__selection:
+                selected.append(iid)
+
+        if tuple(selected) != self.tree.selection():
+            self.tree.selection_set(selected)
+
+        if self.__yscroll is not None:
+            self.__yscroll(*scroll_fractions(self.__first, len(rows), visible))
+
+    # Events
+    # -----------------------------------------------------------------------------
+
+    def __on_select(self, event):
+        shown = set(self.__shown.values())
+        selected = [self.__shown[iid] for iid in self.tree.selection() if iid in self.__shown]
+
+        # Keep rows that are selected but scrolled out of view
+        self.__selection = [key for key in self.__selection if key not in shown] + selected
+        if selected:
+            self.__focus = selected[-1]
+
+    def __on_click(self, event):
+        iid = self.tree.identify_row(event.y)
+        if iid not in self.__shown or self.tree.identify_column(event.x) != '#0':
+            return
+
+        node = self.__nodes[self.__shown[iid]]
+        prefix = row_label(node, self.__depth(node))[:-len(node.text) or None]
+        if node.children and event.x <= font.nametofont('TkDefaultFont').measure(prefix) + 4:
+            self.toggle(node.key)
+            return 'break'
+
+    def __on_double_click(self, event):
+        iid = self.tree.identify_row(event.y)
+        if iid in self.__shown and self.__nodes[self.__shown[iid]].children:
+            self.toggle(self.__shown[iid])
+
+    def __on_wheel(self, units):
+        self.yview('scroll', units, 'units')
+        # Stop the Treeview class binding scrolling the pool of items as well, which would leave rows above the viewport
+        return 'break'
+
+    def __on_arrow(self, step):
+        rows = self.__visible()
+        if not rows:
+            return 'break'
+
+        keys = [key for key, depth in rows]
+        current = keys.index(self.__focus) if self.__focus in keys else self.__first - step
+        position = max(0, min(len(rows) - 1, current + step))
+        self.__focus = keys[position]
+        self.__selection = [self.__focus]
+        self.see(self.__focus)
+        self.__refresh()
+        self.tree.event_generate('<<TreeviewSelect>>')
+        return 'break'
+
+    def __on_expand(self, open):
+        if self.__focus and self.__nodes[self.__focus].children:
+            node = self.__nodes[self.__focus]
+            if open is None or open != node.open:
+                self.toggle(node.key)
+        return 'break'
+
+    def __depth(self, node):
+        depth = 0
+        while node.parent:
+            depth += 1
+            node = self.__nodes[node.parent]
+        return depth
+
+    def toggle(self, item):
+        node = self.__nodes[item]
+        node.open = not node.open
+        self.__focus = item
+        self.__rows = None
+        if node.open:
+            # Listeners may load the children lazily before the tree is drawn again
+            self.tree.event_generate('<<TreeviewOpen>>')
+        else:
+            self.tree.event_generate('<<TreeviewClose>>')
+        self.__schedule()
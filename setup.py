@@ -16,7 +16,8 @@ setup(
     author='Jared Musil',
     author_email='jared.musil.kbw5@statefarm.com',
     url='s.f/bdd-toolbox',
-    executables = [Executable(r'bin/app.py')],
+    executables = [Executable(r'bin/app.py'),
+                   Executable(r'bin/cli.py', target_name='bdd-toolbox')],
     options={'build_exe': {'excludes': excludes,
                            'packages': packages,
                            'include_files': include_files}}
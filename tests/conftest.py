@@ -0,0 +1,25 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The application modules live in bin/ and import each other by module name,
+# as do the benchmark scripts in benchmarks/.
+sys.path.insert(0, os.path.join(ROOT, 'bin'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest
+
+
+@pytest.fixture
+def tk_root():
+    """A hidden Tk root for widget tests, which are skipped where there is no display."""
+    import tkinter as tk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip('No display available')
+    root.withdraw()
+    yield root
+    root.destroy()
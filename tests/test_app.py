@@ -1,11 +1,18 @@
-from nose.tools import *
-import BDD_Toolbox
+import os
+import subprocess
+import sys
 
-# import the package
 import app
 
-# import the antigravity module
-from app import BDDToolbox
 
-# or an object inside the antigravity module
-from app.BDDToolbox import SplashScreen
\ No newline at end of file
+def test_import():
+    assert app.BDDToolbox
+    assert app.SplashScreen
+
+
+def test_lazy_modules_are_not_imported_at_startup():
+    # A fresh interpreter, since other tests import these modules into this one
+    loaded = subprocess.check_output([sys.executable, '-c', 'import sys, app; print(" ".join(sorted(sys.modules)))'],
+                                     cwd=os.path.dirname(app.__file__), universal_newlines=True).split()
+    for module in ('csv', 'sqlite3', 'multiprocessing', 'concurrent.futures', 'story_cache', 'serenity_results', 'story_export'):
+        assert module not in loaded
@@ -0,0 +1,50 @@
+import os
+
+import corpus
+import benchmark
+from story_index import StoryIndex
+
+
+def read_tree(directory):
+    files = {}
+    for path, dirs, names in os.walk(directory):
+        for name in names:
+            with open(os.path.join(path, name), encoding='utf8') as file:
+                files[os.path.relpath(os.path.join(path, name), directory)] = file.read()
+    return files
+
+
+def test_corpus_is_deterministic(tmp_path):
+    corpus.generate(str(tmp_path / 'a'), 30, scenarios=3, examples=2, depth=3, seed=7)
+    corpus.generate(str(tmp_path / 'b'), 30, scenarios=3, examples=2, depth=3, seed=7)
+    assert read_tree(str(tmp_path / 'a')) == read_tree(str(tmp_path / 'b'))
+    assert os.path.isfile(str(tmp_path / 'a' / 'stories' / 'area-00' / 'feature-00' / 'group-02' / 'story-00029.story'))
+
+
+def test_corpus_parses(tmp_path):
+    manifest = corpus.generate(str(tmp_path), 40, scenarios=4, metatags=3)
+    index = StoryIndex(str(tmp_path / 'stories')).build()
+    assert len(index.story_files()) == 40
+    assert len(index.scenarios()) == 160
+    counts = index.metatag_counts()
+    assert counts['@usecase:'] == counts['@business_rule:'] == 160
+    assert sum(counts.values()) == 40 + 160 * 3  # story level @author plus the scenario tags
+    assert all(0 <= int(value) < manifest['requirements'] for value in index.metatag_counts('@usecase:'))
+
+
+def test_measure(tmp_path):
+    corpus.generate(str(tmp_path), 10)
+    for name in benchmark.BENCHMARKS:
+        result = benchmark.measure(name, str(tmp_path), 2)
+        assert result['repeat'] == 2 and result['seconds'] >= 0
+        assert result['peak_rss_kb'] >= result['setup_rss_kb'] > 0
+
+
+def test_regressions():
+    baseline = {'results': [{'benchmark': 'build_index', 'files': 1000, 'seconds': 1.0},
+                            {'benchmark': 'read_all_scenerios', 'files': 1000, 'seconds': 0.0001}]}
+    results = [{'benchmark': 'build_index', 'files': 1000, 'seconds': 1.5},
+               {'benchmark': 'build_index', 'files': 10000, 'seconds': 9.0},
+               {'benchmark': 'read_all_scenerios', 'files': 1000, 'seconds': 0.0005}]  # slower, but only by noise
+    assert benchmark.regressions(results, baseline, 0.2) == [(results[0], 1.0)]
+    assert benchmark.regressions(results, baseline, 0.6) == []
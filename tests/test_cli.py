@@ -0,0 +1,83 @@
+import os
+import sys
+import csv
+import json
+import subprocess
+
+import cli
+
+STORY = '''Scenario: Buy an item
+Meta:
+@usecase 200
+Given I am logged in
+
+Scenario: Return an item
+Meta:
+@usecase 202
+@business_rule 7
+Given I bought an item
+'''
+
+
+def setup_project(tmp_path):
+    (tmp_path / 'stories').mkdir()
+    (tmp_path / 'stories' / 'shopping.story').write_text(STORY)
+    (tmp_path / 'usecases.csv').write_text('ID,Name\n200,Buy\n201,Browse\n202,Return\n203,Pay\n')
+    settings = {'Stories': str(tmp_path / 'stories'), 'Requirements': {'Usecases': str(tmp_path / 'usecases.csv')}}
+    (tmp_path / 'settings.json').write_text(json.dumps(settings))
+    return ['--settings', str(tmp_path / 'settings.json'), '--no-cache']
+
+
+def test_summary(tmp_path, capsys):
+    assert cli.main(['summary', '--format', 'json'] + setup_project(tmp_path)) == 0
+    rows = {row['Name']: row['Count'] for row in json.loads(capsys.readouterr().out)}
+    assert rows == {'Stories': 1, 'Scenarios': 2, 'Metatag keys': 2, 'Metatag values': 3, 'Requirements: Usecases': 4}
+
+
+def test_metatag_values_as_csv(tmp_path):
+    output = str(tmp_path / 'usecases.csv.out')
+    assert cli.main(['metatags', '--key', '@usecase', '--format', 'csv', '--output', output] + setup_project(tmp_path)) == 0
+    with open(output, newline='') as file:
+        assert list(csv.reader(file)) == [['Key', 'Count', 'Percent', 'Coverage'], ['200', '1', '50.0%', '~'], ['202', '1', '50.0%', '~']]
+
+
+def test_coverage(tmp_path, capsys):
+    assert cli.main(['coverage', '--format', 'json'] + setup_project(tmp_path)) == 0
+    rows = {row['Requirements']: row for row in json.loads(capsys.readouterr().out)}
+    assert rows['Usecases']['Requirement Count'] == 4
+    assert rows['Usecases']['Coverage'] == '50.0%'
+
+
+def test_coverage_counts_requirements_not_tags(tmp_path, capsys):
+    # Three scenarios tagged with the same two usecases still cover only two of the four
+    arguments = setup_project(tmp_path)
+    (tmp_path / 'stories' / 'again.story').write_text('Scenario: Buy again\nMeta:\n@usecase 200\nGiven I am logged in\n')
+    assert cli.main(['coverage', '--format', 'json'] + arguments) == 0
+    rows = {row['Requirements']: row for row in json.loads(capsys.readouterr().out)}
+    assert rows['Usecases']['Covered'] == 2 and rows['Usecases']['Coverage'] == '50.0%'
+
+    assert cli.main(['metatags', '--format', 'json'] + arguments) == 0
+    rows = {row['Key']: row for row in json.loads(capsys.readouterr().out)}
+    assert rows['@usecase']['Coverage'] == '50.0%'
+    assert rows['@business_rule']['Coverage'] == '~'
+
+
+def test_missing_story_folder(tmp_path, capsys):
+    assert cli.main(['--stories', str(tmp_path / 'missing'), '--settings', str(tmp_path / 'none.json')]) == 1
+
+
+def test_tkinter_is_never_imported():
+    bin = os.path.dirname(cli.__file__)
+    code = 'import sys, cli; sys.exit("tkinter" in sys.modules)'
+    assert subprocess.run([sys.executable, '-c', code], cwd=bin).returncode == 0
+
+
+def test_export(tmp_path):
+    output = tmp_path / 'scenarios.md'
+    assert cli.main(['export', '--export', 'scenarios', str(output)] + setup_project(tmp_path)) == 0
+    assert output.read_text() == '- Scenario: Buy an item\n- Scenario: Return an item\n'
+
+
+def test_export_unknown_view(tmp_path, capsys):
+    assert cli.main(['export', '--export', 'steps', str(tmp_path / 'steps.txt')] + setup_project(tmp_path)) == 1
+    assert 'Unknown view' in capsys.readouterr().err
@@ -0,0 +1,76 @@
+from story_index import StoryIndex
+from requirements_store import Requirements
+from coverage_matrix import CoverageMatrix, bitset, requirement_keys
+
+CHECKOUT = '''Meta:
+@requirement R-1
+
+Scenario: Pay by card
+Meta:
+@usecase: 200
+@business_rule: 7
+Given a basket
+
+Scenario: Pay by voucher
+Meta:
+@usecase: 201
+Given a basket
+'''
+
+RETURNS = '''Scenario: Return an item
+Meta:
+@usecase 202
+@usecase 200
+Given a receipt
+'''
+
+
+def build(tmp_path):
+    (tmp_path / 'checkout.story').write_text(CHECKOUT)
+    (tmp_path / 'returns.story').write_text(RETURNS)
+    index = StoryIndex(str(tmp_path)).build()
+    requirements = {
+        'Usecases': Requirements('usecases.csv', ['Name', 'ID'], [['Buy', '200'], ['Pay', '201'], ['Return', '202'], ['Browse', '203']]),
+        'Business Data': Requirements('rules.csv', ['ID'], [['7'], ['8']]),
+        'Requirements': Requirements('requirements.csv', ['ID'], [['R-1'], ['R-2'], ['200']]),
+    }
+    return CoverageMatrix(index, requirements)
+
+
+def test_bitset():
+    assert bitset([0, 3, 9], 16) == 0b1000001001
+    assert bitset([], 16) == 0
+
+
+def test_requirement_keys():
+    assert requirement_keys('Usecases') == ('@usecase',)
+    assert requirement_keys('Anything else') == ('@usecase', '@requirement', '@business_rule')
+
+
+def test_coverage(tmp_path):
+    matrix = build(tmp_path)
+    assert matrix.size == 3
+    assert matrix.covered('Usecases') == 3
+    assert matrix.coverage('Usecases') == 0.75
+    assert matrix.uncovered('Usecases') == ['203']
+    assert matrix.uncovered('Business Data') == ['8']
+    # Story level meta covers every scenario in the story, and other files are joined on every key
+    assert matrix.rows('Requirements') == [('R-1', 2, 1), ('R-2', 0, 0), ('200', 2, 2)]
+    assert matrix.coverage('Missing') is None
+
+
+def test_key_coverage(tmp_path):
+    matrix = build(tmp_path)
+    assert matrix.key_coverage('@usecase:') == 0.75
+    assert matrix.key_coverage('@business_rule') == 0.5
+    # Only the file joined on every key counts @requirement
+    assert matrix.key_coverage('@requirement') == 2 / 3
+    assert matrix.key_coverage('@smoke') is None
+
+
+def test_scenarios_and_stories(tmp_path):
+    matrix = build(tmp_path)
+    assert matrix.rows('Usecases') == [('200', 2, 2), ('201', 1, 1), ('202', 1, 1), ('203', 0, 0)]
+    assert matrix.scenarios_for('Usecases', 0) == [('checkout.story', 'Scenario: Pay by card'), ('returns.story', 'Scenario: Return an item')]
+    # (story, tagged scenarios, requirements covered, requirements only it covers)
+    assert matrix.story_contributions('Usecases') == [('checkout.story', 2, 2, 1), ('returns.story', 1, 2, 1)]
@@ -0,0 +1,58 @@
+from log_view import LogView, tail, trim_count
+
+
+def test_trim_count_trims_past_the_cap():
+    assert trim_count(100, 100) == 0
+    # Trimmed 10% past the cap, so the next writes don't trim again
+    assert trim_count(101, 100) == 11
+    assert trim_count(5, 2) == 3
+    assert trim_count(3, 0) == 3
+
+
+def test_tail_keeps_the_last_lines_and_the_partial_one():
+    data = ''.join('line {}\n'.format(i) for i in range(1000)) + 'partial'
+
+    text, count = tail(data, 10)
+    assert text.splitlines() == ['line {}'.format(i) for i in range(990, 1000)] + ['partial']
+    assert count == 10
+    assert tail('a\nb\n', 10) == ('a\nb\n', 2)
+
+
+def lines(log):
+    return log.get('1.0', 'end-1c').splitlines()
+
+
+def test_head_is_trimmed_in_bulk(tk_root):
+    log = LogView(tk_root, max_lines=100)
+    for i in range(100):
+        log.write('line {}\n'.format(i))
+    assert len(lines(log)) == 100
+
+    log.write('line 100\n')
+    # Trimmed down past the cap, so the next writes don't trim again
+    assert len(lines(log)) == 90
+    assert lines(log)[0] == 'line 11'
+    assert lines(log)[-1] == 'line 100'
+    assert log.lines == 90
+
+
+def test_large_write_keeps_only_the_tail(tk_root):
+    log = LogView(tk_root, max_lines=10)
+    log.write('old\n')
+    log.write(''.join('line {}\n'.format(i) for i in range(1000)) + 'partial')
+
+    assert lines(log) == ['line {}'.format(i) for i in range(990, 1000)] + ['partial']
+    assert log.lines == 10
+
+
+def test_full_stream_goes_to_file(tk_root, tmp_path):
+    log = LogView(tk_root, max_lines=10)
+    filepath = log.open_file(str(tmp_path / 'results' / 'maven.log'))
+    output = ''.join('line {}\n'.format(i) for i in range(1000))
+    for start in range(0, len(output), 777):
+        log.write(output[start:start + 777])
+    log.close_file()
+
+    with open(filepath, encoding='utf-8') as file:
+        assert file.read() == output
+    assert len(lines(log)) <= 10
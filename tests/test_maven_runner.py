@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+
+from maven_runner import MavenRun, ShardedMavenRun, shard_stories, shard_command, find_argument, maven_goals, with_goals
+
+SCRIPT = "import sys; [print('out', i) or print('err', i, file=sys.stderr) for i in range(500)]; sys.exit(3)"
+
+
+def test_captures_stdout_and_stderr():
+    run = MavenRun('"{}" -c "{}"'.format(sys.executable, SCRIPT)).start()
+
+    output = ''
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        finished = run.finished()
+        output += run.drain()
+        if finished:
+            break
+        time.sleep(0.05)
+
+    assert run.returncode == 3
+    assert output.count('out ') == 500
+    assert output.count('err ') == 500
+
+
+def test_shards_are_balanced_by_weight():
+    weights = {'a.story': 10, 'b.story': 6, 'c.story': 5, 'd.story': 1}
+    shards = shard_stories(sorted(weights), 2, weights)
+
+    assert sorted(sum(weights[story] for story in shard) for shard in shards) == [11, 11]
+    assert sorted(story for shard in shards for story in shard) == sorted(weights)
+    assert shard_stories(['a.story'], 4) == [['a.story']]
+
+
+def test_shard_command_replaces_story_server_and_output_arguments():
+    command = 'mvn verify serenity:aggregate -DrelativeStoryNamesToRun=x.story -Dwebdriver.remote.url=http://127.0.0.1:5555/wd/hub -Dfoo=1'
+    shard = shard_command(command, ['a.story', 'b.story'], 'http://127.0.0.1:5556/wd/hub', 'out')
+
+    assert 'serenity:aggregate' not in shard
+    assert find_argument(shard, 'relativeStoryNamesToRun') == 'a.story,b.story'
+    assert find_argument(shard, 'webdriver.remote.url') == 'http://127.0.0.1:5556/wd/hub'
+    assert find_argument(shard, 'serenity.outputDirectory') == 'out'
+    assert find_argument(shard, 'foo') == '1'
+
+
+
+def test_sharded_commands_keep_settings_and_profiles():
+    command = (r'call mvn clean verify serenity:aggregate -P ci,smoke --settings C:\Users\me\.m2\settings.xml'
+               r' -Dmetafilter="+smoke" -Dmaven.tests.failure.ignore=true -DrelativeStoryNamesToRun=a.story,b.story')
+    remote_urls = ['http://127.0.0.1:5555/wd/hub', 'http://127.0.0.1:5556/wd/hub']
+    run = ShardedMavenRun(command, ['a.story', 'b.story'], 2, remote_urls)
+
+    kept = ['-P', 'ci,smoke', '--settings', r'C:\Users\me\.m2\settings.xml', '-Dmetafilter="+smoke"', '-Dmaven.tests.failure.ignore=true']
+    commands = [run.compile_command, run.aggregate_command] + [shard for label, shard, output in run.shards]
+    for generated in commands:
+        words = generated.split()
+        assert words[:2] == ['call', 'mvn']
+        assert all(word in words for word in kept), generated
+
+    assert maven_goals(run.compile_command) == ['clean', 'test-compile']
+    assert maven_goals(run.aggregate_command) == ['serenity:aggregate']
+    assert find_argument(run.compile_command, 'relativeStoryNamesToRun') is None
+    for label, shard, output in run.shards:
+        # Shards neither clean nor compile the target directory they share
+        assert maven_goals(shard) == ['failsafe:integration-test']
+        assert '-o' not in shard.split()
+
+    # Shards only run offline when the command does
+    offline = ShardedMavenRun(command + ' -o', ['a.story'], 1, remote_urls)
+    assert '-o' in offline.shards[0][1].split()
+
+
+def test_with_goals():
+    assert with_goals('mvn.cmd test -s settings.xml -Dx=1', ['verify']) == 'mvn.cmd verify -s settings.xml -Dx=1'
+    assert maven_goals('mvnw -T 4 test surefire:test') == ['test', 'surefire:test']
+    assert with_goals('python -c "print(1)"', ['verify']) == 'python -c "print(1)"'
+
+
+SHARD_SCRIPT = (
+    "import os, sys; "
+    "args = dict(a[2:].split('=', 1) for a in sys.argv[1:] if a.startswith('-D')); "
+    "os.makedirs(args['serenity.outputDirectory']); "
+    "[open(os.path.join(args['serenity.outputDirectory'], s + '.json'), 'w').close() for s in args['relativeStoryNamesToRun'].split(',')]; "
+    "print('ran', args['relativeStoryNamesToRun'], args['webdriver.remote.url'])"
+)
+
+
+def test_sharded_run_merges_outputs(tmp_path):
+    command = '"{}" -c "{}"'.format(sys.executable, SHARD_SCRIPT)
+    stories = ['{}.story'.format(i) for i in range(5)]
+    remote_urls = ['http://127.0.0.1:{}/wd/hub'.format(port) for port in (6000, 6001, 6002, 6003)]
+    run = ShardedMavenRun(command, stories, 3, remote_urls, cwd=str(tmp_path),
+                          compile_command=None, aggregate_command='"{}" -c "print(1)"'.format(sys.executable)).start()
+
+    assert run.wait() == 0
+    assert run.remote_urls == remote_urls[:3]
+    output = run.drain()
+    assert output.count('ran ') == 3
+    for port in (6000, 6001, 6002):
+        assert ':{}/wd/hub'.format(port) in output
+    assert '[aggregate] 1' in output
+    assert sorted(os.listdir(str(tmp_path / 'target' / 'site' / 'serenity'))) == sorted(s + '.json' for s in stories)
+
+
+RERUN_SCRIPT = (
+    "import os, sys; "
+    "args = dict(a[2:].split('=', 1) for a in sys.argv[1:] if a.startswith('-D')); "
+    "os.makedirs(args['serenity.outputDirectory'], exist_ok=True); "
+    "[open(os.path.join(args['serenity.outputDirectory'], s + '.json'), 'w').write(args['run']) for s in args['relativeStoryNamesToRun'].split(',')]"
+)
+
+
+def test_stale_shard_outputs_are_not_merged(tmp_path):
+    remote_urls = ['http://127.0.0.1:6000/wd/hub', 'http://127.0.0.1:6001/wd/hub']
+    report = tmp_path / 'target' / 'site' / 'serenity'
+    # The heavier story goes to shard 1, so the second run swaps the stories between the shards
+    for run, weights in (('1', {'a.story': 1, 'b.story': 2}), ('2', {'a.story': 2, 'b.story': 1})):
+        command = '"{}" -c "{}" -Drun={}'.format(sys.executable, RERUN_SCRIPT, run)
+        sharded = ShardedMavenRun(command, sorted(weights), 2, remote_urls, cwd=str(tmp_path), weights=weights,
+                                  compile_command=None, aggregate_command=None)
+        assert sharded.start().wait() == 0
+
+    assert sorted(os.listdir(str(report))) == ['a.story.json', 'b.story.json']
+    assert (report / 'a.story.json').read_text() == '2'
+    assert (report / 'b.story.json').read_text() == '2'
+
+
+def test_sharded_run_that_cannot_start_fails(tmp_path):
+    command = '"{}" -c "print(1)"'.format(sys.executable)
+    run = ShardedMavenRun(command, ['a.story', 'b.story'], 2, ['http://127.0.0.1:6000/wd/hub', 'http://127.0.0.1:6001/wd/hub'],
+                          cwd=str(tmp_path / 'missing'), compile_command=None, aggregate_command=None).start()
+
+    assert run.wait() == -1
+    output = run.drain()
+    assert '[shard 1] Unable to start' in output
+    assert '[shard 2] Unable to start' in output
+    assert not (tmp_path / 'missing').exists()
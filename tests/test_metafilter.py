@@ -0,0 +1,86 @@
+import pytest
+
+from story_index import StoryIndex
+from metafilter import MetaIndex, MetaFilterError, parse_metafilter, meta_properties, with_metafilter
+
+CHECKOUT = '''Meta:
+@smoke
+@author Mauro
+
+Scenario: Pay by card
+Meta:
+@usecase: 200
+Given a basket
+
+Scenario: Pay by voucher
+Meta:
+@usecase: 201 @wip
+Given a basket
+
+Scenario: Pay later
+Meta:
+@author Jared
+Given a basket
+'''
+
+RETURNS = '''Scenario: Return an item
+Meta:
+@usecase 2001
+@priority high
+Given a receipt
+'''
+
+
+@pytest.fixture
+def meta(tmp_path):
+    (tmp_path / 'checkout.story').write_text(CHECKOUT)
+    (tmp_path / 'returns.story').write_text(RETURNS)
+    return MetaIndex(StoryIndex(str(tmp_path)).build())
+
+
+def scenarios(meta, text):
+    return [scenario for story, scenario in meta.select(parse_metafilter(text).evaluate(meta))]
+
+
+def test_meta_properties():
+    assert meta_properties('@usecase: 201 @wip\n') == [('usecase', '201'), ('wip', '')]
+    assert meta_properties('@author Mauro Talevi') == [('author', 'Mauro Talevi')]
+
+
+def test_property_filters(meta):
+    assert meta.size == 4
+    assert scenarios(meta, '') == ['Scenario: Pay by card', 'Scenario: Pay by voucher', 'Scenario: Pay later', 'Scenario: Return an item']
+    # Story meta is inherited by every scenario in the story
+    assert scenarios(meta, '+smoke -wip') == ['Scenario: Pay by card', 'Scenario: Pay later']
+    assert scenarios(meta, '+usecase 200') == ['Scenario: Pay by card']
+    assert scenarios(meta, '+usecase: 20*') == ['Scenario: Pay by card', 'Scenario: Pay by voucher', 'Scenario: Return an item']
+    # Any include matches, and the scenario's own meta overrides the story's
+    assert scenarios(meta, '+author Jared +priority high') == ['Scenario: Pay later', 'Scenario: Return an item']
+    assert scenarios(meta, '-author Mauro') == ['Scenario: Pay later', 'Scenario: Return an item']
+    assert scenarios(meta, '+nothing') == []
+
+
+def test_groovy_filters(meta):
+    assert scenarios(meta, 'groovy: smoke && !wip') == ['Scenario: Pay by card', 'Scenario: Pay later']
+    assert scenarios(meta, "groovy: usecase == '200' || priority == \"high\"") == ['Scenario: Pay by card', 'Scenario: Return an item']
+    assert scenarios(meta, 'groovy: !(usecase != 201)') == ['Scenario: Pay by voucher']
+    assert scenarios(meta, 'groovy: usecase ==~ /20\\d/') == ['Scenario: Pay by card', 'Scenario: Pay by voucher']
+    assert scenarios(meta, 'groovy: usecase =~ /1$/') == ['Scenario: Pay by voucher', 'Scenario: Return an item']
+    assert scenarios(meta, 'groovy: false') == []
+
+
+@pytest.mark.parametrize('text', ['smoke', '+', 'groovy: smoke &&', 'groovy: (smoke', 'groovy: usecase ==', 'groovy: smoke wip', 'groovy: a =~ /(/', 'groovy: a # b'])
+def test_bad_filters(text):
+    with pytest.raises(MetaFilterError):
+        parse_metafilter(text)
+
+
+def test_stories(meta):
+    assert meta.stories(parse_metafilter("+usecase").evaluate(meta)) == {'checkout.story', 'returns.story'}
+    assert meta.select(meta.all, limit=1) == [('checkout.story', 'Scenario: Pay by card')]
+
+
+def test_with_metafilter():
+    command = 'mvn verify -Dmetafilter="+smoke -wip" -Dx=1'
+    assert with_metafilter(command, '+usecase 200') == 'mvn verify -Dx=1 -Dmetafilter="+usecase 200"'
+    assert with_metafilter('mvn verify -Dmetafilter=+smoke', '') == 'mvn verify'
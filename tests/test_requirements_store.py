@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from requirements_store import RequirementsStore, RequirementsError, read_requirements
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin', 'data')
+
+
+def test_tab_separated_with_bom():
+    usecases = RequirementsStore().get(os.path.join(DATA, 'usecases.csv'))
+    assert usecases.headers == ('Usecase', 'ID')
+    assert len(usecases) == 4
+    assert usecases.find(202) == ('User returns an item', '202')
+
+
+def test_comma_separated():
+    rules = RequirementsStore().get(os.path.join(DATA, 'business-rules.csv'))
+    assert rules.headers == ('Business Rule', 'ID')
+    assert rules.column(0)[0] == 'Free shipping for orders over 50 USD'
+    assert rules.find('301') is not None
+
+
+def test_reloaded_only_when_changed(tmp_path):
+    filepath = str(tmp_path / 'requirements.csv')
+    with open(filepath, 'w') as file:
+        file.write('Requirement,ID\nOne,1\n')
+
+    store = RequirementsStore()
+    first = store.get(filepath)
+    assert store.get(filepath) is first
+
+    with open(filepath, 'a') as file:
+        file.write('Two,2\n')
+    assert len(store.get(filepath)) == 2
+
+
+def test_unparseable_file_raises_requirements_error(tmp_path):
+    path = tmp_path / 'broken.csv'
+    path.write_text('Usecase,ID\n"' + 'x' * 200000 + '",1\n', encoding='utf8')  # longer than csv.field_size_limit()
+    with pytest.raises(RequirementsError):
+        read_requirements(str(path))
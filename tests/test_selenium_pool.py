@@ -0,0 +1,102 @@
+import sys
+import json
+import time
+import socket
+import threading
+import http.server
+
+import pytest
+
+from selenium_pool import SeleniumPool, is_ready, READY, STOPPED
+
+# Stands in for a Selenium server: answers /wd/hub/status on the port given as its only argument
+STUB_SERVER = '''
+import sys, http.server
+
+class Status(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == '/wd/hub/status' else 404)
+        self.end_headers()
+        self.wfile.write(b'{"value": {"ready": true}}')
+
+    def log_message(self, *args):
+        pass
+
+http.server.HTTPServer(('127.0.0.1', int(sys.argv[1])), Status).serve_forever()
+'''
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(('127.0.0.1', 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+@pytest.fixture
+def pool(tmp_path):
+    stub = tmp_path / 'stub_server.py'
+    stub.write_text(STUB_SERVER)
+    pool = SeleniumPool('"{}" "{}" {{port}}'.format(sys.executable, stub), free_ports(2), interval=0.1).start()
+    yield pool
+    pool.shutdown()
+
+
+def test_endpoints_are_handed_out_once_ready(pool):
+    assert pool.wait_ready(10)
+    first = pool.acquire(1)
+    second = pool.acquire(1)
+
+    assert {first, second} == {node.url for node in pool.nodes}
+    assert pool.acquire(0.2) is None
+
+    pool.release(first)
+    assert pool.acquire(1) == first
+
+
+def test_dead_servers_are_restarted(pool):
+    assert pool.wait_ready(10)
+    node = pool.nodes[0]
+    node.process.kill()
+    node.process.wait()
+
+    for _ in range(100):
+        if node.restarts and node.state == READY:
+            break
+        time.sleep(0.1)
+    assert node.restarts == 1
+    assert node.state == READY
+    assert is_ready(node.url)
+
+
+def test_shutdown_stops_every_server(pool):
+    assert pool.wait_ready(10)
+    processes = [node.process for node in pool.nodes]
+    pool.shutdown()
+
+    assert all(process.poll() is not None for process in processes)
+    assert all(node.state == STOPPED for node in pool.nodes)
+    assert pool.acquire(0) is None
+
+
+def test_selenium_2_status():
+    class Status(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps({'status': 0}).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Status)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert is_ready('http://127.0.0.1:{}/wd/hub'.format(server.server_port))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert not is_ready('http://127.0.0.1:{}/wd/hub'.format(server.server_port), timeout=0.5)
@@ -0,0 +1,64 @@
+import json
+
+from story_index import StoryIndex
+from serenity_results import ResultIndex, PASSED, FAILED, PENDING, normalise, describe
+
+STORY = '''Scenario: Buy an item
+Given I am logged in
+
+Scenario: Return an_item
+Given I bought an item
+'''
+
+
+def outcome(title, result, duration=1500, story='shopping.story', start='2024-01-01T10:00:00'):
+    return {'name': title.lower().replace(' ', '_'), 'title': title, 'result': result, 'duration': duration,
+            'startTime': start, 'userStory': {'storyName': 'Shopping', 'path': 'stories/' + story},
+            'testSteps': [{'description': 'Given I am logged in', 'result': result}]}
+
+
+def setup_results(tmp_path, outcomes):
+    (tmp_path / 'stories').mkdir()
+    (tmp_path / 'stories' / 'shopping.story').write_text(STORY)
+    (tmp_path / 'serenity').mkdir()
+    for number, data in enumerate(outcomes):
+        (tmp_path / 'serenity' / '{}.json'.format(number)).write_text(json.dumps(data))
+    return str(tmp_path / 'serenity'), StoryIndex(str(tmp_path / 'stories')).build()
+
+
+def test_normalise():
+    assert normalise('Scenario: Return an_item\n') == normalise('return an item') == 'return an item'
+    assert normalise('shopping_cart.story') == normalise('Shopping cart')
+
+
+def test_outcomes_are_matched_to_scenarios(tmp_path):
+    directory, index = setup_results(tmp_path, [outcome('Buy an item', 'SUCCESS'), outcome('Return an item', 'FAILURE', 500),
+                                                outcome('Unknown', 'SUCCESS')])
+    results = ResultIndex()
+    assert results.ingest(directory, index) == 3
+
+    assert results.scenario('shopping.story', 'Scenario: Buy an item\n').result == PASSED
+    assert results.scenario('shopping.story', 'Scenario: Return an_item\n').duration == 0.5
+    assert results.story('shopping.story') == ({PASSED: 1, FAILED: 1}, 2.0)
+    assert describe(results.story('shopping.story')[0]) == '1 passed, 1 failed'
+    assert len(results.unmatched) == 1
+
+
+def test_story_name_when_there_is_no_path(tmp_path):
+    data = outcome('Buy an item', 'PENDING')
+    data['userStory'] = {'storyName': 'Shopping'}
+    directory, index = setup_results(tmp_path, [data])
+    results = ResultIndex()
+    results.ingest(directory, index)
+    assert results.totals() == {PENDING: 1}
+
+
+def test_reruns_replace_earlier_results_and_unchanged_files_are_not_read_again(tmp_path):
+    directory, index = setup_results(tmp_path, [outcome('Buy an item', 'FAILURE', start='2024-01-01T10:00:00'),
+                                                outcome('Buy an item', 'SUCCESS', start='2024-01-01T11:00:00'),
+                                                {'not': 'an outcome'}])
+    (tmp_path / 'serenity' / 'broken.json').write_text('{')
+    results = ResultIndex()
+    assert results.ingest(directory, index) == 4
+    assert results.totals() == {PASSED: 1}
+    assert results.ingest(directory, index) == 0
@@ -0,0 +1,53 @@
+import csv
+import json
+
+from story_index import StoryIndex
+from story_export import Export, export, records
+
+STORY = '''Narrative:
+In order to shop
+
+Scenario: Buy an item
+Given I am logged in
+When I buy an item
+
+Scenario: Return an item
+Given I bought an item
+'''
+
+
+def build_index(tmp_path):
+    (tmp_path / 'stories').mkdir()
+    (tmp_path / 'stories' / 'shopping.story').write_text(STORY)
+    (tmp_path / 'stories' / 'browse.story').write_text('Scenario: Browse')  # no line ending on the last line
+    return StoryIndex(str(tmp_path / 'stories')).build()
+
+
+def test_records_stream_stories_scenarios_and_steps(tmp_path):
+    kinds = [(record['type'], record['story']) for record in records(build_index(tmp_path))]
+    assert kinds == [('story', 'browse.story'), ('scenario', 'browse.story'),
+                     ('story', 'shopping.story'), ('scenario', 'shopping.story'), ('step', 'shopping.story'),
+                     ('step', 'shopping.story'), ('scenario', 'shopping.story'), ('step', 'shopping.story')]
+
+
+def test_several_formats_in_one_pass(tmp_path):
+    index = build_index(tmp_path)
+    stories = Export(str(tmp_path / 'stories.txt'), 'stories')
+    steps = Export(str(tmp_path / 'steps.txt'), 'stories-scenarios-steps')
+    scenarios = Export(str(tmp_path / 'scenarios.csv'), 'scenarios')
+    lines = Export(str(tmp_path / 'all.jsonl'), 'stories-and-scenarios')
+    markdown = Export(str(tmp_path / 'steps.md'), 'stories-scenarios-steps')
+    export(index, [stories, steps, scenarios, lines, markdown])
+
+    # Names are no longer cut short by a character
+    assert (tmp_path / 'stories.txt').read_text() == 'browse.story\nshopping.story\n'
+    assert (tmp_path / 'steps.txt').read_text().splitlines()[2:6] == [
+        'shopping.story', '-- Scenario: Buy an item', '---- Given I am logged in', '---- When I buy an item']
+    with open(str(tmp_path / 'scenarios.csv'), newline='') as file:
+        assert list(csv.reader(file)) == [['Story', 'Scenario'], ['browse.story', 'Scenario: Browse'],
+                                          ['shopping.story', 'Scenario: Buy an item'], ['shopping.story', 'Scenario: Return an item']]
+    with open(str(tmp_path / 'all.jsonl')) as file:
+        assert [json.loads(line)['type'] for line in file] == ['story', 'scenario', 'story', 'scenario', 'scenario']
+    assert '### Scenario: Buy an item\n\n- Given I am logged in\n' in (tmp_path / 'steps.md').read_text()
+    assert (stories.count, steps.count, scenarios.count, lines.count) == (2, 8, 3, 5)
+
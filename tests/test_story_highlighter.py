@@ -0,0 +1,71 @@
+import tkinter as tk
+
+import pytest
+
+from story_highlighter import StoryHighlighter, token_ranges, tokens, touch
+
+
+def test_every_token_on_a_line_is_found():
+    assert tokens('Given a user And a password When they log in Then they see @home') == [
+        ('KEYWORD', 0, 5), ('KEYWORD', 13, 16), ('KEYWORD', 28, 32), ('KEYWORD', 45, 49), ('META', 59, 64),
+    ]
+    assert tokens('Scenario: log in') == [('SCENARIO', 0, 9)]
+    assert tokens('Meta:') == [('META_KEYWORD', 0, 5)]
+    assert tokens('@usecase 15.0') == [('META', 0, 8)]
+    assert tokens('Examples:') == [('EXAMPLES_TABLE', 0, 9)]
+    assert tokens('Narrative: In order to test As a tester I want to') == [
+        ('NARRATIVE', 0, 10), ('NARRATIVE', 11, 22), ('NARRATIVE', 28, 32), ('NARRATIVE', 40, 49),
+    ]
+
+
+def test_keywords_inside_words_are_not_tokens():
+    assert tokens('Givenness Andrew Whenever email@example.com') == []
+
+
+def test_token_ranges_are_text_indices():
+    ranges = token_ranges('Scenario: one\nGiven a\nWhen b Then c', 7)
+
+    assert ranges['SCENARIO'] == ['7.0', '7.9']
+    assert ranges['KEYWORD'] == ['8.0', '8.5', '9.0', '9.4', '9.7', '9.11']
+    assert ranges['META'] == []
+
+
+def test_touch_tracks_the_edited_lines():
+    # Inserting two lines at line 5 dirties 5-7
+    assert touch(None, 5, 2) == (5, 7)
+    # Lines below an earlier edit move with the insert or delete above them
+    assert touch((10, 12), 5, 2) == (5, 14)
+    assert touch((10, 12), 5, -3) == (5, 9)
+    # A delete that swallows the dirty range collapses it onto the edited line
+    assert touch((10, 12), 5, -10) == (5, 5)
+
+
+@pytest.fixture
+def text(tk_root):
+    return tk.Text(tk_root)
+
+
+def tagged(text, tag):
+    return [str(index) for index in text.tag_ranges(tag)]
+
+
+def test_only_edited_lines_are_rehighlighted(text):
+    text.insert('1.0', 'Scenario: one\nGiven a\nWhen b\n' * 1000)
+    highlighter = StoryHighlighter(text, delay=0)
+    highlighter.highlight_all()
+    assert len(tagged(text, 'SCENARIO')) == 2000
+
+    text.insert('2.0', 'Then ')
+    text.delete('3.0', '3.4')
+    text.update()
+    assert tagged(text, 'KEYWORD')[:4] == ['2.0', '2.4', '2.5', '2.10']
+    assert text.get('3.0', '3.end') == ' b'
+    assert '3.0' not in tagged(text, 'KEYWORD')
+
+
+def test_inserted_lines_are_highlighted(text):
+    highlighter = StoryHighlighter(text, delay=0)
+    text.insert('1.0', 'Meta:\n@usecase 1\n')
+    text.update()
+    assert tagged(text, 'META_KEYWORD') == ['1.0', '1.5']
+    assert tagged(text, 'META') == ['2.0', '2.8']
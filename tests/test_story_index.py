@@ -0,0 +1,250 @@
+from story_index import StoryIndex, read_story_text, write_story_text
+
+STORY = '''Narrative:
+In order to shop
+As a customer
+I want to buy things
+
+Scenario: Buy an item
+Meta:
+@usecase: 200
+@smoke
+Given I am logged in
+When I buy an item
+Then I see a receipt
+
+Scenario: Return an item
+Meta:
+@usecase: 202
+Given I bought an item
+And I still have the receipt
+When I return it
+Then I get a refund
+'''
+
+
+def build(tmp_path):
+    (tmp_path / 'shop').mkdir()
+    (tmp_path / 'shop' / 'shopping.story').write_text(STORY)
+    (tmp_path / 'empty.story').write_text('')
+    return StoryIndex(str(tmp_path)).build()
+
+
+def test_stories_and_scenarios(tmp_path):
+    index = build(tmp_path)
+    assert index.stories() == ['empty.story', 'shopping.story']
+    assert index.scenarios() == ['Scenario: Buy an item\n', 'Scenario: Return an item\n']
+    assert index.stories_and_scenarios() == [
+        'empty.story',
+        'shopping.story',
+        '-- Scenario: Buy an item\n',
+        '-- Scenario: Return an item\n',
+    ]
+
+
+def test_steps(tmp_path):
+    steps = build(tmp_path).story('shopping.story').steps
+    assert steps[0] == '-- Scenario: Buy an item\n'
+    assert '---- And I still have the receipt\n' in steps
+    assert len(steps) == 9
+
+
+def test_metatags(tmp_path):
+    index = build(tmp_path)
+    assert index.metatag_keys() == ['@smoke\n', '@usecase:']
+    assert index.metatag_data('@usecase', False) == ['200\n', '202\n']
+    assert index.metatag_data('@usecase', True) == ['shopping.story 200\n', 'shopping.story 202\n']
+
+
+def test_metatag_data_only_reads_meta_lines(tmp_path):
+    (tmp_path / 'mail.story').write_text('Scenario: Mail\n@usecase: 7\nGiven a mail to me@usecase: 8\n  @usecase: 9\n')
+    assert StoryIndex(str(tmp_path)).build().metatag_data('@usecase', False) == ['7\n']
+
+
+def test_empty_directory():
+    assert StoryIndex('').build().stories() == []
+
+
+def test_cache_only_reparses_changed_stories(tmp_path, monkeypatch):
+    import story_index
+    from story_cache import StoryCache
+
+    stories = tmp_path / 'stories'
+    stories.mkdir()
+    (stories / 'a.story').write_text('Scenario: A\n')
+    (stories / 'b.story').write_text('Scenario: B\n')
+    cache = StoryCache(str(tmp_path / 'cache.sqlite'))
+    StoryIndex(str(stories)).build(cache)
+
+    parsed = []
+    parse_story = story_index.parse_story
+    monkeypatch.setattr(story_index, 'parse_story', lambda path: parsed.append(path) or parse_story(path))
+
+    (stories / 'b.story').write_text('Scenario: B changed\n')
+    (stories / 'a.story').unlink()
+    index = StoryIndex(str(stories)).build(cache)
+
+    assert [p.rsplit('/', 1)[-1] for p in parsed] == ['b.story']
+    assert index.scenarios() == ['Scenario: B changed\n']
+    assert list(cache.load(str(stories))) == [str(stories / 'b.story')]
+
+
+def test_postings(tmp_path):
+    (tmp_path / 'meta.story').write_text(
+        'Meta:\n@feature checkout\n\nScenario: One\nMeta:\n@usecase 200\n\nScenario: Two\nMeta:\n@usecase 201\n'
+    )
+    index = StoryIndex(str(tmp_path)).build()
+    assert index.postings()['@usecase'] == [
+        ('200', 'meta.story', 'Scenario: One\n'),
+        ('201', 'meta.story', 'Scenario: Two\n'),
+    ]
+    assert index.postings()['@feature'] == [('checkout', 'meta.story', '')]
+    assert index.metatag_counts() == {'@feature': 1, '@usecase': 2}
+    assert index.metatag_counts('@usecase') == {'200': 1, '201': 1}
+
+
+def test_metatag_table():
+    from story_index import metatag_table
+
+    rows = metatag_table({'@usecase': 3, '@smoke': 1}, {'@usecase': 0.5, '@smoke': None})
+    assert rows == [('@smoke', 1, '25.0%', '~'), ('@usecase', 3, '75.0%', '50.0%')]
+
+
+def test_update(tmp_path):
+    (tmp_path / 'a.story').write_text('Scenario: A\n')
+    index = StoryIndex(str(tmp_path)).build()
+
+    (tmp_path / 'b.story').write_text('Scenario: B\n')
+    old, new = index.update(str(tmp_path / 'b.story'))
+    assert old is None and new.scenarios == ['Scenario: B\n']
+
+    (tmp_path / 'a.story').write_text('Scenario: A2\n')
+    old, new = index.update(str(tmp_path / 'a.story'))
+    assert old.scenarios == ['Scenario: A\n'] and new.scenarios == ['Scenario: A2\n']
+
+    (tmp_path / 'a.story').unlink()
+    old, new = index.update(str(tmp_path / 'a.story'))
+    assert new is None
+    assert index.stories() == ['b.story']
+    assert index.update('/somewhere/else.story') == (None, None)
+
+
+def test_open_and_save_by_path(tmp_path):
+    index = build(tmp_path)
+    path = index.path('shopping.story')
+    assert path == str(tmp_path / 'shop' / 'shopping.story')
+    assert index.path('missing.story') is None
+
+    (tmp_path / 'shop' / 'shopping.story').write_bytes(STORY.replace('\n', '\r\n').encode())
+    text, newline = read_story_text(path)
+    assert text == STORY and newline == '\r\n'
+
+    write_story_text(path, text.replace('Scenario: Return an item', 'Scenario: Exchange an item'), newline)
+    assert (tmp_path / 'shop' / 'shopping.story').read_bytes().count(b'\r\n') == STORY.count('\n')
+    assert sorted(p.name for p in (tmp_path / 'shop').iterdir()) == ['shopping.story']
+
+    old, new = index.update(path)
+    assert new.scenarios == ['Scenario: Buy an item\n', 'Scenario: Exchange an item\n']
+
+
+def test_update_keeps_the_walk_order(tmp_path):
+    for name in ('a', 'b', 'c'):
+        (tmp_path / (name + '.story')).write_text('Scenario: {}\n'.format(name))
+    index = StoryIndex(str(tmp_path)).build()
+
+    (tmp_path / 'b.story').write_text('Scenario: b2\n')
+    index.update(str(tmp_path / 'b.story'))
+    assert [story.scenarios[0] for story in index.files] == ['Scenario: a\n', 'Scenario: b2\n', 'Scenario: c\n']
+
+    (tmp_path / 'a.story').unlink()
+    index.update(str(tmp_path / 'a.story'))
+    (tmp_path / '0.story').write_text('Scenario: 0\n')
+    index.update(str(tmp_path / '0.story'))
+    assert [story.name for story in index.files] == ['b.story', 'c.story', '0.story']
+    assert len(index.files) == 3
+
+
+def test_stories_with_the_same_name_are_told_apart_by_path(tmp_path):
+    for folder in ('login', 'admin'):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'login.story').write_text('Scenario: {}\n'.format(folder))
+    index = StoryIndex(str(tmp_path)).build()
+    admin, login = str(tmp_path / 'admin' / 'login.story'), str(tmp_path / 'login' / 'login.story')
+
+    # An ambiguous name has no single path, so an editor can't open the wrong file
+    assert index.paths('login.story') == [admin, login]
+    assert index.path('login.story') is None
+    assert index.by_path[login].scenarios == ['Scenario: login\n']
+
+    # Updating the second one doesn't take the name over, deleting the first hands it on
+    (tmp_path / 'login' / 'login.story').write_text('Scenario: changed\n')
+    index.update(login)
+    assert index.story('login.story').path == admin
+    (tmp_path / 'admin' / 'login.story').unlink()
+    index.update(admin)
+    assert index.path('login.story') == login
+    assert index.story('login.story').scenarios == ['Scenario: changed\n']
+
+
+def test_failed_write_leaves_the_story_and_no_temporary_file(tmp_path, monkeypatch):
+    import os
+    import tempfile
+    import pytest
+    import story_index
+
+    path = tmp_path / 'shopping.story'
+    path.write_text(STORY)
+
+    # Text that can't be encoded fails part way through writing
+    with pytest.raises(UnicodeEncodeError):
+        write_story_text(str(path), 'Scenario: \ud800\n')
+    assert path.read_text() == STORY
+    assert os.listdir(str(tmp_path)) == ['shopping.story']
+
+    # When the temporary file can't be opened for writing, its descriptor is closed too
+    created = []
+    mkstemp = tempfile.mkstemp
+    monkeypatch.setattr(tempfile, 'mkstemp', lambda *args, **kwargs: created.append(mkstemp(*args, **kwargs)) or created[-1])
+
+    def fail_open(*args, **kwargs):
+        raise OSError('Too many open files')
+
+    monkeypatch.setattr(story_index, 'open', fail_open, raising=False)
+    with pytest.raises(OSError, match='Too many open files'):
+        write_story_text(str(path), STORY)
+
+    descriptor, temporary = created[0]
+    with pytest.raises(OSError):
+        os.fstat(descriptor)
+    assert os.listdir(str(tmp_path)) == ['shopping.story']
+    assert path.read_text() == STORY
+
+
+def test_parallel_build_matches_serial(tmp_path, monkeypatch):
+    import story_index
+
+    for i in range(20):
+        (tmp_path / '{:02}.story'.format(i)).write_text('Scenario: {}\nMeta:\n@usecase {}\nGiven a step\n'.format(i, i))
+    serial = StoryIndex(str(tmp_path)).build(workers=1)
+
+    for threshold in (1000, 5):  # thread pool, then process pool
+        monkeypatch.setattr(story_index, 'PARALLEL_THRESHOLD', threshold)
+        monkeypatch.setattr(story_index, 'CHUNK_SIZE', 3)
+        parallel = StoryIndex(str(tmp_path)).build(workers=2)
+        assert [story.to_dict() for story in parallel.files] == [story.to_dict() for story in serial.files]
+
+
+def test_scan_story_matches_line_reader(tmp_path):
+    from story_index import scan_story, read_story_lines
+
+    text = STORY + 'GIVEN shouting\nAndroid phone\n@no-newline-at-end'
+    (tmp_path / 'unix.story').write_bytes(text.encode('utf8'))
+    (tmp_path / 'windows.story').write_bytes(text.replace('\n', '\r\n').encode('utf8'))
+    (tmp_path / 'mac.story').write_bytes(text.replace('\n', '\r').encode('utf8'))
+
+    for name in ('unix.story', 'windows.story'):
+        path = str(tmp_path / name)
+        assert scan_story(path).to_dict() == read_story_lines(path).to_dict()
+
+    # Lone carriage returns are left to the text mode reader
+    assert scan_story(str(tmp_path / 'mac.story')) is None
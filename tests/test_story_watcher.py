@@ -0,0 +1,71 @@
+import shutil
+import time
+
+import pytest
+
+from story_watcher import StoryWatcher, load_inotify
+
+
+def wait_for_changes(watcher, expected):
+    changed = set()
+    deadline = time.time() + 5
+    while time.time() < deadline and not expected <= changed:
+        changed |= watcher.poll() or set()
+        time.sleep(0.05)
+    return changed
+
+
+def test_watcher_reports_changed_stories(tmp_path):
+    (tmp_path / 'old.story').write_text('Scenario: Old\n')
+    watcher = StoryWatcher(str(tmp_path), interval=0.1).start()
+    try:
+        time.sleep(0.2)
+        (tmp_path / 'new').mkdir()
+        (tmp_path / 'new' / 'new.story').write_text('Scenario: New\n')
+        (tmp_path / 'old.story').unlink()
+
+        expected = {str(tmp_path / 'new' / 'new.story'), str(tmp_path / 'old.story')}
+        assert expected <= wait_for_changes(watcher, expected)
+    finally:
+        watcher.stop()
+
+
+def test_polling_reports_created_edited_and_deleted_stories(tmp_path):
+    (tmp_path / 'edited.story').write_text('Scenario: Old\n')
+    (tmp_path / 'gone').mkdir()
+    (tmp_path / 'gone' / 'gone.story').write_text('Scenario: Gone\n')
+    watcher = StoryWatcher(str(tmp_path), interval=0.05, backend='polling').start()
+    assert watcher.backend == 'polling'
+    try:
+        time.sleep(0.2)
+        (tmp_path / 'new.story').write_text('Scenario: New\n')
+        (tmp_path / 'edited.story').write_text('Scenario: Edited\n')
+        # Polling reports each story of a deleted directory, not a rescan
+        shutil.rmtree(str(tmp_path / 'gone'))
+
+        expected = {str(tmp_path / 'new.story'), str(tmp_path / 'edited.story'), str(tmp_path / 'gone' / 'gone.story')}
+        assert expected <= wait_for_changes(watcher, expected)
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.skipif(load_inotify() is None, reason='inotify is only available on Linux')
+def test_deleted_directory_asks_for_a_rescan(tmp_path):
+    (tmp_path / 'gone').mkdir()
+    (tmp_path / 'gone' / 'gone.story').write_text('Scenario: Gone\n')
+    watcher = StoryWatcher(str(tmp_path)).start()
+    assert watcher.backend == 'inotify'
+    try:
+        time.sleep(0.2)
+        shutil.rmtree(str(tmp_path / 'gone'))
+
+        rescan = False
+        deadline = time.time() + 5
+        while time.time() < deadline and not rescan:
+            rescan = watcher.poll() is None
+            time.sleep(0.05)
+        assert rescan
+        # The queue was drained along with the rescan
+        assert watcher.poll() == set()
+    finally:
+        watcher.stop()
@@ -0,0 +1,76 @@
+import io
+import json
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    tracing.reset()
+    yield
+    tracing.reset()
+
+
+def test_spans_and_counters():
+    with tracing.span('parse', stories=2):
+        tracing.count('bytes read', 100)
+        tracing.count('bytes read', 50)
+
+    @tracing.span('load')
+    def load(value):
+        return value * 2
+
+    assert load(4) == 8
+    assert load(5) == 10
+
+    rows = {row[0]: row for row in tracing.summary()}
+    assert rows['parse'][1] == 1
+    assert rows['load'][1] == 2
+    assert tracing.counters() == {'bytes read': 150}
+
+
+def test_failed_span_is_recorded():
+    with pytest.raises(ValueError):
+        with tracing.span('broken'):
+            raise ValueError()
+    event = tracing.chrome_trace()['traceEvents'][-1]
+    assert event['name'] == 'broken' and event['args'] == {'error': 'ValueError'}
+
+
+def test_chrome_trace(tmp_path):
+    thread = threading.Thread(target=lambda: tracing.record('maven run', 0.5, returncode=0), name='worker')
+    thread.start()
+    thread.join()
+    tracing.count('tree rows inserted', 3)
+
+    filepath = tracing.export_chrome_trace(str(tmp_path / 'results' / 'trace.json'))
+    with open(filepath) as file:
+        events = json.load(file)['traceEvents']
+
+    span = next(event for event in events if event['ph'] == 'X')
+    assert span['name'] == 'maven run' and span['dur'] == pytest.approx(500000)
+    assert span['args'] == {'returncode': 0}
+    assert {'ph': 'M', 'name': 'thread_name', 'tid': span['tid']}.items() <= next(
+        event for event in events if event['ph'] == 'M' and event['tid'] == span['tid']).items()
+    counter = next(event for event in events if event['ph'] == 'C')
+    assert counter['args'] == {'tree rows inserted': 3}
+
+
+def test_print_summary():
+    tracing.record('scan stories', 0.25)
+    tracing.count('stories parsed', 12)
+    output = io.StringIO()
+    tracing.print_summary(output)
+    lines = output.getvalue().splitlines()
+    assert lines[1].split() == ['scan', 'stories', '1', '250.0', '250.0', '250.0']
+    assert lines[-1].split() == ['stories', 'parsed', '12']
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(tracing, 'enabled', False)
+    with tracing.span('parse'):
+        tracing.count('bytes read', 1)
+    assert tracing.summary() == [] and tracing.counters() == {}
@@ -0,0 +1,25 @@
+from tree_sort import sort_key, sort_items
+
+
+def ordered(values, descending=False):
+    return sort_items([(sort_key(value), value) for value in values], descending)
+
+
+def test_numbers_sort_numerically():
+    assert ordered(['10', '9', '100', '2']) == ['2', '9', '10', '100']
+    assert ordered([3, 20, 1]) == [1, 3, 20]
+    assert ordered(['12.5%', '2.0%', '100.0%', '0.5%']) == ['0.5%', '2.0%', '12.5%', '100.0%']
+
+
+def test_text_sorts_naturally():
+    assert ordered(['story10.story', 'Story9.story', 'story1.story']) == ['story1.story', 'Story9.story', 'story10.story']
+    assert ordered(['@usecase: 15.0', '@usecase: 2.1', '@smoke']) == ['@smoke', '@usecase: 2.1', '@usecase: 15.0']
+
+
+def test_blanks_sort_last_either_way():
+    assert ordered(['~', '5.0%', '', '1.0%']) == ['1.0%', '5.0%', '~', '']
+    assert ordered(['~', '5.0%', '', '1.0%'], descending=True) == ['5.0%', '1.0%', '~', '']
+
+
+def test_mixed_columns_do_not_raise():
+    assert ordered(['b', '2', 'a', '1', '~']) == ['1', '2', 'a', 'b', '~']
@@ -0,0 +1,124 @@
+import pytest
+
+from virtual_tree import (Node, VirtualTree, OVERSCAN, clamp_first, row_label, row_window, scroll_fractions,
+                          sorted_children, visible_rows)
+
+
+def nodes(rows):
+    """A node dict like VirtualTree's from (key, parent, values, open) tuples, in insert order."""
+    nodes = {'': Node('', None, '', '', (), True)}
+    for key, parent, values, open in rows:
+        nodes[key] = Node(key, parent, key, values, (), open)
+        nodes[parent].children.append(key)
+    return nodes
+
+
+def test_visible_rows_skip_closed_parents():
+    tree = nodes([('a', '', (), True), ('a1', 'a', (), False), ('a1x', 'a1', (), False), ('a2', 'a', (), False), ('b', '', (), False), ('b1', 'b', (), False)])
+
+    assert visible_rows(tree) == [('a', 0), ('a1', 1), ('a2', 1), ('b', 0)]
+    tree['b'].open = True
+    assert visible_rows(tree)[-1] == ('b1', 1)
+    assert visible_rows(tree, 'a1') == [('a1x', 0)]
+
+
+def test_row_window():
+    rows = [('story{}'.format(i), 0) for i in range(100000)]
+
+    first = clamp_first(50000, len(rows), 20)
+    window = row_window(rows, first, 20)
+    assert window[0] == ('story50000', 0)
+    assert len(window) == 20 + OVERSCAN
+
+    # Scrolling past the end shows the last screenful, and short lists start at the top
+    assert clamp_first(99995, len(rows), 20) == 99980
+    assert clamp_first(5, 3, 20) == 0
+    assert scroll_fractions(99980, len(rows), 20) == (0.9998, 1.0)
+    assert scroll_fractions(0, 0, 20) == (0.0, 1.0)
+
+
+def test_row_label():
+    tree = nodes([('a.story', '', (), False), ('Scenario: one', 'a.story', (), False)])
+
+    assert row_label(tree['a.story'], 0) == '▸ a.story'
+    tree['a.story'].open = True
+    assert row_label(tree['a.story'], 0) == '▾ a.story'
+    assert row_label(tree['Scenario: one'], 1) == '      Scenario: one'
+
+
+def test_sorted_children_use_typed_keys():
+    tree = nodes([(key, '', (key, count), False) for key, count in (('b', '10'), ('a', '9'), ('c', '100'))])
+
+    assert sorted_children(tree, '', 1) == ['a', 'b', 'c']
+    assert sorted_children(tree, '', 1, descending=True) == ['c', 'b', 'a']
+    assert sorted_children(tree, '', 0) == ['a', 'b', 'c']
+    assert tree['c'].sort_keys.keys() == {0, 1}
+
+
+@pytest.fixture
+def tree(tk_root):
+    tree = VirtualTree(tk_root, columns=('Story',), height=10)
+    tree.grid()
+    return tree
+
+
+def test_only_the_viewport_is_materialized(tree):
+    for i in range(100000):
+        tree.insert('', 'end', 'story{}'.format(i), values=('story{}'.format(i),))
+    tree.update()
+
+    assert len(tree.get_children()) == 100000
+    assert len(tree.tree.get_children()) < 50
+
+    tree.yview('moveto', 0.5)
+    tree.update()
+    first = tree.tree.get_children()[0]
+    assert tree.tree.item(first, 'values')[0] == 'story50000'
+
+
+def test_wheel_scrolls_the_rows_not_the_pool(tree):
+    for i in range(1000):
+        tree.insert('', 'end', 'story{}'.format(i), values=('story{}'.format(i),))
+    tree.update()
+
+    # Each notch down scrolls three rows
+    for notch in range(2):
+        tree.tree.event_generate('<MouseWheel>', delta=-120, x=10, y=10)
+        tree.update()
+    first = tree.tree.get_children()[0]
+    assert tree.tree.item(first, 'values')[0] == 'story6'
+    # The first pool item is the first row shown, it hasn't been scrolled out of the viewport
+    assert tree.tree.yview()[0] == 0.0
+    assert tree.yview()[0] == 6 / 1000
+
+
+def test_nested_rows_and_lazy_open(tree):
+    tree.insert('', 'end', 'a.story', text='a.story')
+    tree.insert('a.story', 'end', text='Scenario: one')
+    opened = []
+    tree.tree.bind('<<TreeviewOpen>>', lambda e: opened.append(tree.focus()))
+
+    tree.toggle('a.story')
+    tree.update()
+    assert opened == ['a.story']
+    assert len(tree.tree.get_children()) == 2
+
+    tree.delete('a.story')
+    tree.update()
+    assert tree.get_children() == ()
+
+
+def test_sort_uses_typed_keys(tree):
+    tree.tree['columns'] = ('Key', 'Count')
+    for key, count in (('b', 10), ('a', 9), ('c', 100)):
+        tree.insert('', 'end', key, values=(key, count))
+
+    tree.sort(1)
+    assert tree.get_children() == ('a', 'b', 'c')
+    tree.sort('Count', descending=True)
+    assert tree.get_children() == ('c', 'b', 'a')
+
+    # cached keys are dropped when a row's values change
+    tree.set('c', 'Count', 1)
+    tree.sort(1)
+    assert tree.get_children() == ('c', 'a', 'b')